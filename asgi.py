@@ -0,0 +1,92 @@
+# ASGI entry point: serves POST /chatbot/stream with async model I/O, so a single worker
+# can keep hundreds of streaming conversations open instead of one per gunicorn thread.
+# Every other route is handed to the Flask app through a2wsgi, which runs it in a pool of
+# WSGI_THREADS threads (like gunicorn's --threads).
+#
+# The Docker image serves this app. Run it with: uvicorn asgi:app --host 0.0.0.0 --port 8000
+import json
+import os
+import uuid
+from http.cookies import SimpleCookie
+
+from a2wsgi import WSGIMiddleware
+
+from chatbot import achatbot_response_stream
+from main import SESSION_COOKIE, app as flask_app, warm_up
+from streaming import SSE_HEADERS, asse_stream
+
+STREAM_PATH = '/chatbot/stream'
+
+# Threads serving the Flask routes; a blocking /chatbot call holds one for the whole model call
+WSGI_THREADS = int(os.getenv('WSGI_THREADS', 8))
+
+wsgi_app = WSGIMiddleware(flask_app, workers=WSGI_THREADS)
+
+
+# Read the whole request body from the ASGI receive channel
+async def read_body(receive):
+    body = b''
+    more_body = True
+    while more_body:
+        message = await receive()
+        body += message.get('body', b'')
+        more_body = message.get('more_body', False)
+    return body
+
+
+def get_cookie(scope, name):
+    for key, value in scope.get('headers', []):
+        if key == b'cookie':
+            morsel = SimpleCookie(value.decode('latin-1')).get(name)
+            if morsel is not None:
+                return morsel.value
+    return None
+
+
+async def send_error(send, status, message):
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(b'content-type', b'application/json')]})
+    await send({'type': 'http.response.body', 'body': json.dumps({'error': message}).encode()})
+
+
+async def chatbot_stream(scope, receive, send):
+    try:
+        payload = json.loads(await read_body(receive))
+        student_input = payload['message']
+    except (ValueError, KeyError, TypeError):
+        await send_error(send, 400, "Expected a JSON body with a 'message' field.")
+        return
+    session_id = payload.get('session_id') or get_cookie(scope, SESSION_COOKIE) or uuid.uuid4().hex
+
+    headers = [(key.lower().encode(), value.encode()) for key, value in SSE_HEADERS.items()]
+    headers.append((b'set-cookie', f'{SESSION_COOKIE}={session_id}; HttpOnly; Path=/; SameSite=Lax'.encode()))
+    await send({'type': 'http.response.start', 'status': 200, 'headers': headers})
+    async for event in asse_stream(achatbot_response_stream(student_input, session_id), session_id):
+        await send({'type': 'http.response.body', 'body': event.encode('utf-8'), 'more_body': True})
+    await send({'type': 'http.response.body', 'body': b''})
+
+
+# Start the in-memory warm-up at startup (see main.warm_up); nothing to tear down
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            warm_up()
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+    if scope['type'] == 'http' and scope['path'] == STREAM_PATH:
+        if scope['method'] != 'POST':
+            await send_error(send, 405, 'Method not allowed.')
+            return
+        await chatbot_stream(scope, receive, send)
+        return
+    await wsgi_app(scope, receive, send)
+
@@ -0,0 +1,61 @@
+# Admin page benchmark: what a dashboard polling /all-students and /api/students costs per
+# request when each poll re-queries and re-renders the page, when the page comes from the page
+# cache, and when the poll revalidates its ETag and gets 304 Not Modified. Also prints the
+# bytes sent with and without gzip.
+#
+# Usage: python benchmarks/bench_admin_pages.py [--students 5000] [--requests 300] [--limit 200]
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db
+from main import app, page_cache
+
+
+def seed(count):
+    db.migrate()
+    db.save_student_rows([('English', f'Student{index}', 'Saleh', 'Riyadh', f'student{index}@example.com',
+                           index % 3 + 1) for index in range(count)])
+
+
+# Mean milliseconds per GET of `url`; `before_each` runs before every request
+def measure(client, url, requests, headers=None, before_each=None):
+    start = time.perf_counter()
+    for _ in range(requests):
+        if before_each:
+            before_each()
+        response = client.get(url, headers=headers or {})
+    return (time.perf_counter() - start) / requests * 1000, response
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Admin page caching benchmark')
+    parser.add_argument('--students', type=int, default=5000)
+    parser.add_argument('--requests', type=int, default=300)
+    parser.add_argument('--limit', type=int, default=200, help='students per page')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db.configure(db_path=os.path.join(tmpdir, 'students.db'))
+        seed(args.students)
+        client = app.test_client()
+        gzip_headers = {'Accept-Encoding': 'gzip'}
+        for url in (f'/all-students?limit={args.limit}', f'/api/students?limit={args.limit}'):
+            uncached, plain = measure(client, url, args.requests, before_each=page_cache.clear)
+            cached, compressed = measure(client, url, args.requests, gzip_headers)
+            not_modified, response = measure(client, url, args.requests,
+                                             dict(gzip_headers, **{'If-None-Match': compressed.headers['ETag']}))
+            assert response.status_code == 304
+            print(f"{url}")
+            print(f"  query and render:   {uncached:8.3f} ms  {len(plain.data):8d} bytes")
+            print(f"  page cache + gzip:  {cached:8.3f} ms  {len(compressed.data):8d} bytes")
+            print(f"  304 Not Modified:   {not_modified:8.3f} ms  {len(response.data):8d} bytes")
+        db.configure()  # Close the pooled connections before the directory is removed
+
+
+if __name__ == '__main__':
+    main()
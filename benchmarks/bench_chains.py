@@ -0,0 +1,75 @@
+# Microbenchmark: per-turn CPU overhead of building prompts/parsers/chains on every
+# message (the old behaviour) versus reusing the precompiled chain registry.
+# The language model is stubbed, so the numbers measure only our own overhead.
+#
+# Usage: python benchmarks/bench_chains.py [--turns 500]
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain.prompts import PromptTemplate
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.output_parsers import JsonOutputParser
+
+import chatbot
+from chatbot import studentDetails
+
+EXTRACTION_RESPONSE = json.dumps({'first_name': 'Ali', 'city': 'Riyadh'})
+MISSING_FIELDS = ['language', 'last_name', 'email', 'course']
+STUDENT_INPUT = 'Hi, my name is Ali and I live in Riyadh.'
+
+
+# The per-call construction that extract_student_details/prompt_for_missing_info used to do
+def turn_rebuilding_chains(llm):
+    parser = JsonOutputParser(pydantic_object=studentDetails)
+    extraction_prompt = PromptTemplate(
+        template="""Extract the following personal details from the text and provide them:
+        {input}   \n \n {format_instructions}""",
+        input_variables=["input"],
+        partial_variables={"format_instructions": parser.get_format_instructions()},
+    )
+    (extraction_prompt | llm | parser).invoke(STUDENT_INPUT)
+    with open(os.path.join(chatbot.chain_registry.prompts_dir, 'missing_info.txt'), encoding='utf-8') as f:
+        system_prompt = f.read()
+    prompt = PromptTemplate(template=system_prompt, input_variables=['missing_fields', "student_input", "courses"])
+    (prompt | llm).invoke(chatbot.missing_info_inputs(MISSING_FIELDS, STUDENT_INPUT))
+
+
+def turn_precompiled(llm):
+    chatbot.chain_registry.chain('extraction', llm).invoke(STUDENT_INPUT)
+    chatbot.chain_registry.chain('missing_info', llm).invoke(
+        chatbot.missing_info_inputs(MISSING_FIELDS, STUDENT_INPUT))
+
+
+def measure(turn, turns):
+    llm = FakeListChatModel(responses=[EXTRACTION_RESPONSE, 'What is your last name?'])
+    turn(llm)  # Warm up
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+    for _ in range(turns):
+        turn(llm)
+    cpu, wall = time.process_time() - cpu_start, time.perf_counter() - wall_start
+    return cpu / turns * 1000, wall / turns * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Per-turn chain construction overhead benchmark')
+    parser.add_argument('--turns', type=int, default=500)
+    args = parser.parse_args()
+
+    results = {
+        'rebuild per turn': measure(turn_rebuilding_chains, args.turns),
+        'precompiled registry': measure(turn_precompiled, args.turns),
+    }
+    print(f"{'variant':<22} {'cpu ms/turn':>12} {'wall ms/turn':>13}")
+    for name, (cpu_ms, wall_ms) in results.items():
+        print(f"{name:<22} {cpu_ms:>12.3f} {wall_ms:>13.3f}")
+    before, after = results['rebuild per turn'][0], results['precompiled registry'][0]
+    print(f"CPU overhead reduced by {(1 - after / before) * 100:.1f}%")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+# Concurrency benchmark for the data access layer: writer threads register students
+# while reader threads load /all-students and /student-details queries.
+# Compares the old connect-per-call/rollback-journal access against the pooled WAL layer.
+#
+# Usage: python benchmarks/bench_db_concurrency.py [--writers 4] [--readers 8] [--seconds 5]
+import argparse
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db
+from chatbot import studentDetails
+
+STUDENT = studentDetails(language='English', first_name='Ali', last_name='Saleh',
+                         city='Riyadh', email='ali@example.com', course='1')
+SEED_ROWS = 2000
+
+
+# The access pattern db.py used before the pool: a new connection per call, default journal
+def legacy_save(db_path):
+    conn = sqlite3.connect(db_path)
+    conn.execute(db.INSERT_STUDENT_SQL, (STUDENT.language, STUDENT.first_name, STUDENT.last_name,
+                                         STUDENT.city, STUDENT.email, int(STUDENT.course)))
+    conn.commit()
+    conn.close()
+
+
+def legacy_read(db_path):
+    conn = sqlite3.connect(db_path)
+    conn.execute(db.STUDENT_COLUMNS_SQL).fetchall()
+    conn.execute(db.LATEST_STUDENT_SQL).fetchone()
+    conn.close()
+
+
+def pooled_save(db_path):
+    db.save_student_details(STUDENT)
+
+
+def pooled_read(db_path):
+    db.get_all_students()
+    db.get_latest_student()
+
+
+def setup_database(db_path, wal):
+    db.configure(db_path=db_path)
+    db.create_student_details_tables()
+    if not wal:
+        db.configure(db_path=db_path)  # Drop pooled connections before leaving WAL mode
+        conn = sqlite3.connect(db_path)
+        conn.execute('PRAGMA journal_mode=DELETE')
+        conn.close()
+    conn = sqlite3.connect(db_path)
+    conn.executemany(db.INSERT_STUDENT_SQL, [('English', 'Seed', 'Row', 'Riyadh', 'seed@example.com', 1)] * SEED_ROWS)
+    conn.commit()
+    conn.close()
+
+
+def run(save, read, db_path, writers, readers, seconds):
+    stop = time.perf_counter() + seconds
+    timings = {'write': [], 'read': []}
+    errors = []
+    lock = threading.Lock()
+
+    def loop(kind, operation):
+        local = []
+        while time.perf_counter() < stop:
+            start = time.perf_counter()
+            try:
+                operation(db_path)
+            except sqlite3.OperationalError as e:
+                errors.append(str(e))
+                continue
+            local.append(time.perf_counter() - start)
+        with lock:
+            timings[kind].extend(local)
+
+    threads = [threading.Thread(target=loop, args=('write', save)) for _ in range(writers)]
+    threads += [threading.Thread(target=loop, args=('read', read)) for _ in range(readers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return timings, errors
+
+
+def describe(samples, seconds):
+    if not samples:
+        return 'no completed operations'
+    samples = sorted(samples)
+    p95 = samples[int(len(samples) * 0.95) - 1] if len(samples) > 1 else samples[0]
+    return (f"{len(samples) / seconds:8.0f} ops/s  p50 {statistics.median(samples) * 1000:7.2f} ms"
+            f"  p95 {p95 * 1000:7.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Mixed read/write SQLite concurrency benchmark')
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=5)
+    args = parser.parse_args()
+
+    variants = [
+        ('connect per call, rollback journal', legacy_save, legacy_read, False),
+        ('connection pool, WAL', pooled_save, pooled_read, True),
+    ]
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for index, (name, save, read, wal) in enumerate(variants):
+            db_path = os.path.join(tmpdir, f'bench_{index}.db')
+            setup_database(db_path, wal)
+            timings, errors = run(save, read, db_path, args.writers, args.readers, args.seconds)
+            print(name)
+            print(f"  writes: {describe(timings['write'], args.seconds)}")
+            print(f"  reads:  {describe(timings['read'], args.seconds)}")
+            print(f"  errors: {len(errors)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+# Start-up benchmark: how long a fresh interpreter takes to import the app (what every gunicorn
+# worker boot and test run pays), and what the first chat message adds by loading the Gemini
+# client. Their sum is what importing the app cost when the client was built at import time.
+# Also prints the slowest imports of `main` from `python -X importtime`.
+#
+# Usage: python benchmarks/bench_startup.py [--runs 5] [--top 12]
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TIMING_CODE = '''
+import sys, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter() - start
+loaded = sorted(name for name in ('langchain_core', 'langchain_google_genai') if name in sys.modules)
+start = time.perf_counter()
+import chatbot
+chatbot.get_llm()
+print(imported, time.perf_counter() - start, ','.join(loaded) or '-')
+'''
+
+
+def run_python(*args):
+    env = dict(os.environ)
+    env.setdefault('GOOGLE_API_KEY', 'benchmark')
+    return subprocess.run([sys.executable, *args], cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+
+
+# Seconds to import main and to build the model client, in a fresh interpreter each run
+def measure(runs):
+    imports, first_uses = [], []
+    for _ in range(runs):
+        imported, first_use, loaded = run_python('-c', TIMING_CODE).stdout.split()
+        imports.append(float(imported))
+        first_uses.append(float(first_use))
+    return statistics.median(imports), statistics.median(first_uses), loaded
+
+
+# (cumulative seconds, module) of the modules main imports directly, slowest first.
+# -X importtime reports a module after its imports, so main's children are the depth-1
+# entries listed since the previous top-level import.
+def import_profile():
+    children = []
+    for line in run_python('-X', 'importtime', '-c', 'import main').stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line.split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 0:
+            if name.strip() == 'main':
+                return sorted(children, reverse=True)
+            children = []
+        elif depth == 1:
+            children.append((int(cumulative) / 1e6, name.strip()))
+    return []
+
+
+def main():
+    parser = argparse.ArgumentParser(description='App import and model client start-up benchmark')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=12)
+    args = parser.parse_args()
+
+    imported, first_use, loaded = measure(args.runs)
+    print(f"import main (median of {args.runs}):   {imported * 1000:8.1f} ms")
+    print(f"first model use (get_llm):     {first_use * 1000:8.1f} ms")
+    print(f"eager start-up (sum):          {(imported + first_use) * 1000:8.1f} ms")
+    print(f"cold-start reduction:          {first_use / (imported + first_use) * 100:8.1f} %")
+    print(f"langchain loaded by import:    {loaded}")
+    print(f"\nslowest imports of main (cumulative):")
+    for seconds, name in import_profile()[:args.top]:
+        print(f"  {seconds * 1000:8.1f} ms  {name}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,248 @@
+# Offline load test: many simulated students register concurrently through the Flask app
+# while chatbot.llm is replaced by a local fake Gemini model with configurable latency.
+# Reports latency percentiles per route, requests per second, LLM calls per completed
+# registration and time spent in the database. Exits non-zero when a --max-* budget is
+# exceeded, so it can run in CI.
+#
+# Usage: python benchmarks/load_test.py --students 200 --concurrency 20 --latency-ms 50 --jitter-ms 20
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import chatbot
+import db
+import main
+from fake_llm import FakeGeminiModel
+from llm_cache import MemoryResponseCache
+from llm_client import GuardedChatModel
+from transcripts import TranscriptStore
+from write_behind import WriteBehindQueue
+
+COURSES = ('Python', 'Math', 'Machine Learning')
+
+
+# The messages one simulated student sends, one chat turn each
+def conversation(index):
+    return [
+        'Hello, I prefer English',
+        f'my first name is Student{index} and my last name is Tester',
+        'I live in Riyadh',
+        f'student{index}.{uuid.uuid4().hex[:6]}@example.com',
+        COURSES[index % len(COURSES)],
+    ]
+
+
+# Collects timings from every worker thread
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = {}
+        self.db_seconds = 0.0
+        self.db_calls = 0
+        self.completed = 0
+        self.errors = []
+
+    def record(self, route, seconds):
+        with self._lock:
+            self.latencies.setdefault(route, []).append(seconds)
+
+    def record_db(self, seconds):
+        with self._lock:
+            self.db_seconds += seconds
+            self.db_calls += 1
+
+    @contextmanager
+    def time_db(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_db(time.perf_counter() - start)
+
+
+# Temporarily set module attributes; the originals are restored on exit
+@contextmanager
+def patched(*replacements):
+    originals = [(module, name, getattr(module, name)) for module, name, _ in replacements]
+    try:
+        for module, name, value in replacements:
+            setattr(module, name, value)
+        yield
+    finally:
+        for module, name, value in originals:
+            setattr(module, name, value)
+
+
+# Wrap a module function so that each call is recorded as database time
+def timed_db_call(module, name, recorder):
+    original = getattr(module, name)
+
+    def timed(*args, **kwargs):
+        with recorder.time_db():
+            return original(*args, **kwargs)
+
+    return module, name, timed
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))
+    return ordered[index]
+
+
+def simulate_student(index, recorder, stream):
+    client = main.app.test_client()
+    session_id = f'load-{index}-{uuid.uuid4().hex}'
+    route = '/chatbot/stream' if stream else '/chatbot'
+    for message in conversation(index):
+        start = time.perf_counter()
+        response = client.post(route, json={'message': message, 'session_id': session_id})
+        body = response.get_data(as_text=True)
+        recorder.record(route, time.perf_counter() - start)
+        if response.status_code != 200:
+            recorder.errors.append(f'{route} returned {response.status_code}')
+            return
+        if '[redirect]' in body:
+            with recorder._lock:
+                recorder.completed += 1
+            break
+    for route in ('/student-details', '/all-students'):
+        start = time.perf_counter()
+        response = client.get(route)
+        recorder.record(route, time.perf_counter() - start)
+        if response.status_code != 200:
+            recorder.errors.append(f'{route} returned {response.status_code}')
+
+
+def run(args):
+    attempt_timeout = args.attempt_timeout_ms / 1000
+    fake = FakeGeminiModel(latency=args.latency_ms / 1000, jitter=args.jitter_ms / 1000,
+                           rate_limit_rate=args.fault_429, timeout_rate=args.fault_timeout, hang=attempt_timeout * 4)
+    # The fake sits behind the same guard as Gemini: rate limits, retries, deadlines, coalescing
+    llm = GuardedChatModel(inner=fake, max_concurrency=args.llm_concurrency, attempt_timeout=attempt_timeout,
+                           backoff_base=0.05)
+    recorder = Recorder()
+    previous_db_path = db.DB_PATH
+    replacements = [
+        (chatbot, 'llm', llm),
+        (chatbot, 'ENGINE_MODE', args.mode),
+        (chatbot, 'llm_cache', None if args.no_cache else MemoryResponseCache()),
+        timed_db_call(chatbot, 'save_student_details', recorder),
+        timed_db_call(db, 'save_student_rows', recorder),
+        timed_db_call(db, 'get_latest_student', recorder),
+        timed_db_call(main, 'get_students_page', recorder),
+    ]
+    with tempfile.TemporaryDirectory() as tmpdir, patched(*replacements):
+        db.configure(db_path=os.path.join(tmpdir, 'load_test.db'))
+        write_queue = WriteBehindQueue(os.path.join(tmpdir, 'write_queue.db')) if args.write_behind else None
+        transcript_store = TranscriptStore()
+        try:
+            db.migrate()
+            with patched((chatbot, 'write_queue', write_queue), (chatbot, 'transcript_store', transcript_store)):
+                start = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+                    futures = [pool.submit(simulate_student, index, recorder, args.stream)
+                               for index in range(args.students)]
+                    for future in futures:
+                        future.result()
+                elapsed = time.perf_counter() - start
+        finally:
+            if write_queue is not None:
+                write_queue.close()
+            transcript_store.close()
+            db.configure(db_path=previous_db_path)
+
+    requests = sum(len(samples) for samples in recorder.latencies.values())
+    report = {
+        'mode': ('stream' if args.stream else args.mode) + (' + write-behind' if args.write_behind else ''),
+        'students': args.students,
+        'concurrency': args.concurrency,
+        'completed_registrations': recorder.completed,
+        'errors': len(recorder.errors),
+        'elapsed_seconds': round(elapsed, 3),
+        'requests_per_second': round(requests / elapsed, 1),
+        'llm_calls': fake.calls,
+        'llm_faults_injected': fake.faults_injected,
+        'llm_peak_concurrency': fake.peak_in_flight,
+        'llm_calls_per_registration': round(fake.calls / recorder.completed, 2) if recorder.completed else None,
+        'llm_input_tokens_per_registration': (
+            round(fake.input_tokens / recorder.completed) if recorder.completed else None),
+        'db_seconds': round(recorder.db_seconds, 4),
+        'db_calls': recorder.db_calls,
+        'routes': {
+            route: {
+                'requests': len(samples),
+                'p50_ms': round(percentile(samples, 0.50) * 1000, 2),
+                'p95_ms': round(percentile(samples, 0.95) * 1000, 2),
+                'p99_ms': round(percentile(samples, 0.99) * 1000, 2),
+            }
+            for route, samples in sorted(recorder.latencies.items())
+        },
+    }
+    return report, recorder.errors
+
+
+def print_report(report):
+    print(f"{report['students']} students, concurrency {report['concurrency']}, mode {report['mode']}")
+    print(f"  completed registrations: {report['completed_registrations']}  errors: {report['errors']}")
+    print(f"  {report['requests_per_second']} requests/s over {report['elapsed_seconds']}s")
+    print(f"  LLM calls per registration: {report['llm_calls_per_registration']}  "
+          f"faults injected: {report['llm_faults_injected']}  peak concurrency: {report['llm_peak_concurrency']}")
+    print(f"  LLM input tokens per registration: {report['llm_input_tokens_per_registration']}")
+    print(f"  DB time: {report['db_seconds']}s over {report['db_calls']} calls")
+    print(f"  {'route':<18} {'requests':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for route, stats in report['routes'].items():
+        print(f"  {route:<18} {stats['requests']:>8} {stats['p50_ms']:>9} {stats['p95_ms']:>9} {stats['p99_ms']:>9}")
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description='Offline load test with a fake Gemini backend')
+    parser.add_argument('--students', type=int, default=100)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--latency-ms', type=float, default=50, help='fake model latency per call')
+    parser.add_argument('--jitter-ms', type=float, default=10, help='uniform +/- jitter on the latency')
+    parser.add_argument('--fault-429', type=float, default=0.0, help='fraction of model calls failing with a 429')
+    parser.add_argument('--fault-timeout', type=float, default=0.0, help='fraction of model calls that hang')
+    parser.add_argument('--attempt-timeout-ms', type=float, default=2000, help='per-attempt model timeout')
+    parser.add_argument('--llm-concurrency', type=int, default=8, help='maximum concurrent model calls')
+    parser.add_argument('--mode', choices=chatbot.ENGINE_MODES, default='two_call')
+    parser.add_argument('--stream', action='store_true', help='use /chatbot/stream instead of /chatbot')
+    parser.add_argument('--write-behind', action='store_true', help='save registrations through the write-behind queue')
+    parser.add_argument('--no-cache', action='store_true', help='disable the LLM response cache')
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    parser.add_argument('--max-chat-p95-ms', type=float, help='fail if the chat route p95 exceeds this')
+    parser.add_argument('--max-llm-calls-per-registration', type=float, help='fail above this many calls')
+    args = parser.parse_args(argv)
+
+    report, errors = run(args)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+    failures = list(errors[:5])
+    chat_route = '/chatbot/stream' if args.stream else '/chatbot'
+    chat_p95 = report['routes'].get(chat_route, {}).get('p95_ms')
+    if args.max_chat_p95_ms is not None and chat_p95 is not None and chat_p95 > args.max_chat_p95_ms:
+        failures.append(f'{chat_route} p95 {chat_p95} ms exceeds {args.max_chat_p95_ms} ms')
+    calls = report['llm_calls_per_registration']
+    if args.max_llm_calls_per_registration is not None and (calls is None or calls > args.max_llm_calls_per_registration):
+        failures.append(f'{calls} LLM calls per registration exceeds {args.max_llm_calls_per_registration}')
+    if report['completed_registrations'] != args.students:
+        failures.append(f"only {report['completed_registrations']} of {args.students} registrations completed")
+    for failure in failures:
+        print(f'FAIL: {failure}', file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main_cli())
@@ -0,0 +1,189 @@
+# Bulk registration import from CSV or JSONL, e.g. when migrating from another system.
+# Records are read one at a time, validated against the studentDetails model and inserted
+# with executemany in chunked transactions, so memory use does not grow with the file.
+# A record for an email and course already registered replaces the earlier registration.
+#
+#   python bulk_import.py students.csv
+#   python bulk_import.py students.jsonl --batch-size 5000 --rejects rejected.jsonl
+import argparse
+import csv
+import io
+import json
+import sys
+import time
+
+from pydantic import ValidationError
+
+import db
+from db import EMAIL_RE, course_catalog
+from models import studentDetails
+
+IMPORT_FORMATS = ('csv', 'jsonl')
+DEFAULT_BATCH_SIZE = 1000
+
+# Fields every imported registration must have, in INSERT_STUDENT_SQL order
+REQUIRED_FIELDS = ('language', 'first_name', 'last_name', 'city', 'email', 'course')
+LANGUAGES = ('Arabic', 'English')
+
+
+# Outcome of an import: counts, timing and the rejected records with their reasons
+# Only the first `max_rejects_kept` rejects are kept in memory; `reject_sink` (if given) receives every one.
+class ImportReport:
+    def __init__(self, max_rejects_kept=None, reject_sink=None):
+        self.inserted = 0
+        self.rejected = 0
+        self.rejects = []
+        self.max_rejects_kept = max_rejects_kept
+        self.reject_sink = reject_sink
+        self.elapsed = 0.0
+
+    def reject(self, line, record, error):
+        self.rejected += 1
+        reject = {'line': line, 'record': record, 'error': error}
+        if self.reject_sink is not None:
+            self.reject_sink(reject)
+        if self.max_rejects_kept is None or len(self.rejects) < self.max_rejects_kept:
+            self.rejects.append(reject)
+
+    @property
+    def rows_per_second(self):
+        return self.inserted / self.elapsed if self.elapsed else 0.0
+
+    def as_dict(self):
+        return {
+            'inserted': self.inserted,
+            'rejected': self.rejected,
+            'elapsed_seconds': round(self.elapsed, 3),
+            'rows_per_second': round(self.rows_per_second, 1),
+            'rejects': self.rejects,
+        }
+
+
+# Generator of (line number, record dict) from a CSV text stream with a header row
+def iter_csv_records(stream):
+    reader = csv.DictReader(stream)
+    for record in reader:
+        yield reader.line_num, record
+
+
+# Generator of (line number, record dict) from a JSON Lines text stream; bad JSON yields the error text
+def iter_jsonl_records(stream):
+    for line_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield line_number, json.loads(line)
+        except ValueError as e:
+            yield line_number, f"Invalid JSON: {e}"
+
+
+# Function to validate one record; returns (insert parameters, None) or (None, error message)
+def validate_record(record, course_ids):
+    if not isinstance(record, dict):
+        return None, record if isinstance(record, str) else 'Expected an object'
+    try:
+        student = studentDetails.model_validate(
+            {field: _clean(record.get(field)) for field in REQUIRED_FIELDS})
+    except ValidationError as e:
+        return None, '; '.join(error['msg'] for error in e.errors())
+
+    missing = [field for field in REQUIRED_FIELDS if not getattr(student, field)]
+    if missing:
+        return None, f"Missing fields: {', '.join(missing)}"
+    if student.language not in LANGUAGES:
+        return None, f"Unknown language: {student.language}"
+    if not EMAIL_RE.fullmatch(student.email):
+        return None, f"Invalid email: {student.email}"
+    if not student.course.isdigit() or int(student.course) not in course_ids:
+        return None, f"Unknown course: {student.course}"
+    return (student.language, student.first_name, student.last_name,
+            student.city, student.email, int(student.course)), None
+
+
+def _clean(value):
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+# Function to import (line, record) pairs in batches, one transaction per batch; returns an ImportReport
+def import_records(records, batch_size=DEFAULT_BATCH_SIZE, max_rejects_kept=None, reject_sink=None):
+    report = ImportReport(max_rejects_kept, reject_sink)
+    course_ids = set(course_catalog.names())
+    start = time.perf_counter()
+    batch = []
+    for line, record in records:
+        row, error = validate_record(record, course_ids)
+        if error:
+            report.reject(line, record, error)
+            continue
+        batch.append(row)
+        if len(batch) >= batch_size:
+            db.save_student_rows(batch)
+            report.inserted += len(batch)
+            batch = []
+    if batch:
+        db.save_student_rows(batch)
+        report.inserted += len(batch)
+    report.elapsed = time.perf_counter() - start
+    return report
+
+
+# Function to import a CSV or JSONL text stream
+def import_stream(stream, fmt, batch_size=DEFAULT_BATCH_SIZE, max_rejects_kept=None, reject_sink=None):
+    if fmt == 'csv':
+        records = iter_csv_records(stream)
+    elif fmt == 'jsonl':
+        records = iter_jsonl_records(stream)
+    else:
+        raise ValueError(f"Unknown import format: {fmt!r}")
+    return import_records(records, batch_size=batch_size, max_rejects_kept=max_rejects_kept, reject_sink=reject_sink)
+
+
+# Work out the format from an explicit value or the file extension
+def detect_format(filename, fmt=None):
+    fmt = (fmt or filename.rsplit('.', 1)[-1]).lower()
+    if fmt == 'json':
+        fmt = 'jsonl'
+    if fmt not in IMPORT_FORMATS:
+        raise ValueError(f"Cannot tell the import format of {filename!r}; use csv or jsonl")
+    return fmt
+
+
+# Wrap a binary upload so it can be read as UTF-8 text (a leading BOM is skipped)
+def text_stream(binary_stream):
+    return io.TextIOWrapper(binary_stream, encoding='utf-8-sig', newline='')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Bulk import registrations from CSV or JSONL')
+    parser.add_argument('path', help='CSV (with header) or JSONL file to import')
+    parser.add_argument('--format', choices=IMPORT_FORMATS, help='default: from the file extension')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument('--rejects', help='write rejected records to this JSONL file')
+    parser.add_argument('--db', help='SQLite database to import into (default: STUDENT_DB_PATH)')
+    args = parser.parse_args(argv)
+    if args.db:
+        db.configure(db_path=args.db)
+    db.migrate()
+
+    rejects_file = open(args.rejects, 'w', encoding='utf-8') if args.rejects else None
+    sink = (lambda reject: rejects_file.write(json.dumps(reject, ensure_ascii=False) + '\n')) if rejects_file else None
+    try:
+        with open(args.path, encoding='utf-8-sig', newline='') as stream:
+            report = import_stream(stream, detect_format(args.path, args.format), batch_size=args.batch_size,
+                                   max_rejects_kept=20, reject_sink=sink)
+    finally:
+        if rejects_file:
+            rejects_file.close()
+
+    print(f"Inserted {report.inserted} rows, rejected {report.rejected} "
+          f"in {report.elapsed:.2f}s ({report.rows_per_second:.0f} rows/s)", file=sys.stderr)
+    for reject in report.rejects:
+        print(f"  line {reject['line']}: {reject['error']}", file=sys.stderr)
+    return 0 if report.rejected == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
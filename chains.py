@@ -0,0 +1,149 @@
+import hashlib
+import os
+import threading
+import time
+
+# Directory holding the prompt template files
+PROMPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'prompts')
+
+
+# A registry of prompt templates, output parsers and chains that are built once and shared
+# by every request thread. Building a JsonOutputParser's format instructions serialises the
+# pydantic JSON schema, so doing it per message is wasted CPU.
+#
+# Compiled prompts are immutable and safe to share between threads. Chains are cached per
+# language model, so swapping the model (e.g. for a stub in tests) rebuilds them once.
+# Chains are compiled on first use and langchain is only imported then, so registering
+# them costs nothing at start-up.
+class ChainRegistry:
+    def __init__(self, prompts_dir=PROMPTS_DIR, auto_reload_interval=None):
+        self.prompts_dir = prompts_dir
+        # When set, template files are checked for changes at most once per interval (seconds)
+        self.auto_reload_interval = auto_reload_interval
+        self._specs = {}
+        self._templates = {}
+        # Compiled prompts, chains and fingerprints are keyed by (name, variant); variant None is the base chain
+        self._compiled = {}
+        self._chains = {}
+        self._mtimes = {}
+        self._fingerprints = {}
+        self._last_check = 0.0
+        self._lock = threading.RLock()
+
+    # Register a chain: its template file, input variables and optional pydantic output model.
+    # `variant_model`, if given, maps a hashable variant key to the output model of that variant
+    # (e.g. the set of fields still to extract); variants share the template and are compiled on first use.
+    def register(self, name, template_file, input_variables, output_model=None, variant_model=None):
+        with self._lock:
+            self._specs[name] = {
+                'template_file': template_file,
+                'input_variables': list(input_variables),
+                'output_model': output_model,
+                'variant_model': variant_model,
+            }
+            self._load(name)
+
+    def _template_path(self, name):
+        return os.path.join(self.prompts_dir, self._specs[name]['template_file'])
+
+    # Read a chain's template file and recompile the base chain and variants built so far
+    def _load(self, name):
+        path = self._template_path(name)
+        with open(path, encoding='utf-8') as f:
+            self._templates[name] = f.read()
+        self._mtimes[name] = os.path.getmtime(path)
+        for variant in [variant for chain_name, variant in self._compiled if chain_name == name]:
+            self._compile(name, variant)
+
+    # Build the prompt (with format instructions pre-rendered) and parser for one chain variant
+    def _compile(self, name, variant):
+        from langchain_core.output_parsers import JsonOutputParser
+        from langchain_core.prompts import PromptTemplate
+
+        spec = self._specs[name]
+        template = self._templates[name]
+        output_model = spec['output_model'] if variant is None else spec['variant_model'](variant)
+
+        parser = None
+        partial_variables = {}
+        if output_model is not None:
+            parser = JsonOutputParser(pydantic_object=output_model)
+            partial_variables['format_instructions'] = parser.get_format_instructions()
+
+        prompt = PromptTemplate(
+            template=template,
+            input_variables=spec['input_variables'],
+            partial_variables=partial_variables,
+        )
+        key = (name, variant)
+        self._compiled[key] = (prompt, parser)
+        self._fingerprints[key] = hashlib.sha256(
+            (template + partial_variables.get('format_instructions', '')).encode('utf-8')).hexdigest()
+        self._chains.pop(key, None)
+
+    def _entry(self, name, variant):
+        self._maybe_auto_reload()
+        key = (name, variant)
+        if key not in self._compiled:
+            with self._lock:
+                if key not in self._compiled:
+                    self._compile(name, variant)
+        return key
+
+    # Recompile every registered chain from its template file
+    def reload(self):
+        with self._lock:
+            for name in self._specs:
+                self._load(name)
+
+    # Recompile only the chains whose template file changed on disk; returns their names
+    def reload_changed(self):
+        changed = []
+        with self._lock:
+            for name in self._specs:
+                if os.path.getmtime(self._template_path(name)) != self._mtimes.get(name):
+                    self._load(name)
+                    changed.append(name)
+        return changed
+
+    def _maybe_auto_reload(self):
+        if self.auto_reload_interval is None:
+            return
+        now = time.monotonic()
+        if now - self._last_check >= self.auto_reload_interval:
+            self._last_check = now
+            self.reload_changed()
+
+    # A hash of the rendered template, which changes whenever the prompt is edited (used in cache keys)
+    def fingerprint(self, name, variant=None):
+        return self._fingerprints[self._entry(name, variant)]
+
+    def prompt(self, name, variant=None):
+        return self._compiled[self._entry(name, variant)][0]
+
+    # Drop every compiled variant (e.g. when the data their output models are built from changes)
+    def clear_variants(self):
+        with self._lock:
+            for key in [key for key in self._compiled if key[1] is not None]:
+                del self._compiled[key]
+                del self._fingerprints[key]
+                self._chains.pop(key, None)
+
+    # Number of compiled variants of a chain, not counting the base chain
+    def variant_count(self, name):
+        with self._lock:
+            return sum(1 for chain_name, variant in self._compiled if chain_name == name and variant is not None)
+
+    # Return the `prompt | llm | parser` chain for `name` (or one of its variants), built once per language model
+    def chain(self, name, llm, variant=None):
+        key = self._entry(name, variant)
+        cached = self._chains.get(key)
+        if cached is not None and cached[0] is llm:
+            return cached[1]
+        with self._lock:
+            prompt, parser = self._compiled[key]
+            chain = prompt | llm
+            if parser is not None:
+                chain = chain | parser
+            self._chains[key] = (llm, chain)
+            return chain
@@ -1,82 +1,179 @@
 # Import necessary libraries
+import asyncio
+import contextvars
+import logging
 import os
 import random
 import sqlite3
-from typing import Optional, List
-from pydantic import BaseModel, Field
-from langchain.prompts import PromptTemplate
-from langchain_core.output_parsers import JsonOutputParser
-from langchain_google_genai import ChatGoogleGenerativeAI
-from db import save_student_details
-from dotenv import load_dotenv
-
-# Load environment variables from .env file
-load_dotenv()
-
-# Set the Google API key environment variable
-os.environ['GOOGLE_API_KEY'] = os.getenv('GOOGLE_API_KEY')
-
-# Initialize Gemini 1.5 Pro for chatbot functionality
-# Optional: gemini-1.5-flash or gemini-1.5-pro
-llm = ChatGoogleGenerativeAI(model="gemini-1.5-flash", temperature=0)  
-
-# Data model to represent student details
-class studentDetails(BaseModel):
-    language: Optional[str] = Field(
-        None, enum=["Arabic", "English"],
-        description="The preferred language of the student."
-    )
-    first_name: Optional[str] = Field(
-        None,
-        description="The student's first name."
-    )
-    last_name: Optional[str] = Field(
-        None,
-        description="The student's last name or surname."
-    )
-    city: Optional[str] = Field(
-        None,
-        description="The city where the student resides."
-    )
-    email: Optional[str] = Field(
-        None,
-        description="The student's email address."
-    )
-    course: Optional[str] = Field(
-        None, enum=["1", "2", "3"],
-        description="The course selected by the student: '1' for Python, '2' for Math, '3' for Machine Learning."
-    )
+import threading
+from typing import AsyncIterator, Iterator, NamedTuple, Optional, List, Tuple
+from models import STUDENT_FIELDS, studentDetails, chatTurn, partial_chat_turn_model, partial_details_model
+import db
+from db import save_student_details, course_catalog, registered_students
+from session_store import create_session_store
+from metrics import metrics
+from chains import ChainRegistry
+from pre_extractor import PreExtraction, PreExtractor
+from llm_cache import create_response_cache, make_cache_key
+from write_behind import WriteQueueFull, create_write_queue
+from transcripts import create_transcript_store
+
+logger = logging.getLogger(__name__)
+
+# The Gemini chat model, built on first use by get_llm (tests and benchmarks may assign a stub).
+# Loading the Gemini SDK and langchain takes most of the app's start-up time, so workers and
+# database-only routes such as /all-students never pay for it.
+llm = None
+_llm_lock = threading.Lock()
+
+# Function to return the chat model, creating the Gemini client on first use.
+# Calls go through a guard that rate limits, bounds concurrency, retries and enforces deadlines.
+def get_llm():
+    global llm
+    if llm is None:
+        with _llm_lock:
+            if llm is None:
+                from llm_client import SingleAttemptGemini, create_guarded_llm
+
+                # Optional: gemini-1.5-flash or gemini-1.5-pro
+                llm = create_guarded_llm(SingleAttemptGemini(model="gemini-1.5-flash", temperature=0))
+    return llm
+
+# Prompts and parsers are compiled on first use and shared by all request threads.
+# Set PROMPTS_AUTO_RELOAD to a number of seconds to pick up edited template files without a restart.
+_auto_reload = os.getenv('PROMPTS_AUTO_RELOAD')
+chain_registry = ChainRegistry(auto_reload_interval=float(_auto_reload) if _auto_reload else None)
+# Extraction chains have a variant per set of missing fields and course list (see extraction_variant),
+# whose schema only lists those fields and offers the courses of the catalog.
+chain_registry.register('extraction', 'extraction.txt', ['input'], output_model=studentDetails,
+                        variant_model=lambda variant: partial_details_model(*variant))
+chain_registry.register('missing_info', 'missing_info.txt', ['missing_fields', 'student_input', 'courses', 'history'])
+chain_registry.register('extract_and_reply', 'extract_and_reply.txt',
+                        ['current_details', 'missing_fields', 'student_input', 'history'], output_model=chatTurn,
+                        variant_model=lambda variant: partial_chat_turn_model(*variant))
+# Variants built for the previous course list are dropped when the courses change
+course_catalog.subscribe(chain_registry.clear_variants)
+
+# Cache of model outputs keyed on normalised chain inputs (LLM_CACHE=memory|sqlite|off).
+# With temperature=0 the same greeting or question always gets the same answer.
+llm_cache = create_response_cache()
+
+# Engine mode of the turn being processed, used to label the language model call counters
+_turn_mode = contextvars.ContextVar('turn_mode', default='direct')
+
+# Input/output tokens used by the turn being processed (None outside a turn)
+_turn_tokens = contextvars.ContextVar('turn_tokens', default=None)
+
+# Time one stage of a chat turn (pre_extract, extract, merge, missing_fields, prompt, save)
+def stage_timer(stage: str):
+    return metrics.timer('chat_stage_seconds', stage=stage, mode=_turn_mode.get())
+
+# Count a real model call for a chain and return the run config that records its token usage
+def llm_call_config(name: str) -> dict:
+    mode = _turn_mode.get()
+    metrics.increment('llm_calls_total', mode=mode, chain=name)
+    from llm_client import TokenUsageHandler  # Loaded with the model, see get_llm
+    return {'callbacks': [TokenUsageHandler(name, mode, _turn_tokens.get(), registry=metrics)]}
+
+# Start counting the tokens of a turn; returns the context token to pass to _end_turn_tokens
+def _start_turn_tokens():
+    return _turn_tokens.set({'input': 0, 'output': 0})
+
+# Record the tokens the turn used (chat_turn_tokens{mode, kind}) and stop counting
+def _end_turn_tokens(token, mode: str):
+    turn_tokens = _turn_tokens.get()
+    _turn_tokens.reset(token)
+    for kind, count in turn_tokens.items():
+        metrics.observe('chat_turn_tokens', count, mode=mode, kind=kind)
+    logger.debug("Turn used %d input and %d output tokens (mode=%s)",
+                 turn_tokens['input'], turn_tokens['output'], mode)
+
+# Variant key of the extraction chains: the fields to extract in declaration order (all of them
+# when `fields` is empty) and the current course choices
+def extraction_variant(fields: Optional[List[str]]):
+    fields = tuple(field for field in STUDENT_FIELDS if not fields or field in fields)
+    return fields, course_catalog.choices()
 
 # Function to connect to the SQLite database
 def connect_db():
-    return sqlite3.connect('student_details.db')
-
-# Function to extract student details from the input text using a language model
-def extract_student_details(input_text: str) -> studentDetails:
-    # Use a parser to parse the details from text into the studentDetails model
-    parser = JsonOutputParser(pydantic_object=studentDetails)
-
-    # Create a prompt to instruct the model to extract details from the input text
-    extraction_prompt = PromptTemplate(
-        template="""Extract the following personal details from the text and provide them:
-        {input}   \n \n {format_instructions}""",
-        input_variables=["input"],
-        partial_variables={"format_instructions": parser.get_format_instructions()},
-    )
+    return sqlite3.connect(db.DB_PATH)
 
-    # Chain the prompt and language model together for processing the input
-    chain = extraction_prompt | llm | parser
-    return chain.invoke(input_text)
+# Function to invoke a precompiled chain through the response cache.
+# Pass use_cache=False to always call the model (the fresh answer still refreshes the cache).
+def invoke_chain(name: str, inputs, use_cache: bool = True, variant=None):
+    key = None
+    if llm_cache is not None:
+        key = make_cache_key(name, chain_registry.fingerprint(name, variant), inputs)
+        if use_cache:
+            cached = llm_cache.get(key)
+            if cached is not None:
+                return cached
+    result = chain_registry.chain(name, get_llm(), variant).invoke(inputs, config=llm_call_config(name))
+    if hasattr(result, 'content'):
+        result = result.content
+    if key is not None and result is not None:
+        llm_cache.set(key, result)
+    return result
 
-# Function to merge new details with existing student details
-def merge_student_details(current_details: studentDetails, new_details: dict) -> studentDetails:
-    print("Data received:", new_details)
-    try:
-        # Extract the personal details from the provided dictionary
-        personal_details = new_details
-    except KeyError as e:
-        print(f"KeyError: {e}. The key 'personaldetails' is not in the data dictionary.")
-        personal_details = {}
+# Async variant of invoke_chain; the cache itself is a fast local lookup
+async def ainvoke_chain(name: str, inputs, use_cache: bool = True, variant=None):
+    key = None
+    if llm_cache is not None:
+        key = make_cache_key(name, chain_registry.fingerprint(name, variant), inputs)
+        if use_cache:
+            cached = await asyncio.to_thread(llm_cache.get, key)
+            if cached is not None:
+                return cached
+    result = await chain_registry.chain(name, get_llm(), variant).ainvoke(inputs, config=llm_call_config(name))
+    if hasattr(result, 'content'):
+        result = result.content
+    if key is not None and result is not None:
+        await asyncio.to_thread(llm_cache.set, key, result)
+    return result
+
+# Function to extract student details from the input text using a language model.
+# Pass `fields` (e.g. the missing fields) to ask only for those; the schema sent to the model shrinks to match.
+def extract_student_details(input_text: str, use_cache: bool = True, fields: Optional[List[str]] = None) -> dict:
+    # The prompt, format instructions and parser of each field set are precompiled once
+    return invoke_chain('extraction', input_text, use_cache, extraction_variant(fields))
+
+# Rule-based extraction for trivially parseable messages, with the course table built from Courses.
+# Set PRE_EXTRACTOR=0 to always use the language model.
+pre_extractor = PreExtractor(lambda: course_catalog.courses)
+course_catalog.subscribe(pre_extractor.invalidate_courses)
+PRE_EXTRACTOR_ENABLED = os.getenv('PRE_EXTRACTOR', '1') != '0'
+
+# Function to run the rule-based pre-extractor for the fields still missing.
+# When the result is complete the language model call can be skipped.
+def pre_extract_details(input_text: str, current_details: studentDetails,
+                        missing_fields: Optional[List[str]] = None, history: Optional[list] = None) -> PreExtraction:
+    if not PRE_EXTRACTOR_ENABLED:
+        return PreExtraction({}, False)
+    if missing_fields is None:
+        missing_fields = find_missing_details(current_details)
+    # The bot's last reply tells which name or city field a one-word answer is for
+    last_question = history[-1][1] if history else None
+    result = pre_extractor.extract(input_text, missing_fields, last_question)
+    metrics.increment('pre_extractor_total', result='hit' if result.complete else 'miss')
+    return result
+
+# Function to fill anything the model missed with locally extracted values (e.g. a regex-matched email)
+def fill_pre_extracted(extracted_details: dict, pre_extracted: PreExtraction) -> dict:
+    extracted_details = dict(extracted_details or {})
+    for field, value in pre_extracted.details.items():
+        if not extracted_details.get(field):
+            extracted_details[field] = value
+    return extracted_details
+
+# Function to merge new details with existing student details.
+# When `fields` is given only those fields are taken from the new details.
+def merge_student_details(current_details: studentDetails, new_details: dict,
+                          fields: Optional[List[str]] = None) -> studentDetails:
+    logger.debug("Data received: %s", new_details)
+    # Extract the personal details from the provided dictionary
+    personal_details = new_details or {}
+    if fields is not None:
+        personal_details = {field: value for field, value in personal_details.items() if field in fields}
 
     # Update only fields that are currently empty in the student details
     updated_details = {
@@ -105,52 +202,239 @@ def find_missing_details(student_details: studentDetails) -> List[str]:
     for field in vars(student_details):
         value = getattr(student_details, field)
         if value in [None, "", 0]:
-            print(f"Field '{field}' is empty.")
+            logger.debug("Field '%s' is empty.", field)
             empty_fields.append(field)
     return empty_fields
 
+# Function to render the recent history window (see append_history) for the prompts
+def format_history(history: list) -> str:
+    if not history:
+        return "(none, this is the first message)"
+    return '\n'.join(f"Student: {student_input}\nYou: {reply}" for student_input, reply in history)
+
+# Function to add a turn to the history window, keeping the last HISTORY_TURNS turns
+# with each message cut to HISTORY_MESSAGE_CHARS
+def append_history(history: list, student_input: str, reply: str) -> list:
+    if HISTORY_TURNS <= 0:
+        return []
+    turn = [student_input[:HISTORY_MESSAGE_CHARS], reply[:HISTORY_MESSAGE_CHARS]]
+    return (list(history) + [turn])[-HISTORY_TURNS:]
+
+# Inputs of the missing_info prompt; the courses the student can pick come from the course catalog
+def missing_info_inputs(missing_fields: List[str], student_input: str, history: list = ()) -> dict:
+    return {"missing_fields": missing_fields, "student_input": student_input,
+            "courses": course_catalog.describe(), "history": format_history(history)}
+
 # Function to prompt the student for missing information based on the missing fields
-def prompt_for_missing_info(missing_fields: List[str], student_input: str) -> str:
-    # Create a system prompt template to engage with the student and collect missing data
-    system_prompt = """You are a chatbot that collects student data that is needed for registration. You talk to the student in a friendly way.
-    Interact with student message:
-    {student_input}
-    If the user writes in Arabic, you must reply in Arabic. If the user writes in English, you must reply in English.
-    Here are some things to ask the student for in a conversational way:
-    ### Missing fields list: {missing_fields}
-
-    Only ask one question at a time, even if you don't get all the info.
-    If there are four items in the list, say hello.
-    If there are less than four items and the list is not empty, make the conversation seem continuous.
-    If the list is empty, thank the student, tell them you've collected their registration data, and say goodbye.
-    """
-    # Create the prompt using the template
-    prompt = PromptTemplate(template=system_prompt, input_variables=['missing_fields', "student_input"])
-
-    # Chain the prompt and language model to generate a conversational response
-    chain = prompt | llm
-    ai_response = chain.invoke({"missing_fields": missing_fields, "student_input": student_input})
-    return ai_response.content
-
-# Initialize an empty studentDetails object to store data across conversations
-current_student_details = studentDetails()
+def prompt_for_missing_info(missing_fields: List[str], student_input: str, use_cache: bool = True,
+                            history: list = ()) -> str:
+    # Chain the precompiled prompt and language model to generate a conversational response
+    return invoke_chain('missing_info', missing_info_inputs(missing_fields, student_input, history), use_cache)
+
+# Function to stream the reply for the missing fields chunk by chunk; a cached reply is sent in one chunk
+def stream_missing_info(missing_fields: List[str], student_input: str, use_cache: bool = True,
+                        history: list = ()) -> Iterator[str]:
+    inputs = missing_info_inputs(missing_fields, student_input, history)
+    key = make_cache_key('missing_info', chain_registry.fingerprint('missing_info'), inputs) if llm_cache else None
+    cached = llm_cache.get(key) if key and use_cache else None
+    if cached is not None:
+        yield cached
+        return
+    parts = []
+    for chunk in chain_registry.chain('missing_info', get_llm()).stream(inputs, config=llm_call_config('missing_info')):
+        if chunk.content:
+            parts.append(chunk.content)
+            yield chunk.content
+    if key:
+        llm_cache.set(key, ''.join(parts))
+
+# Async variant of stream_missing_info
+async def astream_missing_info(missing_fields: List[str], student_input: str, use_cache: bool = True,
+                               history: list = ()) -> AsyncIterator[str]:
+    inputs = missing_info_inputs(missing_fields, student_input, history)
+    key = make_cache_key('missing_info', chain_registry.fingerprint('missing_info'), inputs) if llm_cache else None
+    cached = await asyncio.to_thread(llm_cache.get, key) if key and use_cache else None
+    if cached is not None:
+        yield cached
+        return
+    parts = []
+    async for chunk in chain_registry.chain('missing_info', get_llm()).astream(inputs, config=llm_call_config('missing_info')):
+        if chunk.content:
+            parts.append(chunk.content)
+            yield chunk.content
+    if key:
+        await asyncio.to_thread(llm_cache.set, key, ''.join(parts))
+
+# Function to extract details and write the next question with a single language model call
+def extract_and_reply(current_details: studentDetails, missing_fields: List[str], student_input: str,
+                      use_cache: bool = True, history: list = ()) -> dict:
+    return invoke_chain('extract_and_reply', {
+        "current_details": current_details.model_dump_json(exclude_none=True),
+        "missing_fields": missing_fields,
+        "student_input": student_input,
+        "history": format_history(history),
+    }, use_cache, extraction_variant(missing_fields))
+
+# Conversation state for every student currently chatting, keyed by session id
+session_store = create_session_store()
+
+# Session id used when the caller does not identify the conversation
+DEFAULT_SESSION_ID = 'default'
+
+# Recent turns (student message and reply) kept with each conversation and shown to the model,
+# so a reply can follow on from what was said. Messages are cut to HISTORY_MESSAGE_CHARS.
+HISTORY_TURNS = int(os.getenv('HISTORY_TURNS', 4))
+HISTORY_MESSAGE_CHARS = 300
+
+# Every turn is appended to the transcripts table in batches (TRANSCRIPTS=0 disables this)
+transcript_store = create_transcript_store()
+
+# Completed registrations are saved by a background writer when WRITE_BEHIND=1, otherwise inline
+write_queue = create_write_queue()
+
+# Function to persist a completed registration. With write-behind the reply only waits for the
+# durable queue append; if the queue stays full, the registration is saved synchronously.
+def persist_registration(student_details: studentDetails):
+    if write_queue is not None:
+        try:
+            write_queue.enqueue(student_details)
+            # Known at once, although the row is only written when the queue is flushed
+            registered_students.add([(student_details.email, student_details.course)])
+            return
+        except WriteQueueFull as e:
+            logger.warning("Write-behind queue full (%s); saving synchronously", e)
+            metrics.increment('write_queue_full_total')
+    save_student_details(student_details)
+
+# Function to return the newest registration still waiting in the write-behind queue, or None
+def latest_pending_registration() -> Optional[studentDetails]:
+    return write_queue.latest_pending() if write_queue is not None else None
+
+# Function to return the newest registration as a student row (see db.get_latest_student).
+# `pending`, a registration still waiting in the write-behind queue (latest_pending_registration),
+# is returned first, without an id yet, so a student who has just completed the chat always sees
+# their own details.
+def get_latest_registration(pending: Optional[studentDetails] = None):
+    if pending is None:
+        return db.get_latest_student()
+    return (None, pending.language, pending.first_name, pending.last_name, pending.city, pending.email,
+            course_catalog.name(pending.course) or pending.course)
+
+# Engine modes: 'two_call' extracts and replies with separate LLM calls,
+# 'single_call' gets both from one structured-output call
+ENGINE_MODES = ('two_call', 'single_call')
+ENGINE_MODE = os.getenv('ENGINE_MODE', 'two_call')
+
+# Function to load the partially collected details and the recent history of a conversation
+def load_conversation(session_id: str) -> Tuple[studentDetails, list]:
+    state = session_store.load(session_id)
+    if state is None:
+        return studentDetails(), []
+    return studentDetails(**state['details']), state.get('history', [])
+
+# Function to load the partially collected details of a conversation
+def load_student_details(session_id: str) -> studentDetails:
+    return load_conversation(session_id)[0]
 
 # The main chatbot function that processes user input and manages the conversation flow
-def chatbot_response(text_input: str) -> str:
-    global current_student_details
+def chatbot_response(text_input: str, session_id: str = DEFAULT_SESSION_ID, mode: Optional[str] = None) -> str:
+    mode = mode or ENGINE_MODE
+    if mode not in ENGINE_MODES:
+        raise ValueError(f"Unknown engine mode: {mode!r}")
+
+    token = _turn_mode.set(mode)
+    tokens_token = _start_turn_tokens()
+    try:
+        with metrics.timer('chat_turn_seconds', mode=mode):
+            metrics.increment('chat_turns_total', mode=mode)
+            return _chatbot_turn(text_input, session_id, mode)
+    finally:
+        _end_turn_tokens(tokens_token, mode)
+        _turn_mode.reset(token)
+
+def _chatbot_turn(text_input: str, session_id: str, mode: str) -> str:
+    with stage_timer('load_session'):
+        current_student_details, history = load_conversation(session_id)
 
-    # Extract details from the student's input text
-    extracted_details = extract_student_details(text_input)
+    reply = None
+    # Only the fields still missing are extracted and merged this turn
+    wanted_fields = find_missing_details(current_student_details)
+    with stage_timer('pre_extract'):
+        pre_extracted = pre_extract_details(text_input, current_student_details, wanted_fields, history)
+    if pre_extracted.complete:
+        # The message was understood without the language model
+        extracted_details = pre_extracted.details
+    elif mode == 'single_call':
+        # Extract details and draft the next question in one round trip
+        with stage_timer('extract'):
+            turn = extract_and_reply(current_student_details, wanted_fields, text_input, history=history)
+        extracted_details = fill_pre_extracted(turn.get('student_details'), pre_extracted)
+        reply = turn.get('reply')
+    else:
+        # Extract details from the student's input text
+        with stage_timer('extract'):
+            extracted_details = fill_pre_extracted(
+                extract_student_details(text_input, fields=wanted_fields), pre_extracted)
 
+    update = _advance_conversation(session_id, current_student_details, extracted_details, mode, wanted_fields)
+    reply = update.final_message or reply
+    try:
+        if not reply:
+            # Otherwise, prompt the student for any missing information
+            with stage_timer('prompt'):
+                reply = prompt_for_missing_info(update.missing_fields, text_input, history=history)
+    finally:
+        # Also when the reply failed, so the details extracted this turn are kept
+        _finish_turn(session_id, mode, text_input, update, history, reply or '')
+    return with_notice(update.notice, reply)
+
+# Outcome of merging one turn's extracted details into a conversation
+class TurnUpdate(NamedTuple):
+    details: studentDetails
+    # Fields the turn set or changed
+    delta: dict
+    missing_fields: List[str]
+    # The "[redirect]" message once registration is complete, else None
+    final_message: Optional[str]
+    # Shown before the reply, e.g. greeting a returning student (see returning_student_notice)
+    notice: Optional[str] = None
+
+# Function to greet a student whose email is already registered, naming their courses.
+# The check is an in-memory lookup (db.registered_students), so it costs no query or model call.
+def returning_student_notice(email: str) -> Optional[str]:
+    course_ids = registered_students.courses(email)
+    if not course_ids:
+        return None
+    metrics.increment('returning_students_total')
+    names = ', '.join(course_catalog.name(course_id) or str(course_id) for course_id in sorted(course_ids))
+    return f"Welcome back! You're already registered for {names}."
+
+# Function to put a turn's notice before its reply
+def with_notice(notice: Optional[str], reply: str) -> str:
+    return f"{notice} {reply}" if notice else reply
+
+# Function to merge a turn's extracted details into the conversation.
+# A completed registration is persisted and its session dropped; otherwise _finish_turn saves the session.
+def _advance_conversation(session_id: str, current_student_details: studentDetails, extracted_details: dict, mode: str,
+                          wanted_fields: Optional[List[str]] = None) -> TurnUpdate:
+    previous_details = current_student_details.model_dump()
     # Merge the extracted details with the current stored details
-    current_student_details = merge_student_details(current_student_details, extracted_details)
+    with stage_timer('merge'):
+        current_student_details = merge_student_details(current_student_details, extracted_details, wanted_fields)
+    delta = {field: value for field, value in current_student_details.model_dump().items()
+             if value != previous_details[field]}
 
     # Identify any missing fields in the student's information
-    missing_fields = find_missing_details(current_student_details)
+    with stage_timer('missing_fields'):
+        missing_fields = find_missing_details(current_student_details)
 
     # If no missing fields, save the student's details and thank them for registering
     if not missing_fields:
-        save_student_details(current_student_details)
+        # Registering again for the same course replaces the earlier registration
+        already_registered = registered_students.is_registered(current_student_details.email,
+                                                               current_student_details.course)
+        with stage_timer('save'):
+            persist_registration(current_student_details)
         messages = [
             "Thank you, I've collected your data that we need for registration. See you soon!",
             "Thanks! Your information has been recorded. Have a great day!",
@@ -159,8 +443,134 @@ def chatbot_response(text_input: str) -> str:
             "Got it! Your data is safe with us. See you next time!"
         ]
         thanks_message = random.choice(messages)
-        current_student_details = studentDetails()  # Reset the details for the next interaction
-        return f"{thanks_message} [redirect]"
+        if already_registered:
+            course_name = course_catalog.name(current_student_details.course) or current_student_details.course
+            thanks_message = f"Welcome back! I've updated your registration for {course_name}. See you soon!"
+        session_store.delete(session_id)  # Reset the details for the next interaction
+        metrics.increment('registrations_completed_total', mode=mode)
+        logger.info("Registration completed (mode=%s)", mode)
+        return TurnUpdate(current_student_details, delta, missing_fields, f"{thanks_message} [redirect]")
+    notice = returning_student_notice(current_student_details.email) if 'email' in delta else None
+    return TurnUpdate(current_student_details, delta, missing_fields, None, notice)
+
+# Function to end a turn: keep the partial details and the history window for the next turn
+# (unless the registration completed) and append the turn to the transcript
+def _finish_turn(session_id: str, mode: str, text_input: str, update: TurnUpdate, history: list, reply: str):
+    if update.final_message is None:
+        if reply:
+            history = append_history(history, text_input, with_notice(update.notice, reply))
+        with stage_timer('save_session'):
+            session_store.save(session_id, {'details': update.details.model_dump(), 'history': history})
+    if transcript_store is not None:
+        transcript_store.record(session_id, mode, text_input, update.delta, reply, notice=update.notice)
+
+# Streaming variant of chatbot_response: yields the reply in chunks as the model generates them.
+# Extraction still needs the full model output, so only the reply to the student is streamed.
+def chatbot_response_stream(text_input: str, session_id: str = DEFAULT_SESSION_ID) -> Iterator[str]:
+    token = _turn_mode.set('stream')
+    tokens_token = _start_turn_tokens()
+    update, history, parts = None, [], []
+    try:
+        metrics.increment('chat_turns_total', mode='stream')
+        with stage_timer('load_session'):
+            current_student_details, history = load_conversation(session_id)
+        wanted_fields = find_missing_details(current_student_details)
+        with stage_timer('pre_extract'):
+            pre_extracted = pre_extract_details(text_input, current_student_details, wanted_fields, history)
+        if pre_extracted.complete:
+            extracted_details = pre_extracted.details
+        else:
+            with stage_timer('extract'):
+                extracted_details = fill_pre_extracted(
+                    extract_student_details(text_input, fields=wanted_fields), pre_extracted)
+
+        update = _advance_conversation(session_id, current_student_details, extracted_details, 'stream', wanted_fields)
+        if update.final_message:
+            parts.append(update.final_message)
+            yield update.final_message
+            return
+        if update.notice:
+            yield update.notice + ' '
+
+        with stage_timer('prompt'):
+            for chunk in stream_missing_info(update.missing_fields, text_input, history=history):
+                parts.append(chunk)
+                yield chunk
+    finally:
+        # Also when the stream failed or the client went away, with the part of the reply sent
+        if update is not None:
+            _finish_turn(session_id, 'stream', text_input, update, history, ''.join(parts))
+        _end_turn_tokens(tokens_token, 'stream')
+        _turn_mode.reset(token)
+
+# Async streaming variant for the ASGI server: model calls are awaited, so one worker can
+# hold many conversations open at once. Session and database work runs in a thread.
+async def achatbot_response_stream(text_input: str, session_id: str = DEFAULT_SESSION_ID) -> AsyncIterator[str]:
+    token = _turn_mode.set('stream')
+    tokens_token = _start_turn_tokens()
+    update, history, parts = None, [], []
+    try:
+        metrics.increment('chat_turns_total', mode='stream')
+        with stage_timer('load_session'):
+            current_student_details, history = await asyncio.to_thread(load_conversation, session_id)
+        wanted_fields = find_missing_details(current_student_details)
+        with stage_timer('pre_extract'):
+            pre_extracted = await asyncio.to_thread(pre_extract_details, text_input, current_student_details,
+                                                    wanted_fields, history)
+        if pre_extracted.complete:
+            extracted_details = pre_extracted.details
+        else:
+            with stage_timer('extract'):
+                extracted_details = fill_pre_extracted(
+                    await ainvoke_chain('extraction', text_input, variant=extraction_variant(wanted_fields)), pre_extracted)
+
+        update = await asyncio.to_thread(
+            _advance_conversation, session_id, current_student_details, extracted_details, 'stream', wanted_fields)
+        if update.final_message:
+            parts.append(update.final_message)
+            yield update.final_message
+            return
+        if update.notice:
+            yield update.notice + ' '
+
+        with stage_timer('prompt'):
+            async for chunk in astream_missing_info(update.missing_fields, text_input, history=history):
+                parts.append(chunk)
+                yield chunk
+    finally:
+        if update is not None:
+            await asyncio.to_thread(_finish_turn, session_id, 'stream', text_input, update, history, ''.join(parts))
+        _end_turn_tokens(tokens_token, 'stream')
+        _turn_mode.reset(token)
+
+# Function to summarise turns, LLM calls and latency per engine mode, for comparing the modes
+def engine_stats() -> dict:
+    stats = {}
+    for mode in ENGINE_MODES:
+        turns = metrics.counter_value('chat_turns_total', mode=mode)
+        calls = metrics.counter_value('llm_calls_total', mode=mode)
+        stats[mode] = {
+            'turns': turns,
+            'llm_calls': calls,
+            'llm_calls_per_turn': calls / turns if turns else 0.0,
+            'registrations_completed': metrics.counter_value('registrations_completed_total', mode=mode),
+        }
+    for summary in metrics.snapshot()['summaries']:
+        mode = summary['labels'].get('mode')
+        if mode not in stats:
+            continue
+        if summary['name'] == 'chat_turn_seconds':
+            stats[mode].update(mean_latency_seconds=summary['mean'], max_latency_seconds=summary['max'])
+        elif summary['name'] == 'chat_turn_tokens':
+            stats[mode][f"{summary['labels']['kind']}_tokens_per_turn"] = summary['mean']
+    stats['pre_extractor'] = pre_extractor_stats()
+    stats['llm_cache'] = llm_cache.stats() if llm_cache is not None else None
+    return stats
 
-    # Otherwise, prompt the student for any missing information
-    return prompt_for_missing_info(missing_fields, text_input)
+# Function to report how often the pre-extractor answered without the language model
+def pre_extractor_stats() -> dict:
+    hits = metrics.counter_value('pre_extractor_total', result='hit')
+    misses = metrics.counter_value('pre_extractor_total', result='miss')
+    total = hits + misses
+    return {'hits': hits, 'misses': misses, 'hit_rate': hits / total if total else 0.0,
+            'llm_calls_saved': hits}
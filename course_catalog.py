@@ -0,0 +1,74 @@
+import threading
+from typing import NamedTuple, Optional
+
+
+class Course(NamedTuple):
+    course_id: int
+    course_name: str
+    course_description: Optional[str]
+
+
+# Describe (id, name) course choices for the language model, e.g. "'1' for Python, '2' for Math"
+def describe_courses(choices):
+    return ', '.join(f"'{course_id}' for {name}" for course_id, name in choices)
+
+
+# An in-memory copy of the Courses table, loaded once and shared by every request thread.
+# The extraction schema, the prompts, the course filter and the course names shown with each
+# student are all read from it, so a course saved with db.save_course_details is picked up
+# without a redeploy.
+class CourseCatalog:
+    def __init__(self, load_courses):
+        # `load_courses` returns the Courses rows (course_id, course_name, course_description)
+        self._load_courses = load_courses
+        self._loaded = None
+        self._listeners = []
+        self._lock = threading.Lock()
+
+    # Return (courses ordered by id, {course_id: course_name}), loading them on first use.
+    # An empty result is not kept, so the table is read again once it has been created and seeded.
+    def _snapshot(self):
+        snapshot = self._loaded
+        if snapshot is None:
+            with self._lock:
+                snapshot = self._loaded
+                if snapshot is None:
+                    courses = tuple(sorted(Course(*row[:3]) for row in self._load_courses()))
+                    snapshot = (courses, {course.course_id: course.course_name for course in courses})
+                    if courses:
+                        self._loaded = snapshot
+        return snapshot
+
+    @property
+    def courses(self):
+        return self._snapshot()[0]
+
+    # Course id -> course name
+    def names(self):
+        return self._snapshot()[1]
+
+    # Name of a course id given as a number or a string; None for an unknown course
+    def name(self, course_id):
+        try:
+            return self.names().get(int(course_id))
+        except (TypeError, ValueError):
+            return None
+
+    # (id, name) pairs with string ids, as used in studentDetails.course; hashable, for cache keys
+    def choices(self):
+        return tuple((str(course.course_id), course.course_name) for course in self.courses)
+
+    # The courses as a short sentence for prompts (see describe_courses)
+    def describe(self):
+        return describe_courses(self.choices())
+
+    # Call `callback()` whenever the catalog is invalidated (e.g. to drop values derived from it)
+    def subscribe(self, callback):
+        self._listeners.append(callback)
+
+    # Drop the loaded courses so they are read again on next use
+    def invalidate(self):
+        with self._lock:
+            self._loaded = None
+        for callback in list(self._listeners):
+            callback()
@@ -1,181 +1,536 @@
+import functools
+import logging
+import os
+import queue
+import re
 import sqlite3
+import threading
+import time
+from contextlib import contextmanager
 
-def create_student_details_tables():
-    # Connect to the SQLite database (or create it if it doesn't exist)
-    conn = sqlite3.connect('student_details.db')
+from course_catalog import CourseCatalog
+from metrics import metrics
+from registered_students import RegisteredStudents
 
-    # Create a cursor object to interact with the database
-    cursor = conn.cursor()
+logger = logging.getLogger(__name__)
 
-    # Create the student_details table if it doesn't already exist
-    # This table will store the details of students like name, language, city, etc.
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS student_details (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        language TEXT,
-        first_name TEXT,
-        last_name TEXT,
-        city TEXT,
-        email TEXT,
-        course INTEGER,
-        FOREIGN KEY (course) REFERENCES Courses(course_id))''')
-
-    # Create the Courses table if it doesn't already exist
-    # This table will store details of available courses
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS Courses (
-        course_id INTEGER PRIMARY KEY,
-        course_name TEXT NOT NULL,
-        course_description TEXT)''')
-
-    # Insert predefined courses into the Courses table if they don't exist
-    cursor.execute('''
-    INSERT OR IGNORE INTO Courses (course_id, course_name, course_description) VALUES
-    (1, 'Python', 'An introductory course on Python programming.'),
-    (2, 'Math', 'A comprehensive course on Mathematics.'),
-    (3, 'Machine Learning', 'A course on the fundamentals of Machine Learning.')''')
-
-    # Commit the changes and close the connection to the database
-    conn.commit()
-    conn.close()
+# Path of the SQLite database, overridable with the STUDENT_DB_PATH environment variable
+DB_PATH = os.getenv('STUDENT_DB_PATH', 'student_details.db')
 
-def save_student_details(student_details):
-    # Connect to the SQLite database
-    conn = sqlite3.connect('student_details.db')
+# Maximum number of open connections per process
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 8))
 
-    # Create a cursor object to execute SQL queries
-    cursor = conn.cursor()
+# Pragmas applied to every pooled connection. WAL lets readers on /all-students run
+# while a registration is being written; synchronous=NORMAL is durable in WAL mode
+# and avoids an fsync on every commit.
+PRAGMAS = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA busy_timeout=5000',
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA cache_size=-16000',
+)
 
-    # Insert the student's details into the student_details table
-    cursor.execute('''
-    INSERT INTO student_details (language, first_name, last_name, city, email, course)
+# SQL statements are module constants so each pooled connection's statement cache
+# reuses the prepared statement instead of re-parsing the SQL on every call
+# A student registering again for the same course replaces their earlier row (see
+# deduplicate_registrations); the new row gets a new id, so it is listed as the latest registration.
+INSERT_STUDENT_SQL = '''
+    INSERT OR REPLACE INTO student_details (language, first_name, last_name, city, email, course)
     VALUES (?, ?, ?, ?, ?, ?)
-    ''', (student_details.language, student_details.first_name, student_details.last_name, student_details.city, student_details.email, int(student_details.course)))
+    '''
 
-    # Commit the transaction and close the connection to the database
-    conn.commit()
-    conn.close()
+# Student rows are read without joining Courses; the course name comes from the course catalog
+STUDENT_COLUMNS_SQL = '''
+    SELECT sd.id, sd.language, sd.first_name, sd.last_name, sd.city, sd.email, sd.course
+    FROM student_details sd
+    '''
 
-def get_latest_student():
-    # Connect to the SQLite database
-    conn = sqlite3.connect('student_details.db')
+LATEST_STUDENT_SQL = STUDENT_COLUMNS_SQL + 'ORDER BY sd.id DESC LIMIT 1'
 
-    # Create a cursor object to execute SQL queries
-    cursor = conn.cursor()
+STUDENTS_BY_COURSE_SQL = STUDENT_COLUMNS_SQL + 'WHERE sd.course = ?'
 
-    # Query to get the most recent student's details, joined with their course information
-    query = '''
-    SELECT sd.id, sd.language, sd.first_name, sd.last_name, sd.city, sd.email, c.course_name
-    FROM student_details sd
-    JOIN Courses c ON sd.course = c.course_id
-    ORDER BY sd.id DESC LIMIT 1
+DELETE_STUDENT_SQL = 'DELETE FROM student_details WHERE id = ? RETURNING email, course'
+
+REGISTRATION_KEYS_SQL = 'SELECT email, course FROM student_details WHERE email IS NOT NULL'
+
+INSERT_COURSE_SQL = '''
+    INSERT INTO Courses (course_id, course_name, course_description)
+    VALUES (?, ?, ?)
     '''
-    # Execute the query and fetch the latest student's data
-    cursor.execute(query)
-    student = cursor.fetchone()
 
-    # Close the connection to the database and return the student data
-    conn.close()
-    return student
+ALL_COURSES_SQL = 'SELECT * FROM Courses'
 
-def get_all_students():
-    # Connect to the SQLite database
-    conn = sqlite3.connect('student_details.db')
+# Indexes for course filtering (with id order for keyset pagination) and email lookups.
+# student_details.id is the rowid, so it is already indexed.
+CREATE_INDEXES_SQL = (
+    'CREATE INDEX IF NOT EXISTS idx_student_details_course_id ON student_details (course, id)',
+    'CREATE INDEX IF NOT EXISTS idx_student_details_email ON student_details (email COLLATE NOCASE)',
+)
 
-    # Create a cursor object to execute SQL queries
-    cursor = conn.cursor()
+# One registration per email and course. Older duplicates are removed first, keeping the newest.
+# The unique index also serves email lookups, so the plain email index is dropped.
+DEDUPLICATE_REGISTRATIONS_SQL = (
+    '''DELETE FROM student_details WHERE email IS NOT NULL AND id NOT IN (
+        SELECT MAX(id) FROM student_details WHERE email IS NOT NULL GROUP BY email COLLATE NOCASE, course)''',
+    'CREATE UNIQUE INDEX IF NOT EXISTS idx_student_details_email_course '
+    'ON student_details (email COLLATE NOCASE, course)',
+    'DROP INDEX IF EXISTS idx_student_details_email',
+)
 
-    try:
-        # Query to get all student details along with their course information
-        query = '''
-        SELECT sd.id, sd.language, sd.first_name, sd.last_name, sd.city, sd.email, c.course_name
-        FROM student_details sd
-        JOIN Courses c ON sd.course = c.course_id
-        '''
-        cursor.execute(query)
-        students = cursor.fetchall()  # Fetch all student data
-    except Exception as e:
-        print(f"Error fetching students: {e}")
-        students = []  # If there is an error, return an empty list
-    finally:
-        # Close the connection to the database
-        conn.close()
-    return students
+# Append-only log of chat turns; payload is an encoded turn (see transcripts.py)
+CREATE_TRANSCRIPTS_SQL = (
+    '''CREATE TABLE IF NOT EXISTS transcripts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        session_id TEXT NOT NULL,
+        created_at REAL NOT NULL,
+        mode TEXT,
+        payload BLOB NOT NULL)''',
+    'CREATE INDEX IF NOT EXISTS idx_transcripts_session_id ON transcripts (session_id, id)',
+)
 
-def delete_student(student_id):
-    # Connect to the SQLite database
-    conn = sqlite3.connect('student_details.db')
+# Version of the student and course data: a one-row counter that triggers bump in the same
+# transaction as every insert, update and delete, whichever process makes it. Pages built from
+# the data are cached and revalidated against it (see page_cache.py). It starts at a random
+# value so that a recreated database does not repeat the versions of the old one.
+DATA_VERSION_TABLES = ('student_details', 'Courses')
 
-    # Create a cursor object to execute SQL queries
-    cursor = conn.cursor()
+CREATE_DATA_VERSION_SQL = (
+    'CREATE TABLE IF NOT EXISTS data_version (id INTEGER PRIMARY KEY CHECK (id = 1), version INTEGER NOT NULL)',
+    'INSERT OR IGNORE INTO data_version (id, version) VALUES (1, abs(random() % 1000000000000))',
+) + tuple(
+    f'CREATE TRIGGER IF NOT EXISTS {table.lower()}_after_{operation.lower()}_data_version '
+    f'AFTER {operation} ON {table} BEGIN UPDATE data_version SET version = version + 1; END'
+    for table in DATA_VERSION_TABLES for operation in ('INSERT', 'UPDATE', 'DELETE')
+)
 
-    # Delete the student with the given ID from the student_details table
-    cursor.execute("DELETE FROM student_details WHERE id = ?", (student_id,))
+DATA_VERSION_SQL = 'SELECT version FROM data_version'
 
-    # Commit the transaction and close the connection to the database
-    conn.commit()
-    conn.close()
+INSERT_TRANSCRIPT_SQL = 'INSERT INTO transcripts (session_id, created_at, mode, payload) VALUES (?, ?, ?, ?)'
 
-# Function to save course details to the Courses table
-def save_course_details(course_details):
-    # Connect to the SQLite database
-    conn = sqlite3.connect('student_details.db')
+TRANSCRIPT_COLUMNS_SQL = 'SELECT id, session_id, created_at, mode, payload FROM transcripts '
 
-    # Create a cursor object to execute SQL queries
-    cursor = conn.cursor()
+# Default and maximum number of rows per page of the student listing
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
 
-    # Insert the new course details into the Courses table
-    cursor.execute('''
-    INSERT INTO Courses (course_id, course_name, course_description)
-    VALUES (?, ?, ?)
-    ''', (course_details['course_id'], course_details['course_name'], course_details['course_description']))
+# A complete email address; searching for one uses the email index instead of LIKE
+EMAIL_RE = re.compile(r'[^@\s]+@[^@\s]+\.[^@\s]+')
 
-    # Commit the transaction and close the connection to the database
-    conn.commit()
-    conn.close()
 
-# Function to retrieve all courses from the Courses table
-def get_all_courses():
-    # Connect to the SQLite database
-    conn = sqlite3.connect('student_details.db')
+# A thread-safe pool of SQLite connections for one database file.
+# Connections are created on demand up to `max_size`; callers beyond that wait for a free one.
+class ConnectionPool:
+    def __init__(self, db_path, max_size=DB_POOL_SIZE, pragmas=PRAGMAS):
+        self.db_path = db_path
+        self.max_size = max_size
+        self.pragmas = pragmas
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _new_connection(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False, cached_statements=256)
+        for pragma in self.pragmas:
+            conn.execute(pragma)
+        return conn
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.max_size:
+                self._created += 1
+                create = True
+            else:
+                create = False
+        if create:
+            try:
+                return self._new_connection()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        return self._idle.get()
+
+    # Borrow a connection for the duration of a `with` block.
+    # Uncommitted work is rolled back before the connection goes back to the pool.
+    @contextmanager
+    def connection(self):
+        start = time.perf_counter()
+        conn = self._acquire()
+        metrics.observe('db_pool_wait_seconds', time.perf_counter() - start)
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.put(conn)
+
+    # Close every idle connection (e.g. before pointing the module at another database)
+    def close_all(self):
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+# Return the process-wide connection pool, creating it on first use
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(DB_PATH, DB_POOL_SIZE)
+    return _pool
+
+
+# Point the data access layer at another database file and/or pool size
+def configure(db_path=None, pool_size=None):
+    global DB_PATH, DB_POOL_SIZE, _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close_all()
+            _pool = None
+        if db_path is not None:
+            DB_PATH = db_path
+        if pool_size is not None:
+            DB_POOL_SIZE = pool_size
+    course_catalog.invalidate()
+    registered_students.invalidate()
+
+
+# Borrow a pooled connection; use `with conn:` inside to commit a transaction
+def get_connection():
+    return get_pool().connection()
+
+
+# Record how long each call of a data access function takes, as db_query_seconds{query=<function>}
+def timed_query(func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with metrics.timer('db_query_seconds', query=func.__name__):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def create_student_details_tables():
+    with get_connection() as conn:
+        with conn:
+            # Create the student_details table if it doesn't already exist
+            # This table will store the details of students like name, language, city, etc.
+            conn.execute('''
+            CREATE TABLE IF NOT EXISTS student_details (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                language TEXT,
+                first_name TEXT,
+                last_name TEXT,
+                city TEXT,
+                email TEXT,
+                course INTEGER,
+                FOREIGN KEY (course) REFERENCES Courses(course_id))''')
+
+            # Create the Courses table if it doesn't already exist
+            # This table will store details of available courses
+            conn.execute('''
+            CREATE TABLE IF NOT EXISTS Courses (
+                course_id INTEGER PRIMARY KEY,
+                course_name TEXT NOT NULL,
+                course_description TEXT)''')
+
+            # Insert predefined courses into the Courses table if they don't exist
+            conn.execute('''
+            INSERT OR IGNORE INTO Courses (course_id, course_name, course_description) VALUES
+            (1, 'Python', 'An introductory course on Python programming.'),
+            (2, 'Math', 'A comprehensive course on Mathematics.'),
+            (3, 'Machine Learning', 'A course on the fundamentals of Machine Learning.')''')
+
+            for statement in CREATE_INDEXES_SQL:
+                conn.execute(statement)
 
-    # Create a cursor object to execute SQL queries
-    cursor = conn.cursor()
+def create_transcript_table():
+    with get_connection() as conn:
+        with conn:
+            for statement in CREATE_TRANSCRIPTS_SQL:
+                conn.execute(statement)
 
+def deduplicate_registrations():
+    with get_connection() as conn:
+        with conn:
+            for statement in DEDUPLICATE_REGISTRATIONS_SQL:
+                conn.execute(statement)
+    registered_students.invalidate()
+
+def create_data_version():
+    with get_connection() as conn:
+        with conn:
+            for statement in CREATE_DATA_VERSION_SQL:
+                conn.execute(statement)
+
+# Schema migrations, applied in order by migrate(). PRAGMA user_version records how many have
+# run, so each step runs once per database. Steps must be idempotent (a step interrupted before
+# the version is recorded is run again); append new steps and never change one that has shipped.
+MIGRATIONS = (
+    create_student_details_tables,
+    create_transcript_table,
+    deduplicate_registrations,
+    create_data_version,
+)
+
+# Function to return the number of migrations applied to the database
+def schema_version():
+    with get_connection() as conn:
+        return conn.execute('PRAGMA user_version').fetchone()[0]
+
+# Function to bring the database schema up to date; run once per deploy (python migrate.py),
+# not on every app import. Returns the number of migrations applied.
+def migrate():
+    version = schema_version()
+    for number, step in enumerate(MIGRATIONS[version:], start=version + 1):
+        logger.info("Applying migration %d: %s", number, step.__name__)
+        step()
+        with get_connection() as conn:
+            conn.execute(f'PRAGMA user_version = {number}')
+    course_catalog.invalidate()
+    return max(len(MIGRATIONS) - version, 0)
+
+# Replace the course id at the end of each student row with the course name from the catalog
+def with_course_names(rows):
+    names = course_catalog.names()
+    return [row[:-1] + (names.get(row[-1]),) for row in rows]
+
+# INSERT_STUDENT_SQL parameters for a studentDetails object (ValueError if the course is not a number)
+def student_row(student_details):
+    return (student_details.language, student_details.first_name, student_details.last_name,
+            student_details.city, student_details.email, int(student_details.course))
+
+@timed_query
+def save_student_details(student_details):
+    # Insert the student's details into the student_details table and commit
+    with get_connection() as conn:
+        with conn:
+            conn.execute(INSERT_STUDENT_SQL, student_row(student_details))
+    registered_students.add([(student_details.email, student_details.course)])
+
+# (email, course) of each student row
+def registration_keys(rows):
+    return [(row[4], row[5]) for row in rows]
+
+# Function to insert many student rows (see student_row) in a single transaction
+@timed_query
+def save_student_rows(rows):
+    with get_connection() as conn:
+        with conn:
+            conn.executemany(INSERT_STUDENT_SQL, rows)
+    registered_students.add(registration_keys(rows))
+
+@timed_query
+def get_latest_student():
+    # Query to get the most recent student's details, with their course name
+    with get_connection() as conn:
+        row = conn.execute(LATEST_STUDENT_SQL).fetchone()
+    return with_course_names([row])[0] if row is not None else None
+
+@timed_query
+def get_all_students():
     try:
-        # Query to retrieve all courses from the Courses table
-        cursor.execute("SELECT * FROM Courses")
-        courses = cursor.fetchall()  # Fetch all course data
+        # Query to get all student details; course names are filled in from the catalog
+        with get_connection() as conn:
+            rows = conn.execute(STUDENT_COLUMNS_SQL).fetchall()
+        return with_course_names(rows)
     except Exception as e:
-        print(f"Error fetching courses: {e}")
-        courses = []  # If there is an error, return an empty list
-    finally:
-        # Close the connection to the database
-        conn.close()
-    return courses
+        logger.error("Error fetching students: %s", e)
+        return []  # If there is an error, return an empty list
 
-# Function to retrieve students by a specific course ID
-def get_students_by_course(course_id):
-    # Connect to the SQLite database
-    conn = sqlite3.connect('student_details.db')
+@timed_query
+def delete_student(student_id):
+    # Delete the student with the given ID from the student_details table and commit
+    with get_connection() as conn:
+        with conn:
+            deleted = conn.execute(DELETE_STUDENT_SQL, (student_id,)).fetchone()
+    if deleted is not None:
+        registered_students.discard(*deleted)
+
+# Function to save course details to the Courses table
+@timed_query
+def save_course_details(course_details):
+    # Insert the new course details into the Courses table and commit
+    with get_connection() as conn:
+        with conn:
+            conn.execute(INSERT_COURSE_SQL, (
+                course_details['course_id'], course_details['course_name'], course_details['course_description']))
+    # Everything derived from the course list is rebuilt on next use
+    course_catalog.invalidate()
+
+# Function to return the current data version (see CREATE_DATA_VERSION_SQL), or None before
+# the database is migrated
+def get_data_version():
+    try:
+        with get_connection() as conn:
+            row = conn.execute(DATA_VERSION_SQL).fetchone()
+    except sqlite3.OperationalError:
+        return None
+    return row[0] if row is not None else None
+
+# Function to retrieve all courses from the Courses table
+@timed_query
+def get_all_courses():
+    try:
+        with get_connection() as conn:
+            return conn.execute(ALL_COURSES_SQL).fetchall()
+    except Exception as e:
+        logger.error("Error fetching courses: %s", e)
+        return []  # If there is an error, return an empty list
 
-    # Create a cursor object to execute SQL queries
-    cursor = conn.cursor()
+# The Courses table, cached in memory (see course_catalog.py); save_course_details invalidates it
+course_catalog = CourseCatalog(get_all_courses)
 
+# Function to read the (email, course) of every registration
+@timed_query
+def get_registration_keys():
+    with get_connection() as conn:
+        return conn.execute(REGISTRATION_KEYS_SQL).fetchall()
+
+# Who has registered for which course, kept in memory (see registered_students.py); the save
+# and delete functions keep it current
+registered_students = RegisteredStudents(get_registration_keys)
+
+# Function to retrieve students by a specific course ID
+@timed_query
+def get_students_by_course(course_id):
     try:
         # Query to get students based on the selected course ID
-        query = '''
-        SELECT sd.id, sd.language, sd.first_name, sd.last_name, sd.city, sd.email, c.course_name
-        FROM student_details sd
-        JOIN Courses c ON sd.course = c.course_id
-        WHERE sd.course = ?
-        '''
-        cursor.execute(query, (course_id,))
-        students = cursor.fetchall()  # Fetch the students who are enrolled in the specified course
+        with get_connection() as conn:
+            rows = conn.execute(STUDENTS_BY_COURSE_SQL, (course_id,)).fetchall()
+        return with_course_names(rows)
     except Exception as e:
-        print(f"Error fetching students for course {course_id}: {e}")
-        students = []  # If there is an error, return an empty list
-    finally:
-        # Close the connection to the database
-        conn.close()
-    return students
+        logger.error("Error fetching students for course %s: %s", course_id, e)
+        return []  # If there is an error, return an empty list
+
+# Escape LIKE wildcards so a search term is matched literally
+def _like_pattern(term):
+    escaped = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f'%{escaped}%'
+
+# Function to fetch one page of students using keyset pagination on the id.
+# Pass `after_id` for the next page or `before_id` for the previous one. Unfiltered and
+# course-filtered pages are a single indexed range scan, so their cost does not grow with the
+# table size. `search` matches name, city or email: a complete email address uses the email
+# index, but any other term is a LIKE '%term%' match that scans the table.
+# Returns {'students': rows, 'next_after': id or None, 'prev_before': id or None}.
+@timed_query
+def get_students_page(after_id=None, before_id=None, limit=DEFAULT_PAGE_SIZE, course_id=None, search=None):
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    conditions, params = [], []
+    if course_id:
+        conditions.append('sd.course = ?')
+        params.append(int(course_id))
+    search = (search or '').strip()
+    if EMAIL_RE.fullmatch(search):
+        conditions.append('sd.email = ? COLLATE NOCASE')
+        params.append(search)
+    elif search:
+        pattern = _like_pattern(search)
+        conditions.append("(sd.first_name LIKE ? ESCAPE '\\' OR sd.last_name LIKE ? ESCAPE '\\'"
+                          " OR sd.city LIKE ? ESCAPE '\\' OR sd.email LIKE ? ESCAPE '\\')")
+        params.extend([pattern] * 4)
+
+    backwards = before_id is not None
+    if backwards:
+        conditions.append('sd.id < ?')
+        params.append(int(before_id))
+    elif after_id is not None:
+        conditions.append('sd.id > ?')
+        params.append(int(after_id))
+
+    query = STUDENT_COLUMNS_SQL
+    if conditions:
+        query += 'WHERE ' + ' AND '.join(conditions) + ' '
+    query += f"ORDER BY sd.id {'DESC' if backwards else 'ASC'} LIMIT ?"
+    params.append(limit + 1)  # One extra row tells us whether there is another page
+
+    with get_connection() as conn:
+        rows = conn.execute(query, params).fetchall()
+
+    has_more = len(rows) > limit
+    rows = with_course_names(rows[:limit])
+    if backwards:
+        rows.reverse()
+        has_next, has_prev = True, has_more
+    else:
+        has_next, has_prev = has_more, after_id is not None
+    return {
+        'students': rows,
+        'next_after': rows[-1][0] if rows and has_next else None,
+        'prev_before': rows[0][0] if rows and has_prev else None,
+    }
+
+# Columns produced by iter_students, in order
+EXPORT_COLUMNS = ('id', 'language', 'first_name', 'last_name', 'city', 'email', 'course_id', 'course_name')
+
+# Generator over student rows (see EXPORT_COLUMNS) in id order, for exports of any size.
+# Rows are read in keyset batches of `batch_size`, each a short indexed query, so memory
+# stays constant and no read transaction is held open for the whole export.
+# `min_id`/`max_id` bound the id range (inclusive); `after_id` resumes after the last exported id.
+def iter_students(course_id=None, min_id=None, max_id=None, after_id=None, batch_size=1000):
+    conditions, params = ['sd.id > ?'], []
+    if course_id:
+        conditions.append('sd.course = ?')
+        params.append(int(course_id))
+    if max_id is not None:
+        conditions.append('sd.id <= ?')
+        params.append(int(max_id))
+    query = STUDENT_COLUMNS_SQL + 'WHERE ' + ' AND '.join(conditions) + ' ORDER BY sd.id LIMIT ?'
+
+    last_id = -1
+    if min_id is not None:
+        last_id = int(min_id) - 1
+    if after_id is not None:
+        last_id = max(last_id, int(after_id))
+    while True:
+        with metrics.timer('db_query_seconds', query='iter_students'), get_connection() as conn:
+            rows = conn.execute(query, [last_id, *params, batch_size]).fetchall()
+        if not rows:
+            return
+        names = course_catalog.names()
+        yield from (row + (names.get(row[6]),) for row in rows)
+        if len(rows) < batch_size:
+            return
+        last_id = rows[-1][0]
+
+# Function to append transcript rows (session_id, created_at, mode, payload) in a single transaction
+@timed_query
+def save_transcript_rows(rows):
+    with get_connection() as conn:
+        with conn:
+            conn.executemany(INSERT_TRANSCRIPT_SQL, rows)
+
+# Generator over transcript rows (id, session_id, created_at, mode, payload), grouped by session
+# in the order the sessions started and in turn order within a session.
+# Rows are read in keyset batches like iter_students.
+def iter_transcript_rows(session_id=None, batch_size=1000):
+    if session_id is not None:
+        query = TRANSCRIPT_COLUMNS_SQL + 'WHERE session_id = ? AND id > ? ORDER BY id LIMIT ?'
+        last_id = -1
+        while True:
+            with get_connection() as conn:
+                rows = conn.execute(query, (session_id, last_id, batch_size)).fetchall()
+            yield from rows
+            if len(rows) < batch_size:
+                return
+            last_id = rows[-1][0]
+    with get_connection() as conn:
+        session_ids = [row[0] for row in conn.execute(
+            'SELECT session_id FROM transcripts GROUP BY session_id ORDER BY MIN(id)')]
+    for session in session_ids:
+        yield from iter_transcript_rows(session, batch_size)
@@ -0,0 +1,90 @@
+# Streaming export of registrations (student_details joined with Courses) as CSV or JSONL.
+# Used by the /export/<fmt> route and as a command line tool:
+#
+#   python export.py --format csv --output students.csv
+#   python export.py --format jsonl --course 2 --min-id 1000 --max-id 2000
+#   python export.py --format csv --after-id 500000 --no-header >> students.csv   # resume
+import argparse
+import csv
+import io
+import json
+import sys
+
+import db
+from db import EXPORT_COLUMNS, iter_students
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+}
+
+# Number of rows written into each chunk of output text
+CHUNK_ROWS = 500
+
+
+# Generator of CSV text chunks for the given rows
+def iter_csv(rows, header=True, chunk_rows=CHUNK_ROWS):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(EXPORT_COLUMNS)
+    count = 0
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+        if count % chunk_rows == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+# Generator of JSON Lines text chunks for the given rows
+def iter_jsonl(rows, chunk_rows=CHUNK_ROWS):
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(dict(zip(EXPORT_COLUMNS, row)), ensure_ascii=False))
+        if len(lines) == chunk_rows:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+# Function to stream an export as text chunks in the requested format
+def export_students(fmt, course_id=None, min_id=None, max_id=None, after_id=None, header=True):
+    rows = iter_students(course_id=course_id, min_id=min_id, max_id=max_id, after_id=after_id)
+    if fmt == 'csv':
+        return iter_csv(rows, header=header)
+    if fmt == 'jsonl':
+        return iter_jsonl(rows)
+    raise ValueError(f"Unknown export format: {fmt!r}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Export registrations as CSV or JSONL')
+    parser.add_argument('--format', choices=sorted(EXPORT_FORMATS), default='csv')
+    parser.add_argument('--course', type=int, help='only export students of this course id')
+    parser.add_argument('--min-id', type=int, help='first student id to export')
+    parser.add_argument('--max-id', type=int, help='last student id to export')
+    parser.add_argument('--after-id', type=int, help='resume after this student id')
+    parser.add_argument('--no-header', action='store_true', help='omit the CSV header (e.g. when appending)')
+    parser.add_argument('--output', help='file to write (default: stdout)')
+    parser.add_argument('--db', help='SQLite database to export (default: STUDENT_DB_PATH)')
+    args = parser.parse_args(argv)
+    if args.db:
+        db.configure(db_path=args.db)
+
+    output = open(args.output, 'w', encoding='utf-8', newline='') if args.output else sys.stdout
+    try:
+        for chunk in export_students(args.format, course_id=args.course, min_id=args.min_id,
+                                     max_id=args.max_id, after_id=args.after_id, header=not args.no_header):
+            output.write(chunk)
+    finally:
+        if args.output:
+            output.close()
+
+
+if __name__ == '__main__':
+    main()
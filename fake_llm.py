@@ -0,0 +1,215 @@
+# A local stand-in for ChatGoogleGenerativeAI used by tests, benchmarks and the load test.
+# It answers the chatbot's prompts deterministically without network access:
+#   - extraction prompts get a JSON object of the details found in the student message
+#   - single-call prompts get {"student_details": ..., "reply": ...}
+#   - conversation prompts get a short question for the first missing field
+# Details are recognised in phrases like "my first name is Ali" or "my email is a@b.com",
+# plus course names/numbers and the script (Arabic/Latin) the student writes in.
+# Faults can be injected to exercise the client limits: 429 rate-limit errors and calls that hang.
+# Like the Google client, a call given a `timeout` fails with DeadlineExceeded when it would take longer.
+import asyncio
+import json
+import random
+import re
+import threading
+import time
+from typing import Any, Callable, List, Optional
+
+from google.api_core.exceptions import DeadlineExceeded, ResourceExhausted
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+FIELD_PATTERNS = {
+    'first_name': re.compile(r'\bmy first name is ([^\W\d_]+)', re.I),
+    'last_name': re.compile(r'\bmy last name is ([^\W\d_]+)', re.I),
+    'city': re.compile(r'\bI live in ([^\W\d_]+(?: [^\W\d_]+)?)', re.I),
+    'email': re.compile(r'[\w.+-]+@[\w-]+(?:\.[\w-]+)+'),
+}
+COURSE_WORDS = {'python': '1', 'math': '2', 'machine learning': '3'}
+MISSING_FIELDS_RE = re.compile(r'Missing fields list: \[([^\]]*)\]')
+STUDENT_MESSAGE_RES = (
+    re.compile(r'Interact with student message:\n(.*?)\nIf the user writes', re.S),
+    re.compile(r'Student message:\n(.*?)\n\nFirst, extract', re.S),
+    re.compile(r'provide them:\n(.*?)\n\n', re.S),
+)
+
+
+# Estimate the number of tokens in a text (about four characters per token)
+def estimate_tokens(text):
+    return max(1, len(text) // 4)
+
+
+def _student_message(prompt):
+    for pattern in STUDENT_MESSAGE_RES:
+        match = pattern.search(prompt)
+        if match:
+            return match.group(1)
+    return prompt
+
+
+# Function to extract details from a student message the way the fake model does
+def fake_extract(message):
+    details = {}
+    for field, pattern in FIELD_PATTERNS.items():
+        match = pattern.search(message)
+        if match:
+            details[field] = match.group(1) if match.groups() else match.group(0)
+    lowered = message.lower()
+    for word, course_id in COURSE_WORDS.items():
+        if re.search(rf'\b{word}\b', lowered):
+            details['course'] = course_id
+    if re.search(r'[\u0600-\u06FF]', message):
+        details['language'] = 'Arabic'
+    elif re.search(r'\benglish\b', lowered):
+        details['language'] = 'English'
+    return details
+
+
+# Default responder: answers extraction, single-call and conversation prompts
+def default_responder(prompt):
+    message = _student_message(prompt)
+    missing = MISSING_FIELDS_RE.search(prompt)
+    missing_fields = [field.strip(" '\"") for field in missing.group(1).split(',')] if missing else []
+    question = f"Could you tell me your {missing_fields[0].replace('_', ' ')}?" if missing_fields else 'Thank you!'
+    if '"student_details"' in prompt:
+        details = fake_extract(message)
+        remaining = [field for field in missing_fields if field not in details]
+        reply = f"Could you tell me your {remaining[0].replace('_', ' ')}?" if remaining else 'Thank you!'
+        return json.dumps({'student_details': details, 'reply': reply})
+    if 'JSON' in prompt:
+        return json.dumps(fake_extract(message))
+    return question
+
+
+class FakeGeminiModel(BaseChatModel):
+    # Simulated network latency per call, in seconds, plus uniform jitter of +/- `jitter`
+    latency: float = 0.0
+    jitter: float = 0.0
+    responder: Callable[[str], str] = default_responder
+    # Reply chunk size (in words) when streaming
+    stream_words: int = 1
+    # Faults consumed one per call: None (answer), 'rate_limit' (raise a 429) or 'timeout'
+    # (hang for `hang` seconds first); once the script is used up, faults occur at random
+    faults: List[Optional[str]] = []
+    rate_limit_rate: float = 0.0
+    timeout_rate: float = 0.0
+    hang: float = 30.0
+    calls: int = 0
+    faults_injected: int = 0
+    in_flight: int = 0
+    peak_in_flight: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    lock: Any = None
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.lock = threading.Lock()
+
+    @property
+    def _llm_type(self) -> str:
+        return 'fake-gemini'
+
+    # Pick the fault for this call (None for a normal answer)
+    def _next_fault(self):
+        with self.lock:
+            if self.faults:
+                fault = self.faults.pop(0)
+            else:
+                roll = random.random()
+                fault = ('rate_limit' if roll < self.rate_limit_rate
+                         else 'timeout' if roll < self.rate_limit_rate + self.timeout_rate else None)
+            if fault:
+                self.faults_injected += 1
+            return fault
+
+    # Simulated latency for this call; raises a 429 for an injected rate-limit fault.
+    # Returns the seconds to wait and the error to raise after them (for a call past its timeout).
+    def _delay(self, timeout=None):
+        fault = self._next_fault()
+        if fault == 'rate_limit':
+            raise ResourceExhausted('429 Resource has been exhausted (e.g. check quota).')
+        delay = max(0.0, self.latency + random.uniform(-self.jitter, self.jitter))
+        if fault == 'timeout':
+            delay += self.hang
+        if timeout is not None and delay > timeout:
+            return timeout, DeadlineExceeded('504 Deadline Exceeded')
+        return delay, None
+
+    def _enter(self):
+        with self.lock:
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    def _exit(self):
+        with self.lock:
+            self.in_flight -= 1
+
+    def _respond(self, messages):
+        prompt = '\n'.join(str(message.content) for message in messages)
+        text = self.responder(prompt)
+        usage = {'input_tokens': estimate_tokens(prompt), 'output_tokens': estimate_tokens(text)}
+        usage['total_tokens'] = usage['input_tokens'] + usage['output_tokens']
+        with self.lock:
+            self.calls += 1
+            self.input_tokens += usage['input_tokens']
+            self.output_tokens += usage['output_tokens']
+        return text, usage
+
+    def _generate(self, messages, stop: Optional[List[str]] = None, run_manager=None, timeout=None,
+                  **kwargs) -> ChatResult:
+        self._enter()
+        try:
+            delay, error = self._delay(timeout)
+            time.sleep(delay)
+        finally:
+            self._exit()
+        if error is not None:
+            raise error
+        text, usage = self._respond(messages)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text, usage_metadata=usage))])
+
+    async def _agenerate(self, messages, stop: Optional[List[str]] = None, run_manager=None, timeout=None,
+                         **kwargs) -> ChatResult:
+        self._enter()
+        try:
+            delay, error = self._delay(timeout)
+            await asyncio.sleep(delay)
+        finally:
+            self._exit()
+        if error is not None:
+            raise error
+        text, usage = self._respond(messages)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text, usage_metadata=usage))])
+
+    def _chunks(self, text):
+        words = text.split(' ')
+        for start in range(0, len(words), self.stream_words):
+            chunk = ' '.join(words[start:start + self.stream_words])
+            yield chunk if start + self.stream_words >= len(words) else chunk + ' '
+
+    # Stream chunks of the reply; like Gemini, the usage is reported on the last chunk
+    def _chunk_messages(self, text, usage):
+        chunks = list(self._chunks(text))
+        for index, chunk in enumerate(chunks):
+            last = index == len(chunks) - 1
+            yield ChatGenerationChunk(message=AIMessageChunk(content=chunk, usage_metadata=usage if last else None))
+
+    def _stream(self, messages, stop: Optional[List[str]] = None, run_manager=None, timeout=None, **kwargs):
+        delay, error = self._delay(timeout)
+        time.sleep(delay)
+        if error is not None:
+            raise error
+        text, usage = self._respond(messages)
+        yield from self._chunk_messages(text, usage)
+
+    async def _astream(self, messages, stop: Optional[List[str]] = None, run_manager=None, timeout=None,
+                       **kwargs):
+        delay, error = self._delay(timeout)
+        await asyncio.sleep(delay)
+        if error is not None:
+            raise error
+        text, usage = self._respond(messages)
+        for chunk in self._chunk_messages(text, usage):
+            yield chunk
@@ -0,0 +1,187 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+from ttl_cache import TTLCache
+
+# Default settings, overridable through environment variables
+DEFAULT_CACHE_TTL = 24 * 60 * 60
+DEFAULT_CACHE_MAX_ENTRIES = 5000
+DEFAULT_CACHE_DB_PATH = 'llm_cache.db'
+
+_WHITESPACE_RE = re.compile(r'\s+')
+_TRAILING_PUNCTUATION = ' .!?,;:؟،'
+
+# Chains that only write a reply. Their inputs are also matched case-insensitively: "Hi" and
+# "hi" get the same answer. The extraction chains' outputs are saved as the student's details,
+# so their inputs keep their case ("John McDonald" must not come back as "john mcdonald").
+CASE_INSENSITIVE_CHAINS = frozenset({'missing_info'})
+
+
+# Function to normalise a student message so trivially different inputs share a cache entry
+def normalize_text(text, casefold=False):
+    if casefold:
+        text = unicodedata.normalize('NFKC', text).casefold()
+    return _WHITESPACE_RE.sub(' ', text).strip(_TRAILING_PUNCTUATION)
+
+
+def _normalize(value, casefold):
+    if isinstance(value, str):
+        return normalize_text(value, casefold)
+    if isinstance(value, dict):
+        return {key: _normalize(item, casefold) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(item, casefold) for item in value]
+    return value
+
+
+# Function to build the cache key for a chain call from its name, prompt fingerprint and inputs
+def make_cache_key(chain_name, fingerprint, inputs):
+    inputs = _normalize(inputs, chain_name in CASE_INSENSITIVE_CHAINS)
+    payload = json.dumps([chain_name, fingerprint, inputs], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+# Base class for LLM response caches. Values are JSON-serialisable chain outputs;
+# get() returns None on a miss.
+class ResponseCache:
+    def __init__(self):
+        self._stats_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _record(self, hit):
+        with self._stats_lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, key):
+        raise NotImplementedError
+
+    def set(self, key, value):
+        raise NotImplementedError
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0}
+
+
+# In-process backend on top of the LRU/TTL map
+class MemoryResponseCache(ResponseCache):
+    def __init__(self, max_entries=DEFAULT_CACHE_MAX_ENTRIES, ttl=DEFAULT_CACHE_TTL):
+        super().__init__()
+        self._cache = TTLCache(max_entries=max_entries, ttl=ttl)
+
+    def get(self, key):
+        value = self._cache.get(key)
+        self._record(value is not None)
+        return None if value is None else json.loads(value)
+
+    def set(self, key, value):
+        self._cache.set(key, json.dumps(value, ensure_ascii=False))
+
+    def stats(self):
+        stats = super().stats()
+        stats.update(evictions=self._cache.evictions, expirations=self._cache.expirations, size=len(self._cache))
+        return stats
+
+
+# On-disk backend that survives restarts and is shared by every worker on the host
+class SQLiteResponseCache(ResponseCache):
+    # The size bound is enforced once every this many writes to keep set() cheap
+    TRIM_EVERY = 100
+
+    def __init__(self, db_path=DEFAULT_CACHE_DB_PATH, max_entries=DEFAULT_CACHE_MAX_ENTRIES, ttl=DEFAULT_CACHE_TTL):
+        super().__init__()
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.evictions = 0
+        self.expirations = 0
+        self._writes = 0
+        conn = self._connect()
+        try:
+            conn.execute('''
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                cache_key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                created_at REAL NOT NULL)''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_llm_cache_created_at ON llm_cache (created_at)')
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def get(self, key):
+        conn = self._connect()
+        try:
+            row = conn.execute('SELECT value, created_at FROM llm_cache WHERE cache_key = ?', (key,)).fetchone()
+            if row is not None and self.ttl is not None and time.time() - row[1] > self.ttl:
+                conn.execute('DELETE FROM llm_cache WHERE cache_key = ?', (key,))
+                conn.commit()
+                with self._stats_lock:
+                    self.expirations += 1
+                row = None
+        finally:
+            conn.close()
+        self._record(row is not None)
+        return None if row is None else json.loads(row[0])
+
+    def set(self, key, value):
+        with self._stats_lock:
+            self._writes += 1
+            trim = self._writes % self.TRIM_EVERY == 0
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute('INSERT OR REPLACE INTO llm_cache (cache_key, value, created_at) VALUES (?, ?, ?)',
+                         (key, json.dumps(value, ensure_ascii=False), now))
+            if trim:
+                self._trim(conn, now)
+            conn.commit()
+        finally:
+            conn.close()
+
+    # Remove expired entries, then the oldest ones beyond max_entries
+    def _trim(self, conn, now):
+        removed = 0
+        if self.ttl is not None:
+            removed += conn.execute('DELETE FROM llm_cache WHERE created_at < ?', (now - self.ttl,)).rowcount
+        overflow = conn.execute('SELECT COUNT(*) FROM llm_cache').fetchone()[0] - self.max_entries
+        if overflow > 0:
+            conn.execute('''
+            DELETE FROM llm_cache WHERE cache_key IN (
+                SELECT cache_key FROM llm_cache ORDER BY created_at LIMIT ?)''', (overflow,))
+        with self._stats_lock:
+            self.expirations += removed
+            self.evictions += max(overflow, 0)
+
+    def stats(self):
+        stats = super().stats()
+        stats.update(evictions=self.evictions, expirations=self.expirations)
+        return stats
+
+
+# Build the backend selected by LLM_CACHE ('memory', 'sqlite' or 'off'); returns None when off
+def create_response_cache(backend=None):
+    backend = (backend or os.getenv('LLM_CACHE', 'memory')).lower()
+    if backend == 'off':
+        return None
+    ttl = float(os.getenv('LLM_CACHE_TTL_SECONDS', DEFAULT_CACHE_TTL))
+    max_entries = int(os.getenv('LLM_CACHE_MAX_ENTRIES', DEFAULT_CACHE_MAX_ENTRIES))
+    if backend == 'memory':
+        return MemoryResponseCache(max_entries=max_entries, ttl=ttl)
+    if backend == 'sqlite':
+        return SQLiteResponseCache(db_path=os.getenv('LLM_CACHE_DB_PATH', DEFAULT_CACHE_DB_PATH),
+                                   max_entries=max_entries, ttl=ttl)
+    raise ValueError(f"Unknown LLM cache backend: {backend!r}")
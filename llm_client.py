@@ -0,0 +1,495 @@
+# Guarded access to the chat model shared by every request thread.
+# GuardedChatModel wraps a langchain chat model (ChatGoogleGenerativeAI in production) and adds:
+#   - a token-bucket limit on model calls per second
+#   - a bound on the number of concurrent model calls
+#   - retries of rate-limit (429), unavailable and timeout errors with jittered exponential backoff
+#   - a deadline per call that covers queueing, every attempt and the backoff in between
+#   - coalescing: identical prompts already in flight share one model call
+# It is a chat model itself, so `prompt | llm | parser` chains use it unchanged.
+# Each attempt passes the inner model a `timeout` (the time the attempt has left), so an
+# abandoned attempt ends by the deadline too. SingleAttemptGemini is the Gemini model to wrap:
+# it makes one request per call, leaving every retry to GuardedChatModel.
+#
+# This module imports langchain and the Google client libraries; chatbot.py imports it on
+# first use of the model so that starting the app does not pay for them.
+import asyncio
+import collections
+import itertools
+import json
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import Future
+from concurrent.futures import wait as wait_futures
+from typing import Any, List, Optional
+
+from google.api_core import exceptions as google_exceptions
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.language_models import BaseChatModel
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_google_genai import ChatGoogleGenerativeAI
+from langchain_google_genai.chat_models import _response_to_result
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Errors worth retrying: the service is rate limiting, overloaded or slow
+RETRYABLE_ERRORS = (
+    google_exceptions.ResourceExhausted,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.InternalServerError,
+    google_exceptions.DeadlineExceeded,
+    TimeoutError,
+    ConnectionError,
+)
+
+DEFAULT_MAX_CONCURRENCY = 8
+DEFAULT_MAX_ATTEMPTS = 4
+DEFAULT_DEADLINE = 30.0
+DEFAULT_ATTEMPT_TIMEOUT = 15.0
+DEFAULT_BACKOFF_BASE = 0.5
+DEFAULT_BACKOFF_MAX = 8.0
+
+
+# Raised when a model call cannot finish within its deadline
+class LLMDeadlineExceeded(TimeoutError):
+    pass
+
+
+# Function to tell whether a failed model call should be retried
+def is_retryable(error):
+    if isinstance(error, LLMDeadlineExceeded):
+        return False
+    return isinstance(error, RETRYABLE_ERRORS) or getattr(error, 'code', None) == 429
+
+
+def _retry_reason(error):
+    if isinstance(error, google_exceptions.ResourceExhausted) or getattr(error, 'code', None) == 429:
+        return 'rate_limited'
+    if isinstance(error, (TimeoutError, google_exceptions.DeadlineExceeded)):
+        return 'timeout'
+    return 'unavailable'
+
+
+# Token bucket: `rate` tokens per second, holding at most `capacity` (the allowed burst)
+class TokenBucket:
+    def __init__(self, rate, capacity=None, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self._clock = clock
+        self._tokens = self.capacity
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    # Take a token if one is available; returns 0, or the seconds until the next one
+    def try_acquire(self):
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+
+# Concurrency slots shared by request threads and event loops. Threads block in acquire();
+# coroutines await aacquire(), which release() wakes through the waiter's loop, so neither
+# polls nor ties up a thread while it waits. Waiting coroutines are served first.
+class ConcurrencySlots:
+    def __init__(self, count):
+        self._free = count
+        self._lock = threading.Lock()
+        self._released = threading.Condition(self._lock)
+        self._async_waiters = collections.deque()
+
+    def acquire(self, timeout=None):
+        with self._released:
+            if not self._released.wait_for(lambda: self._free > 0, timeout):
+                return False
+            self._free -= 1
+            return True
+
+    # Wait up to `timeout` seconds for a slot; returns whether one was acquired
+    async def aacquire(self, timeout=None):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._free > 0:
+                self._free -= 1
+                return True
+            waiter = loop.create_future()
+            self._async_waiters.append((loop, waiter))
+        try:
+            await asyncio.wait_for(waiter, timeout)
+            return True
+        except TimeoutError:
+            return False
+
+    def release(self):
+        with self._lock:
+            while self._async_waiters:
+                loop, waiter = self._async_waiters.popleft()
+                if waiter.done():
+                    continue
+                try:
+                    loop.call_soon_threadsafe(self._hand_over, waiter)
+                    return
+                except RuntimeError:  # The waiter's loop has closed
+                    continue
+            self._free += 1
+            self._released.notify()
+
+    # Runs in the waiter's loop; a waiter that gave up in the meantime passes the slot on
+    def _hand_over(self, waiter):
+        if waiter.done():
+            self.release()
+        else:
+            waiter.set_result(True)
+
+
+# Key identifying a model call, used to coalesce identical in-flight prompts
+def _prompt_key(messages, stop, kwargs):
+    return json.dumps([[(message.type, message.content) for message in messages], stop, kwargs],
+                      sort_keys=True, default=str)
+
+
+# Copy of a shared result without usage metadata, so coalesced callers do not count tokens twice
+def _shared_result(result):
+    return ChatResult(
+        generations=[ChatGeneration(message=generation.message.copy(update={'usage_metadata': None}),
+                                    generation_info=generation.generation_info)
+                     for generation in result.generations],
+        llm_output=result.llm_output)
+
+
+# Run `func` in a new daemon thread and return a Future of its result. An attempt abandoned at
+# its timeout may still be running when the process exits, and must not hold up the exit.
+def _run_in_thread(func, *args, **kwargs):
+    future = Future()
+
+    def run():
+        if future.set_running_or_notify_cancel():
+            try:
+                future.set_result(func(*args, **kwargs))
+            except BaseException as e:
+                future.set_exception(e)
+
+    threading.Thread(target=run, name='llm-call', daemon=True).start()
+    return future
+
+
+# ChatGoogleGenerativeAI making a single request per call. The library retries each request
+# itself (up to 10 attempts, backing off from 1 to 60 s) and the Google client retries
+# unavailable errors for up to 600 s. Under GuardedChatModel those retries kept an abandoned
+# attempt sending requests, and holding its slot, for minutes. Here a call fails after its
+# `timeout` (DeadlineExceeded) and retrying is left to GuardedChatModel.
+class SingleAttemptGemini(ChatGoogleGenerativeAI):
+    def _request_options(self, timeout):
+        return {'metadata': self.default_metadata, 'retry': None, 'timeout': timeout or DEFAULT_ATTEMPT_TIMEOUT}
+
+    def _generate(self, messages, stop: Optional[List[str]] = None, run_manager=None, timeout=None,
+                  **kwargs) -> ChatResult:
+        request = self._prepare_request(messages, stop=stop, **kwargs)
+        return _response_to_result(self.client.generate_content(request=request, **self._request_options(timeout)))
+
+    async def _agenerate(self, messages, stop: Optional[List[str]] = None, run_manager=None, timeout=None,
+                         **kwargs) -> ChatResult:
+        # The async client only exists when the model was created inside an event loop
+        if self.async_client is None:
+            return await asyncio.to_thread(self._generate, messages, stop, timeout=timeout, **kwargs)
+        request = self._prepare_request(messages, stop=stop, **kwargs)
+        response = await self.async_client.generate_content(request=request, **self._request_options(timeout))
+        return _response_to_result(response)
+
+    def _stream(self, messages, stop: Optional[List[str]] = None, run_manager=None, timeout=None, **kwargs):
+        request = self._prepare_request(messages, stop=stop, **kwargs)
+        for response in self.client.stream_generate_content(request=request, **self._request_options(timeout)):
+            chunk = _response_to_result(response, stream=True).generations[0]
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text)
+            yield chunk
+
+    async def _astream(self, messages, stop: Optional[List[str]] = None, run_manager=None, timeout=None,
+                       **kwargs):
+        if self.async_client is None:
+            chunks = self._stream(messages, stop, timeout=timeout, **kwargs)
+            while (chunk := await asyncio.to_thread(next, chunks, None)) is not None:
+                yield chunk
+            return
+        request = self._prepare_request(messages, stop=stop, **kwargs)
+        responses = await self.async_client.stream_generate_content(request=request, **self._request_options(timeout))
+        async for response in responses:
+            chunk = _response_to_result(response, stream=True).generations[0]
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.text)
+            yield chunk
+
+
+class GuardedChatModel(BaseChatModel):
+    inner: BaseChatModel
+    # Calls per second (0 = unlimited) and the burst allowed above that rate
+    rate_limit: float = 0.0
+    burst: Optional[float] = None
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY
+    max_attempts: int = DEFAULT_MAX_ATTEMPTS
+    # Seconds a whole call may take (including retries) and a single attempt may take
+    deadline: float = DEFAULT_DEADLINE
+    attempt_timeout: float = DEFAULT_ATTEMPT_TIMEOUT
+    backoff_base: float = DEFAULT_BACKOFF_BASE
+    backoff_max: float = DEFAULT_BACKOFF_MAX
+    coalesce: bool = True
+    bucket: Any = None
+    slots: Any = None
+    inflight: Any = None
+    inflight_lock: Any = None
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.bucket = TokenBucket(self.rate_limit, self.burst) if self.rate_limit > 0 else None
+        self.slots = ConcurrencySlots(self.max_concurrency)
+        self.inflight = {}
+        self.inflight_lock = threading.Lock()
+
+    @property
+    def _llm_type(self) -> str:
+        return f'guarded-{self.inner._llm_type}'
+
+    # Full-jitter exponential backoff before attempt `attempt + 1`
+    def backoff(self, attempt):
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1)))
+
+    @staticmethod
+    def _deadline_exceeded():
+        metrics.increment('llm_deadline_exceeded_total')
+        return LLMDeadlineExceeded('The model call did not finish before its deadline')
+
+    # Seconds left before `deadline`; raises LLMDeadlineExceeded when there are none
+    def _remaining(self, deadline):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise self._deadline_exceeded()
+        return remaining
+
+    # Wait for a rate-limit token and a concurrency slot
+    def _acquire(self, deadline):
+        start = time.monotonic()
+        while self.bucket is not None:
+            wait = self.bucket.try_acquire()
+            if not wait:
+                break
+            time.sleep(min(wait, self._remaining(deadline)))
+        if not self.slots.acquire(timeout=self._remaining(deadline)):
+            raise self._deadline_exceeded()
+        metrics.observe('llm_queue_seconds', time.monotonic() - start)
+
+    async def _aacquire(self, deadline):
+        start = time.monotonic()
+        while self.bucket is not None:
+            wait = self.bucket.try_acquire()
+            if not wait:
+                break
+            await asyncio.sleep(min(wait, self._remaining(deadline)))
+        if not await self.slots.aacquire(timeout=self._remaining(deadline)):
+            raise self._deadline_exceeded()
+        metrics.observe('llm_queue_seconds', time.monotonic() - start)
+
+    # Decide whether to retry after a failed attempt: returns the backoff delay, or raises
+    def _before_retry(self, error, attempt, deadline):
+        if not is_retryable(error) or attempt >= self.max_attempts:
+            raise error
+        delay = self.backoff(attempt)
+        if time.monotonic() + delay >= deadline:
+            raise self._deadline_exceeded() from error
+        metrics.increment('llm_retries_total', reason=_retry_reason(error))
+        logger.warning("Model call failed (%s: %s); retry %d in %.2fs",
+                       type(error).__name__, error, attempt, delay)
+        return delay
+
+    # Seconds the next attempt may take: the attempt timeout, cut short by the deadline
+    def _attempt_timeout(self, deadline):
+        return min(self.attempt_timeout, self._remaining(deadline))
+
+    def _call(self, messages, stop, kwargs, deadline):
+        for attempt in itertools.count(1):
+            self._acquire(deadline)
+            timeout = self._attempt_timeout(deadline)
+            try:
+                future = _run_in_thread(self.inner._generate, messages, stop=stop, timeout=timeout, **kwargs)
+            except BaseException:
+                self.slots.release()
+                raise
+            # An abandoned attempt keeps its slot until its own timeout ends it
+            future.add_done_callback(lambda _: self.slots.release())
+            if wait_futures([future], timeout=timeout).done:
+                error = future.exception()
+                if error is None:
+                    return future.result()
+            else:
+                error = TimeoutError(f'Model call attempt {attempt} timed out')
+            time.sleep(self._before_retry(error, attempt, deadline))
+
+    async def _acall(self, messages, stop, kwargs, deadline):
+        for attempt in itertools.count(1):
+            await self._aacquire(deadline)
+            try:
+                timeout = self._attempt_timeout(deadline)
+                task = asyncio.ensure_future(self.inner._agenerate(messages, stop=stop, timeout=timeout, **kwargs))
+                done, _ = await asyncio.wait([task], timeout=timeout)
+                if done:
+                    error = task.exception()
+                    if error is None:
+                        return task.result()
+                else:
+                    task.cancel()
+                    error = TimeoutError(f'Model call attempt {attempt} timed out')
+            finally:
+                self.slots.release()
+            await asyncio.sleep(self._before_retry(error, attempt, deadline))
+
+    # Register as the caller of a prompt, or join the identical call already in flight.
+    # Returns (future, is_leader).
+    def _join(self, key):
+        with self.inflight_lock:
+            future = self.inflight.get(key)
+            if future is None:
+                future = self.inflight[key] = Future()
+                return future, True
+        metrics.increment('llm_coalesced_total')
+        return future, False
+
+    def _finish(self, key, future, result=None, error=None):
+        with self.inflight_lock:
+            self.inflight.pop(key, None)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def _generate(self, messages, stop: Optional[List[str]] = None, run_manager=None, **kwargs) -> ChatResult:
+        deadline = time.monotonic() + self.deadline
+        if not self.coalesce:
+            return self._call(messages, stop, kwargs, deadline)
+        key = _prompt_key(messages, stop, kwargs)
+        future, leader = self._join(key)
+        if not leader:
+            if not wait_futures([future], timeout=self._remaining(deadline)).done:
+                raise self._deadline_exceeded()
+            return _shared_result(future.result())
+        try:
+            result = self._call(messages, stop, kwargs, deadline)
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, result)
+        return result
+
+    async def _agenerate(self, messages, stop: Optional[List[str]] = None, run_manager=None, **kwargs) -> ChatResult:
+        deadline = time.monotonic() + self.deadline
+        if not self.coalesce:
+            return await self._acall(messages, stop, kwargs, deadline)
+        key = _prompt_key(messages, stop, kwargs)
+        future, leader = self._join(key)
+        if not leader:
+            shared = asyncio.wrap_future(future)
+            done, _ = await asyncio.wait([shared], timeout=self._remaining(deadline))
+            if not done:
+                raise self._deadline_exceeded()
+            return _shared_result(shared.result())
+        try:
+            result = await self._acall(messages, stop, kwargs, deadline)
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, result)
+        return result
+
+    # Streams are rate limited and bounded like other calls. Failures before the first chunk are
+    # retried; once text has been sent to the student the stream cannot be restarted.
+    def _stream(self, messages, stop: Optional[List[str]] = None, run_manager=None, **kwargs):
+        deadline = time.monotonic() + self.deadline
+        for attempt in itertools.count(1):
+            self._acquire(deadline)
+            try:
+                chunks = self.inner._stream(messages, stop=stop, timeout=self._remaining(deadline), **kwargs)
+                first = next(chunks, None)
+            except Exception as e:
+                self.slots.release()
+                time.sleep(self._before_retry(e, attempt, deadline))
+                continue
+            try:
+                if first is not None:
+                    yield first
+                    yield from chunks
+            finally:
+                self.slots.release()
+            return
+
+    async def _astream(self, messages, stop: Optional[List[str]] = None, run_manager=None, **kwargs):
+        deadline = time.monotonic() + self.deadline
+        for attempt in itertools.count(1):
+            await self._aacquire(deadline)
+            chunks = self.inner._astream(messages, stop=stop, timeout=self._remaining(deadline), **kwargs)
+            first_chunk = asyncio.ensure_future(chunks.__anext__())
+            done, _ = await asyncio.wait([first_chunk], timeout=self._attempt_timeout(deadline))
+            error = first_chunk.exception() if done else None
+            if not done:
+                first_chunk.cancel()
+                error = TimeoutError(f'Model stream attempt {attempt} timed out')
+            if isinstance(error, StopAsyncIteration):
+                self.slots.release()
+                return
+            if error is not None:
+                self.slots.release()
+                await asyncio.sleep(self._before_retry(error, attempt, deadline))
+                continue
+            first = first_chunk.result()
+            try:
+                yield first
+                async for chunk in chunks:
+                    yield chunk
+            finally:
+                self.slots.release()
+            return
+
+
+# Callback that counts the input/output tokens the model reports for one chain call,
+# as llm_tokens_total{chain, mode, kind} in `registry`, and adds them to the `turn_tokens` tally if given
+class TokenUsageHandler(BaseCallbackHandler):
+    run_inline = True  # Counting is cheap; record it before the async call returns
+
+    def __init__(self, chain: str, mode: str, turn_tokens: Optional[dict] = None, registry=metrics):
+        self.chain = chain
+        self.mode = mode
+        self.turn_tokens = turn_tokens
+        self.registry = registry
+
+    def on_llm_end(self, response, **kwargs):
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, 'message', None), 'usage_metadata', None)
+                if usage:
+                    self.registry.increment('llm_tokens_total', usage.get('input_tokens', 0),
+                                            chain=self.chain, mode=self.mode, kind='input')
+                    self.registry.increment('llm_tokens_total', usage.get('output_tokens', 0),
+                                            chain=self.chain, mode=self.mode, kind='output')
+                    if self.turn_tokens is not None:
+                        self.turn_tokens['input'] += usage.get('input_tokens', 0)
+                        self.turn_tokens['output'] += usage.get('output_tokens', 0)
+
+
+# Function to wrap a chat model with the limits configured in the environment
+def create_guarded_llm(inner):
+    burst = os.getenv('LLM_RATE_BURST')
+    return GuardedChatModel(
+        inner=inner,
+        rate_limit=float(os.getenv('LLM_RATE_LIMIT', 0)),
+        burst=float(burst) if burst else None,
+        max_concurrency=int(os.getenv('LLM_MAX_CONCURRENCY', DEFAULT_MAX_CONCURRENCY)),
+        max_attempts=int(os.getenv('LLM_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS)),
+        deadline=float(os.getenv('LLM_DEADLINE_SECONDS', DEFAULT_DEADLINE)),
+        attempt_timeout=float(os.getenv('LLM_ATTEMPT_TIMEOUT_SECONDS', DEFAULT_ATTEMPT_TIMEOUT)),
+        coalesce=os.getenv('LLM_COALESCE', '1') != '0',
+    )
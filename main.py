@@ -1,24 +1,70 @@
 # Import necessary libraries and modules for the Flask application
-from flask import Flask, render_template, request, jsonify, redirect, url_for
-import os
-from chatbot import studentDetails, chatbot_response
-from db import create_student_details_tables, get_latest_student, get_all_students, delete_student, get_students_by_course
 from dotenv import load_dotenv
 
-# Load environment variables from the .env file for secure configuration
+# Load environment variables from the .env file once, before the modules below read their settings
 load_dotenv()
 
+from flask import Flask, Response, g, render_template, request, jsonify, redirect, url_for, stream_with_context
+import logging
+import os
+import time
+import uuid
+from chatbot import (chatbot_response, chatbot_response_stream, engine_stats, get_latest_registration,
+                     latest_pending_registration)
+from db import course_catalog, delete_student, migrate, get_students_page, registered_students, DEFAULT_PAGE_SIZE
+from streaming import SSE_HEADERS, sse_stream
+from export import EXPORT_FORMATS, export_students
+from bulk_import import detect_format, import_stream, text_stream
+from metrics import PROMETHEUS_CONTENT_TYPE, metrics
+from page_cache import PageCache, compress_response
+from static_assets import asset_url, cache_versioned_static, static_url
+
+# Leveled logging for the app and its modules; LOG_LEVEL=DEBUG shows per-turn field details
+logging.basicConfig(level=os.getenv('LOG_LEVEL', 'INFO').upper(),
+                    format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+
 # Initialize the Flask app
 app = Flask(__name__)
+# Templates link static files and vendored CSS/JavaScript through these (see static_assets.py)
+app.jinja_env.globals.update(asset_url=asset_url, static_url=static_url)
+
+# The database schema is created by `python migrate.py`, run once per deploy rather than
+# by every worker on import. The Gemini client (GOOGLE_API_KEY) is set up on the first chat message.
+
+# Pages built from the student data, cached per data version and revalidated with ETags
+page_cache = PageCache()
+
+# Function to start loading what the chat keeps in memory, once the server is up: the registered
+# students, so that returning students are recognised. asgi.py calls it at startup.
+def warm_up():
+    registered_students.warm_in_background()
 
-# Set the Google API Key from environment variables
-os.environ['GOOGLE_API_KEY'] = os.getenv('GOOGLE_API_KEY')
+# Cookie that identifies each student's conversation across /chatbot requests
+SESSION_COOKIE = 'chat_session_id'
 
-# Ensure the database table for student details is created when the app starts
-create_student_details_tables()
+# Identify the conversation: explicit session id, then cookie, otherwise start a new one
+def get_session_id(payload):
+    return payload.get('session_id') or request.cookies.get(SESSION_COOKIE) or uuid.uuid4().hex
 
-# Initialize an empty studentDetails object to hold current student data
-current_student_details = studentDetails()
+# Record the handling time of every request per endpoint.
+# For streamed responses this is the time until the response starts.
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+
+@app.after_request
+def record_request_time(response):
+    start = g.get('request_start')
+    if start is not None:
+        metrics.observe('http_request_seconds', time.perf_counter() - start,
+                        endpoint=request.endpoint or 'unknown', status=str(response.status_code))
+    return response
+
+
+# Long-lived cache headers for versioned static files, and gzip for large text responses
+app.after_request(cache_versioned_static)
+app.after_request(compress_response)
 
 ##############################################
 # Routes: Define the endpoints for the web app
@@ -36,42 +82,135 @@ def chatbot():
     if request.method == 'POST':
         # Extract the student's message from the request
         student_input = request.json['message']
+        session_id = get_session_id(request.json)
         # Generate the chatbot's response based on the student's input
-        bot_response = chatbot_response(student_input)
+        bot_response = chatbot_response(student_input, session_id)
         
         # Return the chatbot's response in JSON format
-        return jsonify({'response': bot_response})
+        response = jsonify({'response': bot_response, 'session_id': session_id})
+        response.set_cookie(SESSION_COOKIE, session_id, httponly=True, samesite='Lax')
+        return response
     
 
+# Route for streaming the chatbot's reply to the browser as Server-Sent Events
+@app.route('/chatbot/stream', methods=['POST'])
+def chatbot_stream():
+    student_input = request.json['message']
+    session_id = get_session_id(request.json)
+    events = sse_stream(chatbot_response_stream(student_input, session_id), session_id)
+    response = Response(stream_with_context(events), headers=SSE_HEADERS)
+    response.set_cookie(SESSION_COOKIE, session_id, httponly=True, samesite='Lax')
+    return response
+
+
+# Route for comparing LLM call counts and latency between the chatbot engine modes
+@app.route('/engine-stats', methods=['GET'])
+def chatbot_engine_stats():
+    return jsonify(engine_stats())
+
+
+# Route for Prometheus to scrape chat turn, stage, LLM and database metrics
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    return Response(metrics.render_prometheus(), content_type=PROMETHEUS_CONTENT_TYPE)
+
+
 # Route for displaying the latest student details
 @app.route('/student-details', methods=['GET'])
 def student_details():
-    # Fetch the latest student details from the database
-    student = get_latest_student()
-    # Render the details in the student_details.html template
-    return render_template('student_details.html', student=student)
+    # Fetch the latest student details, including a registration not yet written by write-behind,
+    # and render them in the student_details.html template (once per data version). A queued
+    # registration is not in the database yet, so it is part of the page key.
+    pending = latest_pending_registration()
+    return page_cache.respond(
+        ('student_details', pending.model_dump_json() if pending is not None else None),
+        lambda: render_template('student_details.html', student=get_latest_registration(pending)))
 
 
-# Route for displaying all students and filtering by course
+# Read the listing filters and keyset page position from the query string
+def get_listing_args(args):
+    course_id = args.get('course_id', 0, type=int)
+    return {
+        'course_id': course_id or None,
+        'search': args.get('q', ''),
+        'after_id': args.get('after', type=int),
+        'before_id': args.get('before', type=int),
+        'limit': args.get('limit', DEFAULT_PAGE_SIZE, type=int),
+    }
+
+
+# Column names of the student rows returned by the db module
+STUDENT_FIELDS = ('id', 'language', 'first_name', 'last_name', 'city', 'email', 'course_name')
+
+
+# Route for displaying all students, one page at a time, filtered by course and search text
 @app.route('/all-students', methods=['GET', 'POST'])
 def all_students():
-    selected_course = '0'  # Default value for selecting all courses
     if request.method == 'POST':
-        # Fetch the selected course ID from the form submission
-        course_id = request.form.get('course_id')
-        if course_id == '0':
-            # If '0' is selected, show all students
-            students = get_all_students()
-        else:
-            # Filter students by the selected course
-            selected_course = course_id
-            students = get_students_by_course(course_id)
-    else:
-        # If no course is selected, show all students
-        students = get_all_students()
-    
-    # Render the student list in the all_students.html template
-    return render_template('all_students.html', students=students, selected_course=selected_course)
+        # Older form submissions post the course; redirect so the filter lives in the URL
+        return redirect(url_for('all_students', course_id=request.form.get('course_id', '0')))
+
+    listing = get_listing_args(request.args)
+
+    def render():
+        page = get_students_page(**listing)
+        selected_course = str(listing['course_id'] or 0)
+
+        # Render the student page in the all_students.html template
+        return render_template('all_students.html', students=page['students'], courses=course_catalog.courses,
+                               selected_course=selected_course, search=listing['search'], limit=listing['limit'],
+                               next_after=page['next_after'], prev_before=page['prev_before'])
+
+    return page_cache.respond(('all_students', tuple(sorted(listing.items()))), render)
+
+
+# JSON variant of the student listing with the same filters and keyset pagination
+@app.route('/api/students', methods=['GET'])
+def api_students():
+    listing = get_listing_args(request.args)
+
+    def render():
+        page = get_students_page(**listing)
+        return jsonify({
+            'students': [dict(zip(STUDENT_FIELDS, row)) for row in page['students']],
+            'next_after': page['next_after'],
+            'prev_before': page['prev_before'],
+        }).get_data()
+
+    return page_cache.respond(('api_students', tuple(sorted(listing.items()))), render, mimetype='application/json')
+
+
+# Route for downloading registrations as CSV or JSONL, streamed row batch by row batch.
+# Optional filters: course_id, min_id, max_id, and after (resume after this id). CSV responses
+# always start with the header row, after= ones included: drop it when appending to an earlier download.
+@app.route('/export/<fmt>', methods=['GET'])
+def export(fmt):
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': f"Unknown export format: {fmt}"}), 404
+    chunks = export_students(
+        fmt,
+        course_id=request.args.get('course_id', type=int),
+        min_id=request.args.get('min_id', type=int),
+        max_id=request.args.get('max_id', type=int),
+        after_id=request.args.get('after', type=int),
+    )
+    headers = {'Content-Disposition': f'attachment; filename=students.{fmt}'}
+    return Response(stream_with_context(chunks), mimetype=EXPORT_FORMATS[fmt], headers=headers)
+
+
+# Route for bulk-importing registrations from an uploaded CSV or JSONL file (form field "file").
+# The format comes from the "format" field or the file extension; rejected rows are reported back.
+@app.route('/import', methods=['POST'])
+def bulk_import():
+    upload = request.files.get('file')
+    if upload is None:
+        return jsonify({'error': "Upload a CSV or JSONL file in the 'file' field."}), 400
+    try:
+        fmt = detect_format(upload.filename or '', request.form.get('format'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    report = import_stream(text_stream(upload.stream), fmt, max_rejects_kept=100)
+    return jsonify(report.as_dict())
 
 
 # Route for deleting a student's record based on their ID
@@ -85,4 +224,7 @@ def delete(student_id):
 
 # Run the Flask application when this script is executed directly
 if __name__ == '__main__':
+    # The development server applies pending migrations itself
+    migrate()
+    warm_up()
     app.run(debug=True, host="0.0.0.0", port=8080)  # Host the app on all available network interfaces at port 8080
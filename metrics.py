@@ -0,0 +1,120 @@
+import threading
+import time
+from contextlib import contextmanager
+
+
+# A minimal thread-safe registry of counters and timing summaries.
+# Each series is identified by a metric name plus a set of label key/values.
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._summaries = {}
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    # Add `amount` to a counter
+    def increment(self, name, amount=1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    # Record one observation (e.g. a duration in seconds) in a count/sum/max summary
+    def observe(self, name, value, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            count, total, maximum = self._summaries.get(key, (0, 0.0, 0.0))
+            self._summaries[key] = (count + 1, total + value, max(maximum, value))
+
+    # Time the body of a `with` block and record it with observe()
+    @contextmanager
+    def timer(self, name, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    # Sum of every series of a counter whose labels include the given ones
+    def counter_value(self, name, **labels):
+        wanted = set(labels.items())
+        with self._lock:
+            return sum(value for (series, series_labels), value in self._counters.items()
+                       if series == name and wanted.issubset(series_labels))
+
+    # Return a JSON-friendly copy of every series
+    def snapshot(self):
+        with self._lock:
+            counters = [
+                {'name': name, 'labels': dict(labels), 'value': value}
+                for (name, labels), value in self._counters.items()
+            ]
+            summaries = [
+                {'name': name, 'labels': dict(labels), 'count': count, 'sum': total,
+                 'mean': total / count if count else 0.0, 'max': maximum}
+                for (name, labels), (count, total, maximum) in self._summaries.items()
+            ]
+        return {'counters': counters, 'summaries': summaries}
+
+    # Render every series in the Prometheus text exposition format.
+    # Summaries become <name>_count and <name>_sum, plus a <name>_max gauge.
+    def render_prometheus(self):
+        with self._lock:
+            counters = sorted(self._counters.items(), key=_series_order)
+            summaries = sorted(self._summaries.items(), key=_series_order)
+        lines = []
+        previous = None
+        for (name, labels), value in counters:
+            if name != previous:
+                lines.append(f'# TYPE {name} counter')
+                previous = name
+            lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+        for kind in ('summary', 'max'):
+            previous = None
+            for (name, labels), (count, total, maximum) in summaries:
+                series = name if kind == 'summary' else f'{name}_max'
+                if series != previous:
+                    lines.append(f"# TYPE {series} {'summary' if kind == 'summary' else 'gauge'}")
+                    previous = series
+                if kind == 'summary':
+                    lines.append(f'{name}_count{_format_labels(labels)} {count}')
+                    lines.append(f'{name}_sum{_format_labels(labels)} {_format_value(total)}')
+                else:
+                    lines.append(f'{series}{_format_labels(labels)} {_format_value(maximum)}')
+        return '\n'.join(lines) + '\n'
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._summaries.clear()
+
+
+# Content type of render_prometheus() output
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+# Group series by name, then order them by label values
+def _series_order(item):
+    (name, labels), _ = item
+    return name, [(key, str(value)) for key, value in labels]
+
+
+# Escape a label value as the exposition format requires (backslash, double quote, newline)
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels) + '}'
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+# Process-wide registry used by the chatbot and the web app
+metrics = MetricsRegistry()
@@ -0,0 +1,30 @@
+# Apply the database schema migrations (see db.MIGRATIONS). Run it once per deploy, before
+# starting the app; it is safe to run again, as migrations that already ran are skipped:
+#
+#   python migrate.py
+#   python migrate.py --db /data/student_details.db
+import argparse
+import logging
+
+from dotenv import load_dotenv
+
+# STUDENT_DB_PATH may be set in .env; load it before db reads its settings
+load_dotenv()
+
+import db
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Create or upgrade the registration database schema')
+    parser.add_argument('--db', help='SQLite database to migrate (default: STUDENT_DB_PATH)')
+    args = parser.parse_args(argv)
+    if args.db:
+        db.configure(db_path=args.db)
+
+    applied = db.migrate()
+    print(f"{db.DB_PATH}: applied {applied} migration(s), schema version {db.schema_version()}")
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s %(name)s: %(message)s')
+    main()
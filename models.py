@@ -0,0 +1,76 @@
+from functools import lru_cache
+from typing import Optional
+from pydantic import BaseModel, Field, create_model
+from course_catalog import describe_courses
+
+# Data model to represent student details
+class studentDetails(BaseModel):
+    language: Optional[str] = Field(
+        None, enum=["Arabic", "English"],
+        description="The preferred language of the student."
+    )
+    first_name: Optional[str] = Field(
+        None,
+        description="The student's first name."
+    )
+    last_name: Optional[str] = Field(
+        None,
+        description="The student's last name or surname."
+    )
+    city: Optional[str] = Field(
+        None,
+        description="The city where the student resides."
+    )
+    email: Optional[str] = Field(
+        None,
+        description="The student's email address."
+    )
+    # The course choices come from the Courses table, see course_field
+    course: Optional[str] = Field(
+        None,
+        description="The id of the course selected by the student."
+    )
+
+# Data model for the single-call engine: the extracted details and the next reply together
+class chatTurn(BaseModel):
+    student_details: studentDetails = Field(
+        default_factory=studentDetails,
+        description="The student details found in the student's latest message only."
+    )
+    reply: str = Field(
+        "",
+        description="The chatbot's next message to the student."
+    )
+
+# Fields of studentDetails, in declaration order
+STUDENT_FIELDS = tuple(studentDetails.model_fields)
+
+# Function to build the course field of the extraction schema from (id, name) course choices
+def course_field(courses):
+    return Field(
+        None, json_schema_extra={'enum': [course_id for course_id, _ in courses]},
+        description=f"The course selected by the student: {describe_courses(courses)}."
+    )
+
+# Function to build a studentDetails model with only the given fields (a tuple in STUDENT_FIELDS order),
+# so the extraction schema sent to the language model lists just the details still missing.
+# `courses` are the (id, name) choices of the course field, from the course catalog.
+# Each field set is built once per course list; there are at most 2**6 of them.
+@lru_cache(maxsize=None)
+def partial_details_model(fields, courses=()):
+    definitions = {field: (Optional[str], studentDetails.model_fields[field]) for field in fields}
+    if 'course' in definitions and courses:
+        definitions['course'] = (Optional[str], course_field(courses))
+    return create_model('studentDetails', **definitions)
+
+# Function to build the chatTurn model whose student_details only has the given fields
+@lru_cache(maxsize=None)
+def partial_chat_turn_model(fields, courses=()):
+    details_model = partial_details_model(fields, courses)
+    return create_model(
+        'chatTurn',
+        student_details=(details_model, Field(
+            default_factory=details_model,
+            description=chatTurn.model_fields['student_details'].description)),
+        reply=(str, chatTurn.model_fields['reply']),
+    )
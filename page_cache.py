@@ -0,0 +1,103 @@
+# Conditional, cached and compressed responses for the pages built from the student data.
+#
+# Dashboards poll /all-students, /api/students and /student-details. Each page is identified
+# by a key (its route and arguments), and its ETag combines the key with the data version kept
+# in the database (db.get_data_version), so every worker process agrees on it:
+#   - a poll whose If-None-Match still matches gets 304 Not Modified, with no query or render
+#   - otherwise the page is rendered once per data version and kept in a bounded cache, along
+#     with its gzip-compressed body for clients that accept gzip
+# compress_response gzips the other large text responses.
+import gzip
+import hashlib
+import os
+
+from flask import Response, request
+
+import db
+from metrics import metrics
+from ttl_cache import TTLCache
+
+# Responses smaller than this are sent uncompressed; gzip saves little on them
+GZIP_MIN_SIZE = int(os.getenv('GZIP_MIN_SIZE', 1024))
+GZIP_LEVEL = 6
+COMPRESSIBLE_MIMETYPES = {'text/html', 'text/plain', 'text/csv', 'text/css', 'application/json',
+                          'application/javascript'}
+
+# Rendered pages kept in memory; entries of older data versions are evicted first
+PAGE_CACHE_SIZE = int(os.getenv('PAGE_CACHE_SIZE', 256))
+
+def accepts_gzip():
+    return request.accept_encodings['gzip'] > 0
+
+
+# ETag of a page at a data version
+def page_etag(key, version):
+    digest = hashlib.sha256(repr(key).encode('utf-8')).hexdigest()[:16]
+    return f'{version}-{digest}'
+
+
+class CachedPage:
+    def __init__(self, body: bytes):
+        self.body = body
+        self._gzipped = None
+
+    # The body compressed on first use
+    def gzipped(self):
+        if self._gzipped is None:
+            self._gzipped = gzip.compress(self.body, GZIP_LEVEL)
+        return self._gzipped
+
+
+class PageCache:
+    def __init__(self, max_entries=PAGE_CACHE_SIZE):
+        self._pages = TTLCache(max_entries=max_entries)
+
+    # Respond with the page `key` for the current request. `render()` returns the body (str or
+    # bytes) and is only called when the page is not cached at the current data version.
+    # Clients revalidate on every request (Cache-Control: no-cache) and get 304 when nothing changed.
+    # Before the database is migrated there is no version, and the page is rendered every time.
+    def respond(self, key, render, mimetype='text/html'):
+        version = db.get_data_version()
+        etag = page_etag(key, version) if version is not None else None
+        if etag is not None and request.if_none_match.contains_weak(etag):
+            metrics.increment('page_cache_total', result='not_modified')
+            response = Response(status=304)
+        else:
+            page = self._pages.get((key, version)) if version is not None else None
+            if page is None:
+                metrics.increment('page_cache_total', result='miss')
+                body = render()
+                page = CachedPage(body.encode('utf-8') if isinstance(body, str) else body)
+                if version is not None:
+                    self._pages.set((key, version), page)
+            else:
+                metrics.increment('page_cache_total', result='hit')
+            response = Response(page.body, mimetype=mimetype)
+            if len(page.body) >= GZIP_MIN_SIZE and accepts_gzip():
+                response.set_data(page.gzipped())
+                response.headers['Content-Encoding'] = 'gzip'
+        # Weak, because the same ETag is used for the plain and the compressed body
+        if etag is not None:
+            response.set_etag(etag, weak=True)
+        response.cache_control.no_cache = True
+        response.vary.add('Accept-Encoding')
+        return response
+
+    def clear(self):
+        self._pages.clear()
+
+
+# after_request hook: gzip a large text response when the client accepts it.
+# Streamed responses (exports, Server-Sent Events) and static files are left as they are.
+def compress_response(response):
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIBLE_MIMETYPES
+            or not accepts_gzip()):
+        return response
+    data = response.get_data()
+    if len(data) < GZIP_MIN_SIZE:
+        return response
+    response.set_data(gzip.compress(data, GZIP_LEVEL))
+    response.headers['Content-Encoding'] = 'gzip'
+    response.vary.add('Accept-Encoding')
+    return response
@@ -0,0 +1,169 @@
+import re
+import threading
+from typing import List, NamedTuple, Optional
+
+# Deterministic extraction for messages that are trivially parseable (an email address,
+# a course name or number, a language, a single name or city). Only when every word of
+# the message is accounted for is the language model skipped; anything else is ambiguous
+# and goes to the model as before. A word is only taken as a name or city when it looks like
+# one (capitalised, or in Arabic script) and, if the bot's last question is known, that
+# question asked for that field.
+
+EMAIL_RE = re.compile(r'[\w.+-]+@[\w-]+(?:\.[\w-]+)+')
+ARABIC_RE = re.compile(r'[\u0600-\u06FF\u0750-\u077F\uFB50-\uFDFF\uFE70-\uFEFF]')
+LATIN_RE = re.compile(r'[A-Za-z]')
+WORD_RE = re.compile(r"[^\W\d_](?:[^\W\d_]|['-])*|\d+")
+
+# Words that name the preferred language itself
+LANGUAGE_WORDS = {
+    'english': 'English', 'انجليزي': 'English', 'الانجليزية': 'English', 'الإنجليزية': 'English',
+    'arabic': 'Arabic', 'عربي': 'Arabic', 'العربية': 'Arabic',
+}
+
+# Short replies, question words and non-answers that must never be taken as a name or a city
+NON_VALUE_WORDS = {
+    'hi', 'hello', 'hey', 'thanks', 'thank', 'yes', 'no', 'ok', 'okay', 'sure', 'bye',
+    'why', 'what', 'who', 'where', 'when', 'how', 'which', 'huh', 'hmm', 'later', 'maybe', 'idk',
+    'dunno', 'nothing', 'none', 'skip', 'not', 'help', 'please', 'sorry', 'wait', 'pass',
+    'مرحبا', 'اهلا', 'أهلا', 'السلام', 'شكرا', 'نعم', 'لا', 'تمام',
+    'لماذا', 'ليش', 'ماذا', 'شو', 'متى', 'أين', 'وين', 'كيف', 'لاحقا', 'بعدين', 'ربما',
+}
+
+QUESTION_MARKS = ('?', '؟')
+
+# How the bot asks for each name or city field, to tell which one a short reply answers
+ASKED_FIELD_PATTERNS = {
+    'first_name': re.compile(r'\b(?:first|given) name\b|\byour name\b|الاسم الأول|اسمك الأول|ما اسمك', re.IGNORECASE),
+    'last_name': re.compile(r'\b(?:last|family) name\b|\bsurname\b|اسم العائلة|الاسم الأخير|اسمك الأخير', re.IGNORECASE),
+    'city': re.compile(r'\bcity\b|\blive\b|\bfrom\b|مدينة|مدينتك|تسكن|تعيش', re.IGNORECASE),
+}
+
+NAME_FIELDS = ('first_name', 'last_name', 'city')
+
+
+# Function to return the name/city fields a bot message asks for (None when there is no message)
+def asked_fields(question: Optional[str]) -> Optional[set]:
+    if question is None:
+        return None
+    return {field for field, pattern in ASKED_FIELD_PATTERNS.items() if pattern.search(question)}
+
+
+# A name or city is capitalised or written in Arabic script, and is not a stock reply
+def looks_like_name(word: str) -> bool:
+    if word.lower() in NON_VALUE_WORDS:
+        return False
+    return word[0].isupper() or bool(ARABIC_RE.match(word))
+
+
+class PreExtraction(NamedTuple):
+    details: dict
+    # True when the whole message was understood and the language model can be skipped
+    complete: bool
+
+
+# Function to build the course lookup table (name or number -> course id) from Courses rows
+def build_course_table(course_rows) -> dict:
+    table = {}
+    for row in course_rows:
+        course_id, course_name = str(row[0]), row[1]
+        table[course_id] = course_id
+        table[course_name.strip().lower()] = course_id
+    return table
+
+
+class PreExtractor:
+    def __init__(self, load_courses):
+        # `load_courses` returns the Courses rows; it is called once, on first use
+        self._load_courses = load_courses
+        self._course_table = None
+        self._lock = threading.Lock()
+
+    @property
+    def course_table(self):
+        if self._course_table is None:
+            with self._lock:
+                if self._course_table is None:
+                    self._course_table = build_course_table(self._load_courses())
+        return self._course_table
+
+    # Drop the course table so it is rebuilt from the database on next use
+    def invalidate_courses(self):
+        self._course_table = None
+
+    # `last_question` is the bot's previous message, if any
+    def extract(self, text: str, missing_fields: List[str], last_question: Optional[str] = None) -> PreExtraction:
+        details = {}
+        remaining = text
+
+        emails = EMAIL_RE.findall(remaining)
+        if len(emails) == 1 and 'email' in missing_fields:
+            details['email'] = emails[0]
+        remaining = EMAIL_RE.sub(' ', remaining)
+
+        # Preferred language from the script the student writes in
+        if 'language' in missing_fields:
+            if ARABIC_RE.search(remaining):
+                details['language'] = 'Arabic'
+            elif LATIN_RE.search(remaining):
+                details['language'] = 'English'
+
+        words = WORD_RE.findall(remaining)
+        leftover = self._match_course(words, details, missing_fields)
+        leftover = [word for word in leftover if not self._match_language(word, details, missing_fields)]
+
+        # Several emails, or an email we did not ask for, need the model to make sense of
+        complete = (
+            not (emails and 'email' not in details)
+            and self._match_names(leftover, details, missing_fields, text, asked_fields(last_question))
+            and bool(details)
+        )
+        return PreExtraction(details, complete)
+
+    # Match the whole message (e.g. "Machine Learning") or single words (e.g. "2") against the course table
+    def _match_course(self, words, details, missing_fields):
+        table = self.course_table
+        phrase = ' '.join(word.lower() for word in words)
+        if phrase in table:
+            if 'course' not in missing_fields:
+                return words
+            details['course'] = table[phrase]
+            return []
+        leftover = []
+        for word in words:
+            course_id = table.get(word.lower())
+            if course_id is not None and 'course' in missing_fields and 'course' not in details:
+                details['course'] = course_id
+            else:
+                leftover.append(word)
+        return leftover
+
+    def _match_language(self, word, details, missing_fields):
+        language = LANGUAGE_WORDS.get(word.lower())
+        if language is None:
+            return False
+        if 'language' in missing_fields:
+            details['language'] = language
+        return True
+
+    # Assign leftover words to name/city fields only when there is exactly one way to do so.
+    # `asked` is the set of fields the bot just asked for, or None when that is not known.
+    # Returns False when words are left that cannot be placed unambiguously.
+    def _match_names(self, words, details, missing_fields, text, asked):
+        if not words:
+            return True
+        if any(mark in text for mark in QUESTION_MARKS):
+            return False
+        table = self.course_table
+        if any(word.isdigit() or word.lower() in table or not looks_like_name(word) for word in words):
+            return False
+        missing_names = [field for field in NAME_FIELDS if field in missing_fields]
+        candidates = [field for field in missing_names if asked is None or field in asked]
+        if len(words) == 1 and len(candidates) == 1:
+            details[candidates[0]] = words[0]
+            return True
+        if (len(words) == 2 and missing_names == ['first_name', 'last_name']
+                and (asked is None or 'first_name' in asked)):
+            details['first_name'], details['last_name'] = words
+            return True
+        return False
+
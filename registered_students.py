@@ -0,0 +1,129 @@
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+# Email addresses are compared like the database's unique index does (case-insensitively)
+def normalize_email(email):
+    return email.strip().lower() if email else None
+
+
+# An in-memory set of the (email, course) pairs already in student_details, loaded once and
+# kept up to date by the db save and delete functions. The chatbot checks it as soon as a
+# student gives their email, to greet a returning student without a database query.
+#
+# It is exact (unlike a Bloom filter there are no false positives and rows can be removed),
+# at roughly 100 bytes per registration. Rows saved by another process are only seen after a
+# restart; the unique (email, course) index keeps the table itself free of duplicates.
+#
+# The server loads it at startup (main.warm_up). Lookups never wait for the load: until the
+# set is loaded they answer "not registered". The rows are read outside the lock, so saves are
+# not held up either; saves and deletes made during the load are replayed onto the loaded set.
+class RegisteredStudents:
+    def __init__(self, load_registrations):
+        # `load_registrations` returns the (email, course_id) of every registration
+        self._load_registrations = load_registrations
+        # email -> set of course ids, or None until loaded
+        self._courses = None
+        self._lock = threading.Lock()
+        # Held for a whole load so that only one runs at a time
+        self._load_lock = threading.Lock()
+        self._warming = False
+        self._loading = False
+        # Changes recorded while a load is reading the table, as (apply function, args)
+        self._changes = []
+        # Bumped by invalidate(), so that a load started before it is thrown away
+        self._generation = 0
+
+    def _load(self):
+        with self._lock:
+            generation = self._generation
+            self._loading = True
+            self._changes = []
+        index = {}
+        try:
+            _add(index, self._load_registrations())
+        except BaseException:
+            with self._lock:
+                self._loading = False
+                self._changes = []
+            raise
+        with self._lock:
+            self._loading = False
+            changes, self._changes = self._changes, []
+            if generation == self._generation:
+                for change, args in changes:
+                    change(index, *args)
+                self._courses = index
+
+    # Load the registrations now (waiting for a load already running); returns the number of students
+    def warm(self):
+        with self._load_lock:
+            if self._courses is None:
+                self._load()
+        return len(self._courses or ())
+
+    # Start loading the registrations in a background thread, unless they are loaded or loading
+    def warm_in_background(self):
+        with self._lock:
+            if self._courses is not None or self._warming:
+                return
+            self._warming = True
+        threading.Thread(target=self._warm_quietly, name='registered-students-warm', daemon=True).start()
+
+    def _warm_quietly(self):
+        try:
+            self.warm()
+        except Exception as e:
+            logger.warning("Could not load registered students: %s", e)
+        finally:
+            self._warming = False
+
+    # Course ids the email is registered for (empty for a new student, or while loading)
+    def courses(self, email):
+        return frozenset((self._courses or {}).get(normalize_email(email), ()))
+
+    def is_registered(self, email, course_id):
+        try:
+            return int(course_id) in (self._courses or {}).get(normalize_email(email), ())
+        except (TypeError, ValueError):
+            return False
+
+    # Apply a change to the loaded set, or record it for the load in progress.
+    # Before a load starts there is nothing to update; the load reads the rows from the table.
+    def _change(self, change, *args):
+        with self._lock:
+            if self._courses is not None:
+                change(self._courses, *args)
+            elif self._loading:
+                self._changes.append((change, args))
+
+    # Record saved registrations, given as (email, course_id) pairs
+    def add(self, pairs):
+        self._change(_add, list(pairs))
+
+    # Forget a deleted registration
+    def discard(self, email, course_id):
+        self._change(_discard, email, course_id)
+
+    # Drop the loaded set so it is read again on next use
+    def invalidate(self):
+        with self._lock:
+            self._courses = None
+            self._generation += 1
+
+
+def _add(index, pairs):
+    for email, course_id in pairs:
+        if email:
+            index.setdefault(normalize_email(email), set()).add(int(course_id))
+
+
+def _discard(index, email, course_id):
+    email = normalize_email(email)
+    courses = index.get(email)
+    if courses is not None:
+        courses.discard(int(course_id))
+        if not courses:
+            del index[email]
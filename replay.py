@@ -0,0 +1,165 @@
+# Replay stored conversation transcripts (see transcripts.py) through chatbot_response, with a
+# scripted stand-in for Gemini that answers each turn the way the recorded turn went: extraction
+# returns the details the turn added and the reply is the recorded reply. Use it to check that a
+# change to the conversation flow still collects the same details and completes the same
+# registrations, and to time turns without calling the model.
+#
+#   python replay.py                                   # every stored conversation
+#   python replay.py --session 3f2a9c --mode single_call
+#   python replay.py --limit 100 --latency-ms 300 --json
+#
+# The replay runs against a scratch database and in-memory sessions, so nothing is written to
+# the source database. Exits with 1 when a replayed turn differs from the recording.
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+from dotenv import load_dotenv
+
+# STUDENT_DB_PATH may be set in .env; load it before db reads its settings
+load_dotenv()
+
+import chatbot
+import db
+from fake_llm import FakeGeminiModel
+from session_store import InMemorySessionStore
+from transcripts import load_transcripts
+
+# Mismatches listed in the report; the count covers all of them
+MAX_MISMATCHES_SHOWN = 20
+
+
+# Answers the model prompts of the turn being replayed from its recording
+class TurnScript:
+    def __init__(self):
+        self.turn = None
+
+    def respond(self, prompt):
+        if '"student_details"' in prompt:
+            return json.dumps({'student_details': self.turn.delta, 'reply': self.turn.reply})
+        if 'JSON schema' in prompt:
+            return json.dumps(self.turn.delta)
+        return self.turn.reply
+
+
+# Stands in for the transcript store during a replay and keeps the last turn chatbot recorded
+class TurnCapture:
+    def __init__(self):
+        self.last = None
+
+    def record(self, session_id, mode, student_input, delta, reply, notice=None):
+        self.last = {'delta': delta, 'reply': reply}
+
+
+# Point chatbot at the scripted model, a scratch database and fresh in-memory sessions
+@contextmanager
+def sandbox(llm, capture):
+    replacements = {'llm': llm, 'llm_cache': None, 'session_store': InMemorySessionStore(),
+                    'write_queue': None, 'transcript_store': capture}
+    previous = {name: getattr(chatbot, name) for name in replacements}
+    previous_db_path = db.DB_PATH
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db.configure(db_path=os.path.join(tmpdir, 'replay.db'))
+        try:
+            db.migrate()
+            for name, value in replacements.items():
+                setattr(chatbot, name, value)
+            yield
+        finally:
+            for name, value in previous.items():
+                setattr(chatbot, name, value)
+            db.configure(db_path=previous_db_path)
+
+
+# Differences between a recorded turn and its replay (empty when they match).
+# Completion messages are picked at random, so only the completion itself is compared for them.
+# Returning-student notices depend on the registrations in the database, so they are not compared.
+def compare_turn(turn, replayed):
+    recorded_done, replayed_done = turn.reply.endswith('[redirect]'), replayed['reply'].endswith('[redirect]')
+    differences = []
+    if replayed['delta'] != turn.delta:
+        differences.append({'field': 'delta', 'recorded': turn.delta, 'replayed': replayed['delta']})
+    if recorded_done != replayed_done:
+        differences.append({'field': 'completed', 'recorded': recorded_done, 'replayed': replayed_done})
+    elif not recorded_done and replayed['reply'] != turn.reply:
+        differences.append({'field': 'reply', 'recorded': turn.reply, 'replayed': replayed['reply']})
+    return differences
+
+
+def percentile(samples, q):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+
+# Function to replay transcripts; `mode` overrides the engine mode each turn was recorded with.
+# Returns a report with the turn latencies, model calls and every mismatched turn.
+def replay(transcripts, mode=None, latency=0.0):
+    script, capture = TurnScript(), TurnCapture()
+    llm = FakeGeminiModel(responder=script.respond, latency=latency)
+    latencies, mismatches = [], []
+    start = time.perf_counter()
+    with sandbox(llm, capture):
+        for transcript in transcripts:
+            for index, turn in enumerate(transcript.turns):
+                script.turn, capture.last = turn, None
+                turn_mode = mode or (turn.mode if turn.mode in chatbot.ENGINE_MODES else chatbot.ENGINE_MODE)
+                turn_start = time.perf_counter()
+                chatbot.chatbot_response(turn.input, transcript.session_id, mode=turn_mode)
+                latencies.append(time.perf_counter() - turn_start)
+                for difference in compare_turn(turn, capture.last):
+                    mismatches.append(dict(difference, session_id=transcript.session_id, turn=index + 1))
+    elapsed = time.perf_counter() - start
+    return {
+        'sessions': len(transcripts),
+        'turns': len(latencies),
+        'llm_calls': llm.calls,
+        'elapsed_seconds': round(elapsed, 3),
+        'turns_per_second': round(len(latencies) / elapsed, 1) if elapsed else None,
+        'turn_p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'turn_p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'turn_max_ms': round(max(latencies, default=0.0) * 1000, 2),
+        'mismatches': len(mismatches),
+        'mismatched_turns': mismatches[:MAX_MISMATCHES_SHOWN],
+    }
+
+
+def print_report(report):
+    print(f"Replayed {report['turns']} turns of {report['sessions']} conversations "
+          f"in {report['elapsed_seconds']}s ({report['turns_per_second']} turns/s, {report['llm_calls']} model calls)")
+    print(f"  turn latency p50 {report['turn_p50_ms']} ms  p95 {report['turn_p95_ms']} ms  "
+          f"max {report['turn_max_ms']} ms")
+    print(f"  mismatched turns: {report['mismatches']}")
+    for mismatch in report['mismatched_turns']:
+        print(f"    {mismatch['session_id']} turn {mismatch['turn']} {mismatch['field']}: "
+              f"recorded {mismatch['recorded']!r}, replayed {mismatch['replayed']!r}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Replay stored chat transcripts with a scripted model')
+    parser.add_argument('--db', help='database holding the transcripts (default: STUDENT_DB_PATH)')
+    parser.add_argument('--session', help='replay only this session id')
+    parser.add_argument('--limit', type=int, help='replay at most this many conversations')
+    parser.add_argument('--mode', choices=chatbot.ENGINE_MODES, help='engine mode (default: as recorded)')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='simulated model latency per call')
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    args = parser.parse_args(argv)
+    if args.db:
+        db.configure(db_path=args.db)
+
+    transcripts = load_transcripts(session_id=args.session, limit=args.limit)
+    report = replay(transcripts, mode=args.mode, latency=args.latency_ms / 1000)
+    if args.json:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+    else:
+        print_report(report)
+    return 1 if report['mismatches'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
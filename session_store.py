@@ -0,0 +1,124 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from ttl_cache import TTLCache
+
+# Default settings, overridable through environment variables
+DEFAULT_SESSION_TTL = 30 * 60  # Abandoned conversations are dropped after 30 minutes
+DEFAULT_MAX_SESSIONS = 10000
+DEFAULT_SESSION_DB_PATH = 'sessions.db'
+
+
+# Base class for conversation state backends.
+# State is a plain JSON-serialisable dict keyed by the session id of the /chatbot caller.
+class SessionStore:
+    def load(self, session_id):
+        raise NotImplementedError
+
+    def save(self, session_id, state):
+        raise NotImplementedError
+
+    def delete(self, session_id):
+        raise NotImplementedError
+
+
+# In-process backend: an LRU/TTL map, only shared between the threads of one worker
+class InMemorySessionStore(SessionStore):
+    def __init__(self, max_sessions=DEFAULT_MAX_SESSIONS, ttl=DEFAULT_SESSION_TTL):
+        self._cache = TTLCache(max_entries=max_sessions, ttl=ttl)
+
+    def load(self, session_id):
+        state = self._cache.get(session_id)
+        # Hand out a copy so callers never mutate the stored state in place
+        return None if state is None else json.loads(state)
+
+    def save(self, session_id, state):
+        self._cache.set(session_id, json.dumps(state))
+
+    def delete(self, session_id):
+        self._cache.pop(session_id)
+
+    def __len__(self):
+        return len(self._cache)
+
+
+# Shared backend: a SQLite table that every gunicorn worker on the host can read and write
+class SQLiteSessionStore(SessionStore):
+    # Expired rows are purged once every this many saves, keeping each turn O(1) amortised
+    PURGE_EVERY = 200
+
+    def __init__(self, db_path=DEFAULT_SESSION_DB_PATH, ttl=DEFAULT_SESSION_TTL):
+        self.db_path = db_path
+        self.ttl = ttl
+        self._saves = 0
+        self._lock = threading.Lock()
+        conn = self._connect()
+        try:
+            conn.execute('''
+            CREATE TABLE IF NOT EXISTS chat_sessions (
+                session_id TEXT PRIMARY KEY,
+                state TEXT NOT NULL,
+                updated_at REAL NOT NULL)''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_chat_sessions_updated_at ON chat_sessions (updated_at)')
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def load(self, session_id):
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                'SELECT state, updated_at FROM chat_sessions WHERE session_id = ?', (session_id,)
+            ).fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            return None
+        state, updated_at = row
+        if self.ttl is not None and time.time() - updated_at > self.ttl:
+            self.delete(session_id)
+            return None
+        return json.loads(state)
+
+    def save(self, session_id, state):
+        with self._lock:
+            self._saves += 1
+            purge = self._saves % self.PURGE_EVERY == 0
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute('''
+            INSERT INTO chat_sessions (session_id, state, updated_at) VALUES (?, ?, ?)
+            ON CONFLICT(session_id) DO UPDATE SET state = excluded.state, updated_at = excluded.updated_at
+            ''', (session_id, json.dumps(state), now))
+            if purge and self.ttl is not None:
+                conn.execute('DELETE FROM chat_sessions WHERE updated_at < ?', (now - self.ttl,))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def delete(self, session_id):
+        conn = self._connect()
+        try:
+            conn.execute('DELETE FROM chat_sessions WHERE session_id = ?', (session_id,))
+            conn.commit()
+        finally:
+            conn.close()
+
+
+# Build the backend selected by SESSION_BACKEND ('memory' or 'sqlite')
+def create_session_store(backend=None):
+    backend = (backend or os.getenv('SESSION_BACKEND', 'memory')).lower()
+    ttl = float(os.getenv('SESSION_TTL_SECONDS', DEFAULT_SESSION_TTL))
+    if backend == 'memory':
+        return InMemorySessionStore(
+            max_sessions=int(os.getenv('SESSION_MAX_ENTRIES', DEFAULT_MAX_SESSIONS)), ttl=ttl)
+    if backend == 'sqlite':
+        return SQLiteSessionStore(db_path=os.getenv('SESSION_DB_PATH', DEFAULT_SESSION_DB_PATH), ttl=ttl)
+    raise ValueError(f"Unknown session backend: {backend!r}")
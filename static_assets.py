@@ -0,0 +1,118 @@
+# Third-party CSS, JavaScript and fonts used by the templates, served from static/vendor
+# instead of public CDNs. `python static_assets.py` downloads the pinned files (the Docker
+# image does this at build time); until they are present the templates use the CDN URLs.
+#
+# Templates link static files with asset_url and static_url, which add a ?v=<content hash>
+# parameter: browsers may cache those URLs for a year, and an edited file gets a new URL.
+import argparse
+import functools
+import hashlib
+import os
+import re
+import sys
+import urllib.request
+from urllib.parse import urljoin
+
+from flask import request, url_for
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+VENDOR_DIR = 'vendor'
+
+# Files under static/vendor and the pinned CDN URLs they are downloaded from.
+# Fonts and images referenced by the stylesheets are downloaded next to them.
+VENDOR_ASSETS = {
+    'bootstrap/css/bootstrap.min.css': 'https://stackpath.bootstrapcdn.com/bootstrap/4.5.2/css/bootstrap.min.css',
+    'bootstrap/js/bootstrap.min.js': 'https://stackpath.bootstrapcdn.com/bootstrap/4.5.2/js/bootstrap.min.js',
+    'fontawesome/css/all.min.css': 'https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0-beta3/css/all.min.css',
+    'jquery/jquery.min.js': 'https://code.jquery.com/jquery-3.5.1.min.js',
+    'jquery/jquery.slim.min.js': 'https://code.jquery.com/jquery-3.5.1.slim.min.js',
+    'popper/popper.min.js': 'https://cdn.jsdelivr.net/npm/@popperjs/core@2.9.3/dist/umd/popper.min.js',
+}
+
+# How long browsers keep a versioned static file (one year)
+STATIC_MAX_AGE = 365 * 24 * 3600
+
+# url(...) references in a stylesheet
+CSS_URL_RE = re.compile(r'url\(\s*[\'"]?([^\'")]+?)[\'"]?\s*\)')
+
+
+@functools.lru_cache(maxsize=256)
+def _content_hash(path, mtime):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()[:12]
+
+
+# Function to return a short hash of a file under static/, or None if it does not exist.
+# The hash is recomputed only when the file's modification time changes.
+def file_version(filename):
+    path = os.path.join(STATIC_DIR, filename)
+    try:
+        return _content_hash(path, os.path.getmtime(path))
+    except OSError:
+        return None
+
+
+# URL of a file under static/ with its version, for templates
+def static_url(filename):
+    return url_for('static', filename=filename, v=file_version(filename))
+
+
+# URL of a vendored asset (a VENDOR_ASSETS key): the local copy if downloaded, else the CDN
+def asset_url(name):
+    local = f'{VENDOR_DIR}/{name}'
+    version = file_version(local)
+    if version is None:
+        return VENDOR_ASSETS[name]
+    return url_for('static', filename=local, v=version)
+
+
+# after_request hook: let browsers keep versioned static files for a year without revalidating
+def cache_versioned_static(response):
+    if request.endpoint == 'static' and request.args.get('v') and response.status_code in (200, 304):
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = STATIC_MAX_AGE
+        response.cache_control.immutable = True
+    return response
+
+
+def _download(url, path):
+    with urllib.request.urlopen(url, timeout=30) as source:
+        content = source.read()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(content)
+    return content
+
+
+# Function to download every vendored asset, and the files its stylesheet refers to, into
+# `static_dir`/vendor; returns the number of files written
+def fetch_assets(static_dir=STATIC_DIR):
+    written = 0
+    for name, url in VENDOR_ASSETS.items():
+        path = os.path.join(static_dir, VENDOR_DIR, name)
+        content = _download(url, path)
+        written += 1
+        if not name.endswith('.css'):
+            continue
+        references = {match.split('?')[0].split('#')[0] for match in CSS_URL_RE.findall(content.decode('utf-8'))}
+        for reference in sorted(references):
+            if reference.startswith(('data:', 'http:', 'https:', '/')):
+                continue
+            reference_path = os.path.normpath(os.path.join(os.path.dirname(path), reference))
+            _download(urljoin(url, reference), reference_path)
+            written += 1
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Download the third-party CSS, JavaScript and fonts into static/vendor')
+    parser.add_argument('--static-dir', default=STATIC_DIR)
+    args = parser.parse_args(argv)
+    written = fetch_assets(args.static_dir)
+    print(f"Downloaded {written} files into {os.path.join(args.static_dir, VENDOR_DIR)}", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,53 @@
+import json
+import logging
+
+# Server-Sent Events framing for the streaming chatbot endpoint, shared by the
+# Flask (WSGI) route and the ASGI app.
+#
+# Events sent to the browser:
+#   event: token  data: {"text": "<next chunk of the reply>"}
+#   event: done   data: {"response": "<full reply>", "session_id": "..."}
+#   event: error  data: {"error": "..."}
+# The "done" event carries the same `response` string as the JSON /chatbot endpoint,
+# so a completed registration still ends with " [redirect]".
+
+SSE_HEADERS = {
+    'Content-Type': 'text/event-stream; charset=utf-8',
+    'Cache-Control': 'no-cache',
+    'X-Accel-Buffering': 'no',  # Stop reverse proxies from buffering the stream
+}
+
+logger = logging.getLogger(__name__)
+
+
+# Format one Server-Sent Event
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+# Wrap a generator of reply chunks into SSE events
+def sse_stream(chunks, session_id):
+    parts = []
+    try:
+        for chunk in chunks:
+            parts.append(chunk)
+            yield sse_event('token', {'text': chunk})
+    except Exception:
+        logger.exception("Streaming chatbot response failed")
+        yield sse_event('error', {'error': 'The chatbot could not answer, please try again.'})
+        return
+    yield sse_event('done', {'response': ''.join(parts), 'session_id': session_id})
+
+
+# Async version of sse_stream for async generators of reply chunks
+async def asse_stream(chunks, session_id):
+    parts = []
+    try:
+        async for chunk in chunks:
+            parts.append(chunk)
+            yield sse_event('token', {'text': chunk})
+    except Exception:
+        logger.exception("Streaming chatbot response failed")
+        yield sse_event('error', {'error': 'The chatbot could not answer, please try again.'})
+        return
+    yield sse_event('done', {'response': ''.join(parts), 'session_id': session_id})
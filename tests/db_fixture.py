@@ -0,0 +1,20 @@
+import os
+import tempfile
+
+import db
+
+
+# Function to point the data access layer at a fresh database in a temporary directory for one test.
+# The database is migrated unless `migrate` is False, in which case only the tables are created
+# (for tests that need data the migrations would clean up). The previous path is restored afterwards.
+# Returns the TemporaryDirectory, so tests can keep other files (queues, fresh databases) next to it.
+def use_temp_database(testcase, migrate=True):
+    tmpdir = tempfile.TemporaryDirectory()
+    testcase.addCleanup(tmpdir.cleanup)
+    testcase.addCleanup(db.configure, db_path=db.DB_PATH)
+    db.configure(db_path=os.path.join(tmpdir.name, 'students.db'))
+    if migrate:
+        db.migrate()
+    else:
+        db.create_student_details_tables()
+    return tmpdir
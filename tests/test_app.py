@@ -0,0 +1,119 @@
+import gzip
+import io
+import json
+import re
+import sqlite3
+import unittest
+from unittest import mock
+
+import db
+from db_fixture import use_temp_database
+from chatbot import studentDetails
+from main import app
+
+
+class TestAdminRoutes(unittest.TestCase):
+    def setUp(self):
+        use_temp_database(self)
+        for index, course in enumerate(['1', '2', '2']):
+            db.save_student_details(studentDetails(
+                language='English', first_name=f'Student{index}', last_name='Saleh',
+                city='Riyadh', email=f'student{index}@example.com', course=course))
+        self.client = app.test_client()
+
+    def test_students_api_pages(self):
+        """The JSON listing returns one page of students and the key of the next page."""
+        data = self.client.get('/api/students?limit=2').get_json()
+        self.assertEqual([student['id'] for student in data['students']], [1, 2])
+        self.assertEqual(data['students'][1]['course_name'], 'Math')
+        data = self.client.get(f"/api/students?limit=2&after={data['next_after']}").get_json()
+        self.assertEqual([student['id'] for student in data['students']], [3])
+        self.assertIsNone(data['next_after'])
+
+    def test_all_students_page(self):
+        """The HTML listing filters by course and links to the next page."""
+        html = self.client.get('/all-students?course_id=2&limit=1').get_data(as_text=True)
+        self.assertIn('Student1', html)
+        self.assertNotIn('Student2', html)
+        self.assertIn('after=2', html)
+        self.assertRegex(html, r'<option value="2"\s+selected\s*>Math</option>')
+
+    def test_export_csv(self):
+        """The CSV export streams a header and the filtered rows."""
+        response = self.client.get('/export/csv?course_id=2')
+        self.assertEqual(response.mimetype, 'text/csv')
+        lines = response.get_data(as_text=True).splitlines()
+        self.assertEqual(lines[0], 'id,language,first_name,last_name,city,email,course_id,course_name')
+        self.assertEqual([line.split(',')[2] for line in lines[1:]], ['Student1', 'Student2'])
+
+    def test_export_jsonl_resumes_after_id(self):
+        """The JSONL export can resume after a given id."""
+        response = self.client.get('/export/jsonl?after=1')
+        rows = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        self.assertEqual([row['id'] for row in rows], [2, 3])
+        self.assertEqual(rows[0]['course_name'], 'Math')
+        self.assertEqual(self.client.get('/export/xml').status_code, 404)
+
+    def test_bulk_import_upload(self):
+        """Uploading a CSV file imports its rows and reports the rejected ones."""
+        content = (b'language,first_name,last_name,city,email,course\n'
+                   b'English,Imported,Student,Dammam,imported@example.com,3\n'
+                   b'English,,Student,Dammam,missing@example.com,3\n')
+        response = self.client.post('/import', data={'file': (io.BytesIO(content), 'students.csv')})
+        report = response.get_json()
+        self.assertEqual((report['inserted'], report['rejected']), (1, 1))
+        self.assertEqual(self.client.get('/api/students').get_json()['students'][-1]['first_name'], 'Imported')
+
+    def test_listing_is_revalidated_with_etags(self):
+        """An unchanged listing is answered with 304; saving or deleting a student changes the ETag."""
+        first = self.client.get('/api/students')
+        self.assertEqual(first.headers['Cache-Control'], 'no-cache')
+        etag = first.headers['ETag']
+        self.assertEqual(self.client.get('/api/students', headers={'If-None-Match': etag}).status_code, 304)
+
+        db.save_student_details(studentDetails(language='English', first_name='Late', last_name='Saleh',
+                                               city='Riyadh', email='late@example.com', course='3'))
+        changed = self.client.get('/api/students', headers={'If-None-Match': etag})
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual(changed.get_json()['students'][-1]['first_name'], 'Late')
+        db.delete_student(4)
+        self.assertNotEqual(self.client.get('/api/students').headers['ETag'], changed.headers['ETag'])
+
+    def test_writes_from_another_process_change_the_etag(self):
+        """The data version is kept in the database, so a write made outside this process is seen."""
+        etag = self.client.get('/api/students').headers['ETag']
+        conn = sqlite3.connect(db.DB_PATH)
+        with conn:
+            conn.execute("UPDATE student_details SET city = 'Jeddah' WHERE id = 1")
+        conn.close()
+        changed = self.client.get('/api/students', headers={'If-None-Match': etag})
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual(changed.get_json()['students'][0]['city'], 'Jeddah')
+
+    def test_pages_are_cached_and_compressed(self):
+        """A page is rendered once per data version and sent gzip-compressed to clients that accept it."""
+        with mock.patch('main.get_students_page', wraps=db.get_students_page) as get_page:
+            plain = self.client.get('/all-students?course_id=2')
+            compressed = self.client.get('/all-students?course_id=2', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(get_page.call_count, 1)
+        self.assertEqual(compressed.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(compressed.data), plain.data)
+        self.assertLess(len(compressed.data), len(plain.data) / 2)
+        self.assertEqual(compressed.headers['ETag'], plain.headers['ETag'])
+
+    def test_versioned_static_files_are_cached_for_a_year(self):
+        """Pages link static files with a content version, which browsers may keep for a year."""
+        html = self.client.get('/student-details').get_data(as_text=True)
+        url = re.search(r'href="(/static/styles\.css\?v=\w+)"', html).group(1)
+        self.assertEqual(self.client.get(url).headers['Cache-Control'], 'public, max-age=31536000, immutable')
+        self.assertEqual(self.client.get('/static/styles.css').headers['Cache-Control'], 'no-cache')
+
+    def test_legacy_course_form_redirects(self):
+        """Posting the course filter redirects to the GET listing."""
+        response = self.client.post('/all-students', data={'course_id': '2'})
+        self.assertEqual(response.status_code, 302)
+        self.assertIn('course_id=2', response.headers['Location'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import io
+import unittest
+
+import db
+from db_fixture import use_temp_database
+from bulk_import import import_stream, validate_record
+
+COURSE_IDS = {1, 2, 3}
+
+
+class TestBulkImport(unittest.TestCase):
+    def setUp(self):
+        use_temp_database(self)
+
+    def test_validate_record(self):
+        """Records need every field, a known language and course, and a plausible email."""
+        record = {'language': 'English', 'first_name': 'Ali', 'last_name': 'Saleh',
+                  'city': 'Riyadh', 'email': 'ali@example.com', 'course': '2'}
+        self.assertEqual(validate_record(record, COURSE_IDS),
+                         (('English', 'Ali', 'Saleh', 'Riyadh', 'ali@example.com', 2), None))
+        self.assertIn('city', validate_record(dict(record, city=' '), COURSE_IDS)[1])
+        self.assertIn('course', validate_record(dict(record, course='9'), COURSE_IDS)[1])
+        self.assertIn('email', validate_record(dict(record, email='ali'), COURSE_IDS)[1])
+        self.assertIn('language', validate_record(dict(record, language='French'), COURSE_IDS)[1])
+
+    def test_csv_import_in_batches(self):
+        """Valid CSV rows are inserted across several batches and invalid ones are reported."""
+        lines = ['language,first_name,last_name,city,email,course']
+        lines += [f'English,Student{i},Saleh,Riyadh,s{i}@example.com,1' for i in range(5)]
+        lines.append('English,Broken,Row,Riyadh,not-an-email,1')
+        report = import_stream(io.StringIO('\n'.join(lines)), 'csv', batch_size=2)
+        self.assertEqual((report.inserted, report.rejected), (5, 1))
+        self.assertEqual(report.rejects[0]['line'], 7)
+        self.assertEqual(len(db.get_all_students()), 5)
+
+    def test_jsonl_import_reports_bad_json(self):
+        """Malformed JSON lines are rejected without stopping the import."""
+        stream = io.StringIO(
+            '{"language": "Arabic", "first_name": "Sara", "last_name": "Ali", "city": "Jeddah",'
+            ' "email": "sara@example.com", "course": 3}\n'
+            '{not json}\n')
+        report = import_stream(stream, 'jsonl')
+        self.assertEqual((report.inserted, report.rejected), (1, 1))
+        self.assertTrue(report.rejects[0]['error'].startswith('Invalid JSON'))
+        self.assertEqual(db.get_latest_student()[6], 'Machine Learning')
+
+
+if __name__ == '__main__':
+    unittest.main()
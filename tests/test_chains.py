@@ -0,0 +1,75 @@
+import os
+import tempfile
+import unittest
+from typing import Optional
+from pydantic import BaseModel
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from chains import ChainRegistry
+
+
+class Greeting(BaseModel):
+    name: Optional[str] = None
+
+
+class NameOnly(BaseModel):
+    nickname: Optional[str] = None
+
+
+class TestChainRegistry(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.write_template('greet.txt', 'Say hi to {name}. {format_instructions}')
+        self.registry = ChainRegistry(prompts_dir=self.tmpdir.name)
+        self.registry.register('greet', 'greet.txt', ['name'], output_model=Greeting,
+                               variant_model=lambda variant: NameOnly)
+
+    def write_template(self, filename, text, mtime=None):
+        path = os.path.join(self.tmpdir.name, filename)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        if mtime is not None:
+            os.utime(path, (mtime, mtime))
+
+    def test_chain_is_built_once_per_llm(self):
+        """The same chain object is reused until the language model changes."""
+        llm = FakeListChatModel(responses=['{"name": "Ali"}'])
+        chain = self.registry.chain('greet', llm)
+        self.assertIs(self.registry.chain('greet', llm), chain)
+        self.assertEqual(chain.invoke({'name': 'Ali'}), {'name': 'Ali'})
+        self.assertIsNot(self.registry.chain('greet', FakeListChatModel(responses=['{}'])), chain)
+
+    def test_format_instructions_are_prerendered(self):
+        """The JSON schema instructions are rendered into the compiled prompt."""
+        text = self.registry.prompt('greet').format(name='Ali')
+        self.assertIn('Say hi to Ali.', text)
+        self.assertIn('"name"', text)
+
+    def test_reload_changed_templates(self):
+        """Edited template files are picked up by reload_changed()."""
+        self.assertEqual(self.registry.reload_changed(), [])
+        self.write_template('greet.txt', 'Greet {name} warmly. {format_instructions}', mtime=1)
+        self.assertEqual(self.registry.reload_changed(), ['greet'])
+        self.assertIn('Greet Ali warmly.', self.registry.prompt('greet').format(name='Ali'))
+
+    def test_variants_are_compiled_once(self):
+        """A variant has its own schema and fingerprint and is compiled on first use only."""
+        self.assertEqual(self.registry.variant_count('greet'), 0)
+        text = self.registry.prompt('greet', ('nickname',)).format(name='Ali')
+        self.assertIn('"nickname"', text)
+        self.assertNotEqual(self.registry.fingerprint('greet', ('nickname',)), self.registry.fingerprint('greet'))
+        llm = FakeListChatModel(responses=['{}'])
+        chain = self.registry.chain('greet', llm, ('nickname',))
+        self.assertIs(self.registry.chain('greet', llm, ('nickname',)), chain)
+        self.assertEqual(self.registry.variant_count('greet'), 1)
+
+    def test_reload_recompiles_variants(self):
+        """Editing the template updates the variants built so far."""
+        self.registry.prompt('greet', ('nickname',))
+        self.write_template('greet.txt', 'Greet {name} warmly. {format_instructions}', mtime=1)
+        self.registry.reload_changed()
+        self.assertIn('Greet Ali warmly.', self.registry.prompt('greet', ('nickname',)).format(name='Ali'))
+
+
+if __name__ == '__main__':
+    unittest.main()
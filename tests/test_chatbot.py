@@ -1,10 +1,12 @@
 import unittest
 from chatbot import extract_student_details, merge_student_details, find_missing_details, chatbot_response
 from chatbot import studentDetails
+from db_fixture import use_temp_database
 
 class TestChatbot(unittest.TestCase):
     def setUp(self):
         """Set up any necessary initial conditions for the tests."""
+        use_temp_database(self)
         # You can initialize the base student details here
         self.base_student_details = studentDetails(
             language=None,
@@ -0,0 +1,48 @@
+import unittest
+from course_catalog import CourseCatalog
+
+COURSES = [
+    (2, 'Math', 'A comprehensive course on Mathematics.'),
+    (1, 'Python', 'An introductory course on Python programming.'),
+]
+
+
+class TestCourseCatalog(unittest.TestCase):
+    def setUp(self):
+        self.loads = 0
+        self.rows = list(COURSES)
+        self.catalog = CourseCatalog(self.load)
+
+    def load(self):
+        self.loads += 1
+        return self.rows
+
+    def test_loaded_once(self):
+        """The Courses rows are read on first use and then served from memory."""
+        self.assertEqual(self.catalog.choices(), (('1', 'Python'), ('2', 'Math')))
+        self.assertEqual(self.catalog.name('2'), 'Math')
+        self.assertIsNone(self.catalog.name('9'))
+        self.assertEqual(self.catalog.describe(), "'1' for Python, '2' for Math")
+        self.assertEqual(self.loads, 1)
+
+    def test_invalidate_reloads_and_notifies(self):
+        """Invalidating re-reads the table on next use and calls the subscribers."""
+        notified = []
+        self.catalog.subscribe(lambda: notified.append(True))
+        self.catalog.courses
+        self.rows.append((3, 'Machine Learning', None))
+        self.catalog.invalidate()
+        self.assertEqual(notified, [True])
+        self.assertEqual(self.catalog.name(3), 'Machine Learning')
+        self.assertEqual(self.loads, 2)
+
+    def test_empty_table_is_not_cached(self):
+        """An empty result (e.g. before the tables exist) is read again next time."""
+        self.rows = []
+        self.assertEqual(self.catalog.courses, ())
+        self.rows = list(COURSES)
+        self.assertEqual(len(self.catalog.courses), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,141 @@
+import os
+import threading
+import unittest
+
+import db
+from db_fixture import use_temp_database
+from chatbot import studentDetails
+
+
+class TestDataAccessLayer(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = use_temp_database(self, migrate=False)
+
+    def make_student(self, first_name='Ali', course='1'):
+        return studentDetails(language='English', first_name=first_name, last_name='Saleh',
+                              city='Riyadh', email=f'{first_name.lower()}@example.com', course=course)
+
+    def test_save_and_read_students(self):
+        """Saved students are returned with their course name by the existing query functions."""
+        db.save_student_details(self.make_student('Ali', '1'))
+        db.save_student_details(self.make_student('Sara', '3'))
+        self.assertEqual(db.get_latest_student()[2:], ('Sara', 'Saleh', 'Riyadh', 'sara@example.com', 'Machine Learning'))
+        self.assertEqual(len(db.get_all_students()), 2)
+        self.assertEqual([row[2] for row in db.get_students_by_course(1)], ['Ali'])
+        db.delete_student(db.get_latest_student()[0])
+        self.assertEqual([row[2] for row in db.get_all_students()], ['Ali'])
+
+    def test_migrate_runs_once(self):
+        """migrate() records the schema version and skips migrations that already ran."""
+        db.configure(db_path=os.path.join(self.tmpdir.name, 'fresh.db'))
+        self.assertEqual(db.schema_version(), 0)
+        self.assertEqual(db.migrate(), len(db.MIGRATIONS))
+        self.assertEqual(db.schema_version(), len(db.MIGRATIONS))
+        self.assertEqual(db.migrate(), 0)
+        self.assertEqual(len(db.get_all_courses()), 3)
+
+    def test_registering_again_replaces_the_registration(self):
+        """The migration removes duplicate registrations; saving one again replaces it with a new id."""
+        db.save_student_details(self.make_student('Ali', '1'))
+        db.save_student_details(self.make_student('Ali', '1').model_copy(update={'city': 'Jeddah'}))
+        db.save_student_details(self.make_student('Sara', '1'))
+        db.migrate()
+        self.assertEqual([(row[0], row[4]) for row in db.get_all_students()], [(2, 'Jeddah'), (3, 'Riyadh')])
+
+        db.save_student_details(self.make_student('Ali', '1').model_copy(update={'email': 'ALI@example.com'}))
+        db.save_student_details(self.make_student('Ali', '2'))
+        self.assertEqual([(row[0], row[5], row[6]) for row in db.get_all_students()],
+                         [(3, 'sara@example.com', 'Python'), (4, 'ALI@example.com', 'Python'),
+                          (5, 'ali@example.com', 'Math')])
+        db.registered_students.warm()
+        self.assertEqual(db.registered_students.courses('Ali@Example.com'), {1, 2})
+        db.delete_student(5)
+        self.assertEqual(db.registered_students.courses('ali@example.com'), {1})
+
+    def test_new_course_is_picked_up(self):
+        """Saving a course refreshes the course catalog used for the students' course names."""
+        db.save_course_details({'course_id': 4, 'course_name': 'Data Science', 'course_description': None})
+        db.save_student_details(self.make_student('Ali', '4'))
+        self.assertEqual(db.get_latest_student()[6], 'Data Science')
+        self.assertEqual(db.course_catalog.name(4), 'Data Science')
+
+    def test_keyset_pagination(self):
+        """Pages follow the id order and link to the neighbouring pages."""
+        for index in range(5):
+            db.save_student_details(self.make_student(f'Student{index}', str(index % 3 + 1)))
+        first = db.get_students_page(limit=2)
+        self.assertEqual([row[0] for row in first['students']], [1, 2])
+        self.assertIsNone(first['prev_before'])
+        second = db.get_students_page(after_id=first['next_after'], limit=2)
+        self.assertEqual([row[0] for row in second['students']], [3, 4])
+        last = db.get_students_page(after_id=second['next_after'], limit=2)
+        self.assertEqual([row[0] for row in last['students']], [5])
+        self.assertIsNone(last['next_after'])
+        back = db.get_students_page(before_id=second['prev_before'], limit=2)
+        self.assertEqual(back['students'], first['students'])
+
+    def test_page_filters(self):
+        """Pages can be filtered by course and searched by name, city or email."""
+        db.save_student_details(self.make_student('Ali', '1'))
+        db.save_student_details(self.make_student('Sara', '2'))
+        db.save_student_details(self.make_student('Salem', '2'))
+        self.assertEqual([row[2] for row in db.get_students_page(course_id=2)['students']], ['Sara', 'Salem'])
+        self.assertEqual([row[2] for row in db.get_students_page(search='SAR')['students']], ['Sara'])
+        self.assertEqual([row[2] for row in db.get_students_page(search='ALI@example.com')['students']], ['Ali'])
+        self.assertEqual(db.get_students_page(search='%')['students'], [])
+
+    def test_partial_email_search(self):
+        """A search term with '@' that is not a whole address matches emails with LIKE."""
+        db.save_student_details(self.make_student('Ali', '1'))
+        db.save_student_details(self.make_student('Sara', '2'))
+        self.assertEqual([row[2] for row in db.get_students_page(search='@example.com')['students']], ['Ali', 'Sara'])
+        self.assertEqual([row[2] for row in db.get_students_page(search='sara@')['students']], ['Sara'])
+        self.assertEqual(db.get_students_page(search='ali@example.org')['students'], [])
+
+    def test_iter_students_in_batches(self):
+        """The export generator walks id ranges in batches without skipping rows."""
+        for index in range(7):
+            db.save_student_details(self.make_student(f'Student{index}', str(index % 3 + 1)))
+        self.assertEqual([row[0] for row in db.iter_students(batch_size=3)], list(range(1, 8)))
+        self.assertEqual([row[0] for row in db.iter_students(min_id=2, max_id=5, batch_size=2)], [2, 3, 4, 5])
+        self.assertEqual([row[0] for row in db.iter_students(course_id=1, after_id=1, batch_size=1)], [4, 7])
+
+    def test_wal_mode(self):
+        """Pooled connections use the WAL journal."""
+        with db.get_connection() as conn:
+            self.assertEqual(conn.execute('PRAGMA journal_mode').fetchone()[0], 'wal')
+
+    def test_pool_reuses_connections(self):
+        """Connections are returned to the pool and never exceed its size."""
+        pool = db.ConnectionPool(os.path.join(self.tmpdir.name, 'pool.db'), max_size=2)
+        with pool.connection() as first:
+            pass
+        with pool.connection() as second:
+            self.assertIs(first, second)
+
+        results = []
+
+        def worker():
+            with pool.connection() as conn:
+                results.append(conn.execute('SELECT 1').fetchone()[0])
+
+        threads = [threading.Thread(target=worker) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, [1] * 10)
+        self.assertLessEqual(pool._created, 2)
+        pool.close_all()
+
+    def test_failed_write_is_rolled_back(self):
+        """A failing write leaves no open transaction on the pooled connection."""
+        with self.assertRaises(TypeError):
+            db.save_student_details(self.make_student(course=None))
+        with db.get_connection() as conn:
+            self.assertFalse(conn.in_transaction)
+        self.assertEqual(db.get_all_students(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
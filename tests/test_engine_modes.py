@@ -0,0 +1,126 @@
+import json
+import unittest
+from unittest import mock
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+import chatbot
+from db_fixture import use_temp_database
+from fake_llm import FakeGeminiModel
+from llm_cache import MemoryResponseCache
+from metrics import MetricsRegistry
+
+
+class TestEngineModes(unittest.TestCase):
+    def setUp(self):
+        use_temp_database(self)
+        self.registry = MetricsRegistry()
+        patches = [
+            mock.patch.object(chatbot, 'metrics', self.registry),
+            mock.patch.object(chatbot, 'save_student_details'),
+            mock.patch.object(chatbot, 'transcript_store', None),
+            mock.patch.object(chatbot, 'llm_cache', MemoryResponseCache()),
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def use_responses(self, responses):
+        patcher = mock.patch.object(chatbot, 'llm', FakeListChatModel(responses=responses))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_single_call_mode_makes_one_llm_call(self):
+        """The single-call engine extracts details and replies with one model call."""
+        self.use_responses([json.dumps({
+            'student_details': {'first_name': 'Ali', 'language': 'English'},
+            'reply': 'Nice to meet you, Ali! What is your last name?',
+        })])
+        response = chatbot.chatbot_response('Hi, I am Ali', 'single', mode='single_call')
+        self.assertEqual(response, 'Nice to meet you, Ali! What is your last name?')
+        self.assertEqual(chatbot.load_student_details('single').first_name, 'Ali')
+        self.assertEqual(self.registry.counter_value('llm_calls_total', mode='single_call'), 1)
+
+    def test_two_call_mode_makes_two_llm_calls(self):
+        """The two-call engine makes separate extraction and reply calls."""
+        self.use_responses([json.dumps({'first_name': 'Ali'}), 'What is your last name?'])
+        response = chatbot.chatbot_response('Hi, I am Ali', 'two', mode='two_call')
+        self.assertEqual(response, 'What is your last name?')
+        self.assertEqual(self.registry.counter_value('llm_calls_total', mode='two_call'), 2)
+
+    def test_single_call_completion_keeps_redirect(self):
+        """Completing a registration in single-call mode still ends with [redirect]."""
+        self.use_responses([json.dumps({
+            'student_details': {'language': 'English', 'first_name': 'Ali', 'last_name': 'Saleh',
+                                'city': 'Riyadh', 'email': 'ali@example.com', 'course': '1'},
+            'reply': 'Thanks!',
+        })])
+        response = chatbot.chatbot_response('all my details', 'done', mode='single_call')
+        self.assertTrue(response.endswith('[redirect]'))
+        stats = chatbot.engine_stats()
+        self.assertEqual(stats['single_call']['registrations_completed'], 1)
+        self.assertEqual(stats['single_call']['llm_calls_per_turn'], 1.0)
+
+    def test_pre_extractor_skips_llm(self):
+        """A bare email that completes the registration needs no model call."""
+        self.use_responses([])
+        chatbot.session_store.save('pre', {'details': {
+            'language': 'English', 'first_name': 'Ali', 'last_name': 'Saleh', 'city': 'Riyadh', 'course': '1'}})
+        response = chatbot.chatbot_response('ali@example.com', 'pre', mode='two_call')
+        self.assertTrue(response.endswith('[redirect]'))
+        self.assertEqual(self.registry.counter_value('llm_calls_total', mode='two_call'), 0)
+        self.assertEqual(chatbot.engine_stats()['pre_extractor']['hits'], 1)
+
+    def test_repeated_greeting_is_served_from_cache(self):
+        """The same greeting from a second student is answered without calling the model."""
+        self.use_responses(['{}', 'Hello! What language do you prefer?'])
+        first = chatbot.chatbot_response('Hello!', 'greet-1', mode='two_call')
+        second = chatbot.chatbot_response('  Hello ', 'greet-2', mode='two_call')
+        self.assertEqual(first, second)
+        self.assertEqual(self.registry.counter_value('llm_calls_total', mode='two_call'), 2)
+        self.assertEqual(chatbot.llm_cache.stats()['hits'], 2)
+
+    def test_only_missing_fields_are_requested(self):
+        """The extraction schema lists only the missing fields, and other fields are not merged."""
+        prompts = []
+
+        def respond(prompt):
+            prompts.append(prompt)
+            return json.dumps({'email': 'ali@example.com', 'first_name': 'Bob'})
+
+        chatbot.session_store.save('partial', {'details': {
+            'language': 'English', 'first_name': 'Ali', 'last_name': 'Saleh', 'city': 'Riyadh', 'course': '1'}})
+        with mock.patch.object(chatbot, 'llm', FakeGeminiModel(responder=respond)), \
+                mock.patch.object(chatbot, 'PRE_EXTRACTOR_ENABLED', False):
+            response = chatbot.chatbot_response('my mail is ali at example dot com', 'partial', mode='two_call')
+        self.assertTrue(response.endswith('[redirect]'))
+        self.assertIn('"email"', prompts[0])
+        self.assertNotIn('"first_name"', prompts[0])
+        saved = chatbot.save_student_details.call_args[0][0]
+        self.assertEqual((saved.first_name, saved.email), ('Ali', 'ali@example.com'))
+
+    def test_tokens_per_turn_are_recorded(self):
+        """Each turn records its tokens; a turn asking for one field sends fewer input tokens."""
+        fake = FakeGeminiModel()
+        chatbot.session_store.save('one-missing', {'details': {
+            'language': 'English', 'first_name': 'Ali', 'last_name': 'Saleh', 'city': 'Riyadh', 'course': '1'}})
+        used = []
+        with mock.patch.object(chatbot, 'llm', fake), mock.patch.object(chatbot, 'PRE_EXTRACTOR_ENABLED', False):
+            for session_id in ['all-missing', 'one-missing']:
+                before = fake.input_tokens
+                chatbot.chatbot_response('Hello there', session_id, mode='two_call')
+                used.append(fake.input_tokens - before)
+        self.assertLess(used[1], used[0])
+        summary = next(summary for summary in self.registry.snapshot()['summaries']
+                       if summary['name'] == 'chat_turn_tokens' and summary['labels']['kind'] == 'input')
+        self.assertEqual((summary['count'], summary['sum']), (2, sum(used)))
+        self.assertEqual(chatbot.engine_stats()['two_call']['input_tokens_per_turn'], sum(used) / 2)
+
+    def test_unknown_mode(self):
+        """An unknown engine mode is rejected."""
+        with self.assertRaises(ValueError):
+            chatbot.chatbot_response('hello', mode='three_call')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from llm_cache import MemoryResponseCache, SQLiteResponseCache, make_cache_key, normalize_text
+
+
+class TestNormalization(unittest.TestCase):
+    def test_normalize_text(self):
+        """Repeated whitespace and trailing punctuation do not change the key."""
+        self.assertEqual(normalize_text('  Hello   there! '), 'Hello there')
+        self.assertEqual(normalize_text('  Hello   there! ', casefold=True), 'hello there')
+        self.assertEqual(normalize_text('مرحبا؟'), 'مرحبا')
+        self.assertEqual(make_cache_key('missing_info', 'v1', {'student_input': 'Hi!', 'missing_fields': ['email']}),
+                         make_cache_key('missing_info', 'v1', {'student_input': 'hi', 'missing_fields': ['email']}))
+
+    def test_extraction_keys_keep_case(self):
+        """Extracted details are saved as given, so inputs differing in case are different keys."""
+        for chain in ('extraction', 'extract_and_reply'):
+            with self.subTest(chain=chain):
+                self.assertNotEqual(make_cache_key(chain, 'v1', {'student_input': 'My name is John McDonald'}),
+                                    make_cache_key(chain, 'v1', {'student_input': 'my name is john mcdonald'}))
+        self.assertEqual(make_cache_key('extraction', 'v1', {'student_input': 'My name is John  McDonald.'}),
+                         make_cache_key('extraction', 'v1', {'student_input': 'My name is John McDonald'}))
+
+    def test_key_depends_on_prompt_fingerprint(self):
+        """Editing a prompt template invalidates its cached answers."""
+        self.assertNotEqual(make_cache_key('extraction', 'v1', 'hi'), make_cache_key('extraction', 'v2', 'hi'))
+
+
+class TestResponseCaches(unittest.TestCase):
+    def test_memory_cache_stats(self):
+        """The in-memory cache counts hits, misses and evictions."""
+        cache = MemoryResponseCache(max_entries=1)
+        self.assertIsNone(cache.get('a'))
+        cache.set('a', {'first_name': 'Ali'})
+        self.assertEqual(cache.get('a'), {'first_name': 'Ali'})
+        cache.set('b', 'Hello!')
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['evictions']), (1, 1, 1))
+
+    def test_sqlite_cache_survives_restart(self):
+        """Entries in the SQLite cache are visible to a new cache instance on the same file."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            db_path = os.path.join(tmpdir, 'cache.db')
+            SQLiteResponseCache(db_path=db_path).set('a', 'Hello!')
+            self.assertEqual(SQLiteResponseCache(db_path=db_path).get('a'), 'Hello!')
+
+    def test_sqlite_cache_trims_to_size(self):
+        """The SQLite cache evicts its oldest entries beyond max_entries."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache = SQLiteResponseCache(db_path=os.path.join(tmpdir, 'cache.db'), max_entries=2)
+            with mock.patch.object(SQLiteResponseCache, 'TRIM_EVERY', 1):
+                for key in 'abc':
+                    cache.set(key, key)
+            self.assertIsNone(cache.get('a'))
+            self.assertEqual(cache.get('c'), 'c')
+            self.assertEqual(cache.stats()['evictions'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
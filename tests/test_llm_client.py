@@ -0,0 +1,225 @@
+import asyncio
+import os
+import subprocess
+import sys
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from google.api_core.exceptions import DeadlineExceeded, InvalidArgument, ResourceExhausted
+from langchain_core.messages import HumanMessage
+
+from fake_llm import FakeGeminiModel
+from llm_client import ConcurrencySlots, GuardedChatModel, LLMDeadlineExceeded, SingleAttemptGemini, TokenBucket
+
+PROMPT = [HumanMessage(content='Hello there')]
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Guard the stock ChatGoogleGenerativeAI, which retries a 429 by itself for minutes, then exit
+RETRYING_GEMINI_SCRIPT = """
+from google.api_core.exceptions import ResourceExhausted
+from langchain_core.messages import HumanMessage
+from langchain_google_genai import ChatGoogleGenerativeAI
+from llm_client import GuardedChatModel
+
+
+class RateLimitedClient:
+    def generate_content(self, **kwargs):
+        raise ResourceExhausted('429 Resource has been exhausted')
+
+
+inner = ChatGoogleGenerativeAI(model='gemini-1.5-flash', google_api_key='test-key')
+inner.client = RateLimitedClient()
+try:
+    GuardedChatModel(inner=inner, attempt_timeout=0.2, deadline=0.5).invoke([HumanMessage(content='Hi')])
+except TimeoutError:
+    print('gave up')
+"""
+
+
+def guarded(fake, **kwargs):
+    kwargs.setdefault('backoff_base', 0.001)
+    return GuardedChatModel(inner=fake, **kwargs)
+
+
+class TestTokenBucket(unittest.TestCase):
+    def test_refills_at_the_rate(self):
+        """A token is available immediately, then after 1/rate seconds."""
+        now = [0.0]
+        bucket = TokenBucket(rate=2, capacity=1, clock=lambda: now[0])
+        self.assertEqual(bucket.try_acquire(), 0.0)
+        self.assertAlmostEqual(bucket.try_acquire(), 0.5)
+        now[0] = 0.5
+        self.assertEqual(bucket.try_acquire(), 0.0)
+
+
+class TestConcurrencySlots(unittest.TestCase):
+    def test_release_wakes_an_async_waiter(self):
+        """A coroutine waiting for a slot gets the one a thread releases."""
+        slots = ConcurrencySlots(1)
+        self.assertTrue(slots.acquire())
+
+        async def wait_for_slot():
+            threading.Timer(0.05, slots.release).start()
+            return await slots.aacquire(timeout=5)
+
+        self.assertTrue(asyncio.run(wait_for_slot()))
+        self.assertFalse(slots.acquire(timeout=0.01))
+
+    def test_async_wait_times_out(self):
+        """A coroutine that gives up on a slot does not take the next one released."""
+        slots = ConcurrencySlots(1)
+        self.assertTrue(slots.acquire())
+        self.assertFalse(asyncio.run(slots.aacquire(timeout=0.01)))
+        slots.release()
+        self.assertTrue(slots.acquire(timeout=0.01))
+
+
+# Stands in for the Google client of SingleAttemptGemini; `respond(timeout)` returns or raises
+class StubGoogleClient:
+    def __init__(self, respond):
+        self.respond = respond
+        self.requests = []
+        self.active = 0
+
+    def generate_content(self, request, metadata=(), retry=None, timeout=None):
+        self.requests.append({'retry': retry, 'timeout': timeout})
+        self.active += 1
+        try:
+            return self.respond(timeout)
+        finally:
+            self.active -= 1
+
+
+def single_attempt_gemini(respond):
+    model = SingleAttemptGemini(model='gemini-1.5-flash', google_api_key='test-key')
+    model.client = StubGoogleClient(respond)
+    return model
+
+
+class TestSingleAttemptGemini(unittest.TestCase):
+    def test_retries_are_left_to_the_guard(self):
+        """Each guarded attempt is one request, without the library's or the client's own retries."""
+        def rate_limited(timeout):
+            raise ResourceExhausted('429 Resource has been exhausted')
+
+        inner = single_attempt_gemini(rate_limited)
+        with self.assertRaises(ResourceExhausted):
+            guarded(inner, max_attempts=3, attempt_timeout=2).invoke(PROMPT)
+        self.assertEqual(len(inner.client.requests), 3)
+        for options in inner.client.requests:
+            self.assertIsNone(options['retry'])
+            self.assertLessEqual(options['timeout'], 2)
+
+    def test_abandoned_attempts_end_by_the_deadline(self):
+        """An attempt that times out releases its slot, so the next call is not starved."""
+        def slow(timeout):
+            time.sleep(timeout)
+            raise DeadlineExceeded('504 Deadline Exceeded')
+
+        inner = single_attempt_gemini(slow)
+        model = guarded(inner, max_concurrency=1, max_attempts=100, attempt_timeout=0.1, deadline=0.25)
+        with self.assertRaises(TimeoutError):
+            model.invoke(PROMPT)
+        self.assertTrue(model.slots.acquire(timeout=0.5))
+        self.assertEqual(inner.client.active, 0)
+
+    def test_process_exits_with_an_attempt_still_retrying(self):
+        """An attempt abandoned inside a self-retrying model does not hold up interpreter exit."""
+        env = dict(os.environ, PYTHONPATH=ROOT)
+        result = subprocess.run([sys.executable, '-c', RETRYING_GEMINI_SCRIPT], cwd=ROOT, env=env,
+                                capture_output=True, text=True, timeout=30)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertIn('gave up', result.stdout)
+
+
+class TestGuardedChatModel(unittest.TestCase):
+    def test_retries_rate_limit_errors(self):
+        """Injected 429s are retried with backoff until the call succeeds."""
+        fake = FakeGeminiModel(faults=['rate_limit', 'rate_limit'])
+        self.assertEqual(guarded(fake).invoke(PROMPT).content, 'Thank you!')
+        self.assertEqual((fake.faults_injected, fake.calls), (2, 1))
+
+    def test_retries_attempts_that_time_out(self):
+        """An attempt that hangs past its timeout is abandoned and retried."""
+        fake = FakeGeminiModel(faults=['timeout'], hang=0.5)
+        self.assertEqual(guarded(fake, attempt_timeout=0.05).invoke(PROMPT).content, 'Thank you!')
+
+    def test_gives_up_after_max_attempts(self):
+        """The last error is raised once every attempt has failed."""
+        fake = FakeGeminiModel(faults=['rate_limit'] * 3)
+        with self.assertRaises(ResourceExhausted):
+            guarded(fake, max_attempts=3).invoke(PROMPT)
+
+    def test_deadline_covers_retries(self):
+        """Retries stop when the call's deadline has passed."""
+        fake = FakeGeminiModel(rate_limit_rate=1.0)
+        with self.assertRaises(LLMDeadlineExceeded):
+            guarded(fake, max_attempts=100, deadline=0.2, backoff_base=0.05).invoke(PROMPT)
+
+    def test_other_errors_are_not_retried(self):
+        """Errors that are not rate limits, outages or timeouts fail at once."""
+        def reject(prompt):
+            raise InvalidArgument('Invalid prompt')
+
+        fake = FakeGeminiModel(responder=reject)
+        with self.assertRaises(InvalidArgument):
+            guarded(fake).invoke(PROMPT)
+
+    def test_bounds_concurrent_calls(self):
+        """No more than max_concurrency calls reach the model at once."""
+        fake = FakeGeminiModel(latency=0.05)
+        model = guarded(fake, max_concurrency=2)
+        prompts = [[HumanMessage(content=f'Hello {index}')] for index in range(6)]
+        with ThreadPoolExecutor(max_workers=6) as pool:
+            list(pool.map(model.invoke, prompts))
+        self.assertEqual(fake.calls, 6)
+        self.assertEqual(fake.peak_in_flight, 2)
+
+    def test_coalesces_identical_prompts(self):
+        """Identical prompts in flight at the same time share one model call."""
+        fake = FakeGeminiModel(latency=0.1)
+        model = guarded(fake)
+        start = threading.Barrier(5)
+
+        def call(_):
+            start.wait()
+            return model.invoke(PROMPT)
+
+        with ThreadPoolExecutor(max_workers=5) as pool:
+            replies = list(pool.map(call, range(5)))
+        self.assertEqual(fake.calls, 1)
+        self.assertEqual({reply.content for reply in replies}, {'Thank you!'})
+        self.assertEqual(sum(1 for reply in replies if reply.usage_metadata), 1)
+
+    def test_async_retries(self):
+        """Async calls are retried and bounded the same way."""
+        fake = FakeGeminiModel(faults=['rate_limit', 'timeout'], hang=0.5)
+        reply = asyncio.run(guarded(fake, attempt_timeout=0.05).ainvoke(PROMPT))
+        self.assertEqual(reply.content, 'Thank you!')
+
+    def test_async_calls_share_the_concurrency_bound(self):
+        """Concurrent async calls wait for a free slot instead of exceeding max_concurrency."""
+        fake = FakeGeminiModel(latency=0.05)
+        model = guarded(fake, max_concurrency=2)
+
+        async def call_all():
+            return await asyncio.gather(*(model.ainvoke([HumanMessage(content=f'Hello {index}')])
+                                          for index in range(6)))
+
+        self.assertEqual(len(asyncio.run(call_all())), 6)
+        self.assertEqual(fake.calls, 6)
+        self.assertEqual(fake.peak_in_flight, 2)
+
+    def test_stream_retries_before_the_first_chunk(self):
+        """A stream that fails before sending anything is restarted."""
+        fake = FakeGeminiModel(faults=['rate_limit'], responder=lambda prompt: 'Which course would you like?')
+        chunks = [chunk.content for chunk in guarded(fake).stream(PROMPT)]
+        self.assertEqual(''.join(chunks), 'Which course would you like?')
+        self.assertGreater(len(chunks), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
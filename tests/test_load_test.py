@@ -0,0 +1,51 @@
+import os
+import sys
+import unittest
+from contextlib import redirect_stderr, redirect_stdout
+from io import StringIO
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+
+from langchain_core.messages import HumanMessage
+
+import chatbot
+import db
+import load_test
+from fake_llm import FakeGeminiModel, fake_extract
+
+
+class TestFakeGemini(unittest.TestCase):
+    def test_extracts_details_from_phrases(self):
+        """The fake model recognises the phrases the load test sends."""
+        self.assertEqual(fake_extract('my first name is Ali and my last name is Saleh'),
+                         {'first_name': 'Ali', 'last_name': 'Saleh'})
+        self.assertEqual(fake_extract('I want Machine Learning'), {'course': '3'})
+
+    def test_counts_calls_and_tokens(self):
+        """Every call is counted and reports usage metadata."""
+        fake = FakeGeminiModel()
+        message = fake.invoke([HumanMessage(content='Say hello')])
+        self.assertEqual(fake.calls, 1)
+        self.assertEqual(message.usage_metadata['total_tokens'], fake.input_tokens + fake.output_tokens)
+
+
+class TestLoadTest(unittest.TestCase):
+    def run_load_test(self, *argv):
+        with redirect_stdout(StringIO()):
+            return load_test.main_cli(['--students', '6', '--concurrency', '3', '--latency-ms', '1', '--jitter-ms', '0', *argv])
+
+    def test_registrations_complete_offline(self):
+        """A small run completes every registration and restores the patched globals."""
+        llm, db_path = chatbot.llm, db.DB_PATH
+        self.assertEqual(self.run_load_test('--max-llm-calls-per-registration', '10'), 0)
+        self.assertIs(chatbot.llm, llm)
+        self.assertEqual(db.DB_PATH, db_path)
+
+    def test_budget_failure_exits_non_zero(self):
+        """Exceeding a budget makes the run fail, for use in CI."""
+        with redirect_stderr(StringIO()):
+            self.assertEqual(self.run_load_test('--mode', 'single_call', '--max-llm-calls-per-registration', '0.5'), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+import unittest
+from unittest import mock
+
+import chatbot
+from db_fixture import use_temp_database
+from fake_llm import FakeGeminiModel
+from llm_cache import MemoryResponseCache
+from main import app
+from metrics import MetricsRegistry
+
+
+class TestPrometheusRendering(unittest.TestCase):
+    def test_counters_and_summaries(self):
+        """Counters, summaries and their max gauge are rendered in the exposition format."""
+        registry = MetricsRegistry()
+        registry.increment('chat_turns_total', mode='two_call')
+        registry.observe('chat_turn_seconds', 0.5, mode='two_call')
+        registry.observe('chat_turn_seconds', 0.25, mode='two_call')
+        text = registry.render_prometheus()
+        self.assertIn('# TYPE chat_turns_total counter\nchat_turns_total{mode="two_call"} 1\n', text)
+        self.assertIn('chat_turn_seconds_count{mode="two_call"} 2\n', text)
+        self.assertIn('chat_turn_seconds_sum{mode="two_call"} 0.75\n', text)
+        self.assertIn('# TYPE chat_turn_seconds_max gauge\nchat_turn_seconds_max{mode="two_call"} 0.5\n', text)
+
+    def test_label_values_are_escaped(self):
+        """Quotes, backslashes and newlines in label values are escaped."""
+        registry = MetricsRegistry()
+        registry.increment('errors_total', reason='bad "value"\\\n')
+        self.assertIn('errors_total{reason="bad \\"value\\"\\\\\\n"} 1', registry.render_prometheus())
+
+    def test_counter_value_sums_matching_series(self):
+        """counter_value adds up every series whose labels include the requested ones."""
+        registry = MetricsRegistry()
+        registry.increment('llm_calls_total', mode='two_call', chain='extraction')
+        registry.increment('llm_calls_total', mode='two_call', chain='missing_info')
+        registry.increment('llm_calls_total', mode='single_call', chain='extract_and_reply')
+        self.assertEqual(registry.counter_value('llm_calls_total', mode='two_call'), 2)
+        self.assertEqual(registry.counter_value('llm_calls_total'), 3)
+
+
+class TestChatTurnInstrumentation(unittest.TestCase):
+    def setUp(self):
+        use_temp_database(self)
+        self.registry = MetricsRegistry()
+        for patcher in [mock.patch.object(chatbot, 'metrics', self.registry),
+                        mock.patch.object(chatbot, 'save_student_details'),
+                        mock.patch.object(chatbot, 'transcript_store', None),
+                        mock.patch.object(chatbot, 'llm_cache', MemoryResponseCache()),
+                        mock.patch.object(chatbot, 'llm', FakeGeminiModel())]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def summary_labels(self, name):
+        return [summary['labels'] for summary in self.registry.snapshot()['summaries'] if summary['name'] == name]
+
+    def test_stages_tokens_and_calls(self):
+        """A two-call turn records each stage's time and the tokens and calls of each chain."""
+        chatbot.chatbot_response('my first name is Ali', 'metrics', mode='two_call')
+        stages = {labels['stage'] for labels in self.summary_labels('chat_stage_seconds')}
+        self.assertTrue({'pre_extract', 'extract', 'merge', 'missing_fields', 'prompt'} <= stages)
+        for chain in ('extraction', 'missing_info'):
+            self.assertEqual(self.registry.counter_value('llm_calls_total', chain=chain), 1)
+            self.assertGreater(self.registry.counter_value('llm_tokens_total', chain=chain, kind='input'), 0)
+            self.assertGreater(self.registry.counter_value('llm_tokens_total', chain=chain, kind='output'), 0)
+
+    def test_streamed_reply_tokens(self):
+        """Tokens reported on the last streamed chunk are counted."""
+        list(chatbot.chatbot_response_stream('my first name is Ali', 'metrics-stream'))
+        self.assertGreater(self.registry.counter_value('llm_tokens_total', chain='missing_info', kind='output'), 0)
+
+
+class TestMetricsEndpoint(unittest.TestCase):
+    def setUp(self):
+        use_temp_database(self)
+
+    def test_metrics_endpoint(self):
+        """/metrics serves request and database query timings to Prometheus."""
+        client = app.test_client()
+        client.get('/api/students')
+        response = client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith('text/plain; version=0.0.4'))
+        text = response.get_data(as_text=True)
+        self.assertIn('http_request_seconds_count{endpoint="api_students",status="200"}', text)
+        self.assertIn('db_query_seconds_count{query="get_students_page"}', text)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import unittest
+from pre_extractor import PreExtractor
+
+COURSES = [
+    (1, 'Python', 'An introductory course on Python programming.'),
+    (2, 'Math', 'A comprehensive course on Mathematics.'),
+    (3, 'Machine Learning', 'A course on the fundamentals of Machine Learning.'),
+]
+ALL_FIELDS = ['language', 'first_name', 'last_name', 'city', 'email', 'course']
+
+
+class TestPreExtractor(unittest.TestCase):
+    def setUp(self):
+        self.extractor = PreExtractor(lambda: COURSES)
+
+    def test_email_only(self):
+        """A bare email address is extracted without the model."""
+        result = self.extractor.extract(' ali@example.com ', ['email', 'course'])
+        self.assertTrue(result.complete)
+        self.assertEqual(result.details, {'email': 'ali@example.com'})
+
+    def test_course_by_name_and_number(self):
+        """Courses are matched by name (case-insensitive, multi-word) or by number."""
+        self.assertEqual(self.extractor.extract('machine learning', ['course']).details, {'course': '3'})
+        self.assertEqual(self.extractor.extract('2', ['course']).details, {'course': '2'})
+        self.assertFalse(self.extractor.extract('4', ['course']).complete)
+
+    def test_language_from_script(self):
+        """The preferred language is detected from Arabic or Latin script."""
+        self.assertEqual(self.extractor.extract('الرياض', ['language', 'city']).details,
+                         {'language': 'Arabic', 'city': 'الرياض'})
+        self.assertEqual(self.extractor.extract('Python', ALL_FIELDS).details,
+                         {'language': 'English', 'course': '1'})
+
+    def test_single_name_needs_one_candidate_field(self):
+        """A single word is only used as a name or city when exactly one of them is missing."""
+        self.assertEqual(self.extractor.extract('Saleh', ['last_name', 'email']).details, {'last_name': 'Saleh'})
+        self.assertFalse(self.extractor.extract('Saleh', ['first_name', 'last_name', 'city']).complete)
+        self.assertEqual(self.extractor.extract('Ali Saleh', ['first_name', 'last_name', 'email']).details,
+                         {'first_name': 'Ali', 'last_name': 'Saleh'})
+
+    def test_ambiguous_input_falls_back(self):
+        """Sentences, greetings and unrequested values are left to the model."""
+        self.assertFalse(self.extractor.extract('My name is Ali and I live in Riyadh', ALL_FIELDS).complete)
+        self.assertFalse(self.extractor.extract('hello', ['city']).complete)
+        self.assertFalse(self.extractor.extract('ali@example.com', ['city']).complete)
+        self.assertFalse(self.extractor.extract('Python', ['city']).complete)
+
+    def test_non_answers_are_not_names(self):
+        """Questions, question words, non-answers and lowercase words are never saved as a name or city."""
+        for text, fields in [('why?', ['last_name']), ('later', ['city', 'email', 'course']),
+                             ('what', ['first_name']), ('Saleh?', ['last_name']), ('ali', ['first_name']),
+                             ('لماذا', ['city'])]:
+            with self.subTest(text=text):
+                result = self.extractor.extract(text, fields)
+                self.assertFalse(result.complete)
+                self.assertFalse(set(result.details) & {'first_name', 'last_name', 'city'})
+
+    def test_last_question_picks_the_field(self):
+        """When the bot's last question is known, a single word only answers the field it asked for."""
+        fields = ['first_name', 'last_name', 'city', 'email']
+        self.assertEqual(self.extractor.extract('Saleh', fields, 'Could you tell me your last name?').details,
+                         {'last_name': 'Saleh'})
+        self.assertEqual(self.extractor.extract('جدة', ['city', 'email'], 'في أي مدينة تسكن؟').details, {'city': 'جدة'})
+        self.assertFalse(self.extractor.extract('Riyadh', ['city', 'email'], 'What is your email address?').complete)
+        self.assertFalse(self.extractor.extract('Ali Saleh', ['first_name', 'last_name', 'email'],
+                                                'Which city do you live in?').complete)
+
+    def test_courses_loaded_once(self):
+        """The course table is built on first use and rebuilt only after invalidation."""
+        calls = []
+        extractor = PreExtractor(lambda: calls.append(1) or COURSES)
+        extractor.extract('1', ['course'])
+        extractor.extract('2', ['course'])
+        self.assertEqual(len(calls), 1)
+        extractor.invalidate_courses()
+        extractor.extract('3', ['course'])
+        self.assertEqual(len(calls), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+import threading
+import unittest
+from unittest import mock
+
+import chatbot
+import db
+from db_fixture import use_temp_database
+from fake_llm import FakeGeminiModel
+from registered_students import RegisteredStudents
+from session_store import InMemorySessionStore
+
+
+class TestRegisteredStudents(unittest.TestCase):
+    def test_lookups_are_served_from_memory(self):
+        """Registrations are loaded once; later saves and deletes update the set in place."""
+        load = mock.Mock(return_value=[('Ali@Example.com', 1), (None, 2)])
+        registered = RegisteredStudents(load)
+        self.assertEqual(registered.warm(), 1)
+        self.assertEqual(registered.courses(' ali@example.com'), {1})
+        registered.add([('ali@example.com', '3'), ('sara@example.com', 2)])
+        registered.discard('ALI@example.com', 1)
+        self.assertEqual(registered.courses('ali@example.com'), {3})
+        self.assertTrue(registered.is_registered('sara@example.com', '2'))
+        self.assertFalse(registered.is_registered('sara@example.com', None))
+        self.assertEqual(load.call_count, 1)
+
+    def test_saves_before_loading_are_read_from_the_table(self):
+        """Nothing is kept before the load, so the load is the only source of the rows."""
+        registered = RegisteredStudents(lambda: [('ali@example.com', 1)])
+        registered.add([('sara@example.com', 2)])
+        self.assertEqual(registered.courses('sara@example.com'), frozenset())
+        registered.warm()
+        self.assertEqual(registered.courses('ali@example.com'), {1})
+
+    def test_lookups_do_not_wait_for_the_load(self):
+        """While the rows are read, lookups answer at once and saves are replayed onto the loaded set."""
+        reading, release = threading.Event(), threading.Event()
+
+        def load():
+            reading.set()
+            release.wait(5)
+            return [('ali@example.com', 1), ('sara@example.com', 2)]
+
+        registered = RegisteredStudents(load)
+        self.assertFalse(registered.is_registered('ali@example.com', 1))
+        self.assertFalse(reading.is_set())  # Lookups do not load the set themselves
+        registered.warm_in_background()
+        self.assertTrue(reading.wait(5))
+        self.assertEqual(registered.courses('ali@example.com'), frozenset())
+        registered.add([('omar@example.com', 3)])
+        registered.discard('sara@example.com', 2)
+        release.set()
+        self.assertEqual(registered.warm(), 2)
+        self.assertEqual(registered.courses('ali@example.com'), {1})
+        self.assertEqual(registered.courses('omar@example.com'), {3})
+        self.assertEqual(registered.courses('sara@example.com'), frozenset())
+
+    def test_invalidate_discards_a_load_in_progress(self):
+        """A load that started before invalidate() is not used; the next one reads the table again."""
+        rows = [[('ali@example.com', 1)], [('sara@example.com', 2)]]
+        reading, release = threading.Event(), threading.Event()
+
+        def load():
+            reading.set()
+            release.wait(5)
+            return rows.pop(0)
+
+        registered = RegisteredStudents(load)
+        registered.warm_in_background()
+        self.assertTrue(reading.wait(5))
+        registered.invalidate()
+        release.set()
+        self.assertEqual(registered.warm(), 1)
+        self.assertEqual(registered.courses('ali@example.com'), frozenset())
+        self.assertEqual(registered.courses('sara@example.com'), {2})
+
+
+class TestReturningStudents(unittest.TestCase):
+    def setUp(self):
+        use_temp_database(self)
+        db.registered_students.warm()
+        self.fake = FakeGeminiModel()
+        for patcher in [mock.patch.object(chatbot, 'transcript_store', None),
+                        mock.patch.object(chatbot, 'write_queue', None),
+                        mock.patch.object(chatbot, 'session_store', InMemorySessionStore()),
+                        mock.patch.object(chatbot, 'llm_cache', None),
+                        mock.patch.object(chatbot, 'llm', self.fake)]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def register(self, session_id, course):
+        replies = [chatbot.chatbot_response(message, session_id) for message in [
+            'Hello, I speak English', 'My first name is Ali', 'my last name is Saleh', 'I live in Riyadh',
+            'my email is Ali@Example.com', course]]
+        self.assertTrue(replies[-1].endswith('[redirect]'))
+        return replies
+
+    def test_returning_student_is_recognised_without_a_query(self):
+        """A known email is greeted with its courses; registering again updates the registration."""
+        first = self.register('s1', 'Python please')
+        self.assertNotIn('Welcome back', first[4])
+
+        with mock.patch.object(db, 'get_connection', side_effect=AssertionError('no query expected')):
+            notice = chatbot._advance_conversation(
+                's2', chatbot.studentDetails(language='English'), {'email': 'ali@example.com'}, 'two_call').notice
+        self.assertEqual(notice, "Welcome back! You're already registered for Python.")
+
+        second = self.register('s3', 'Python please')
+        self.assertTrue(second[4].startswith("Welcome back! You're already registered for Python. "))
+        self.assertTrue(second[5].startswith("Welcome back! I've updated your registration for Python."))
+        self.assertEqual(len(db.get_all_students()), 1)
+        self.assertEqual(db.get_latest_student()[5], 'Ali@Example.com')
+
+
+if __name__ == '__main__':
+    unittest.main()
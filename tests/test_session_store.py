@@ -0,0 +1,83 @@
+import os
+import tempfile
+import unittest
+from session_store import InMemorySessionStore, SQLiteSessionStore, create_session_store
+from ttl_cache import TTLCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTTLCache(unittest.TestCase):
+    def test_evicts_least_recently_used(self):
+        """The least recently used entry is evicted when the cache is full."""
+        cache = TTLCache(max_entries=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.evictions, 1)
+
+    def test_expires_idle_entries(self):
+        """Entries that have not been used within the TTL are dropped."""
+        clock = FakeClock()
+        cache = TTLCache(max_entries=10, ttl=5, clock=clock)
+        cache.set('a', 1)
+        clock.now = 6
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.expirations, 1)
+
+
+class TestSessionStores(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+
+    def check_round_trip(self, store):
+        self.assertIsNone(store.load('s1'))
+        store.save('s1', {'details': {'first_name': 'Ali'}})
+        store.save('s2', {'details': {'first_name': 'Sara'}})
+        self.assertEqual(store.load('s1')['details']['first_name'], 'Ali')
+        self.assertEqual(store.load('s2')['details']['first_name'], 'Sara')
+        store.delete('s1')
+        self.assertIsNone(store.load('s1'))
+
+    def test_in_memory_store(self):
+        """Sessions are kept apart and can be deleted in the in-process store."""
+        self.check_round_trip(InMemorySessionStore(max_sessions=10))
+
+    def test_in_memory_store_returns_copies(self):
+        """Mutating a loaded state does not change the stored state."""
+        store = InMemorySessionStore()
+        store.save('s1', {'details': {}})
+        store.load('s1')['details']['email'] = 'x@example.com'
+        self.assertEqual(store.load('s1'), {'details': {}})
+
+    def test_sqlite_store_shared_between_instances(self):
+        """Two SQLite stores on the same file (e.g. two workers) see the same sessions."""
+        db_path = os.path.join(self.tmpdir.name, 'sessions.db')
+        self.check_round_trip(SQLiteSessionStore(db_path=db_path))
+        SQLiteSessionStore(db_path=db_path).save('shared', {'details': {'city': 'Riyadh'}})
+        self.assertEqual(SQLiteSessionStore(db_path=db_path).load('shared')['details']['city'], 'Riyadh')
+
+    def test_sqlite_store_expires_abandoned_sessions(self):
+        """Sessions older than the TTL are not returned."""
+        store = SQLiteSessionStore(db_path=os.path.join(self.tmpdir.name, 'sessions.db'), ttl=-1)
+        store.save('s1', {'details': {}})
+        self.assertIsNone(store.load('s1'))
+
+    def test_unknown_backend(self):
+        """An unknown backend name is rejected."""
+        with self.assertRaises(ValueError):
+            create_session_store('redis')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,26 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class TestStartup(unittest.TestCase):
+    def test_import_is_lazy(self):
+        """Importing the app loads neither langchain nor the Gemini client, and does not touch the database."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            db_path = os.path.join(tmpdir, 'students.db')
+            env = {key: value for key, value in os.environ.items() if key != 'GOOGLE_API_KEY'}
+            env['STUDENT_DB_PATH'] = db_path
+            code = ("import sys, main; print(sorted(name for name in ('langchain_core', 'langchain_google_genai') "
+                    "if name in sys.modules)); print(main.app.test_client().get('/engine-stats').status_code)")
+            output = subprocess.run([sys.executable, '-c', code], cwd=ROOT, env=env,
+                                    capture_output=True, text=True, check=True).stdout.split('\n')
+            self.assertEqual(output[:2], ['[]', '200'])
+            self.assertFalse(os.path.exists(db_path))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+import io
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import static_assets
+from main import app
+
+STYLESHEET = b'@font-face{src:url(../webfonts/fa-solid-900.woff2?v=6) format("woff2"),url("data:font/woff2;base64,AA==")}'
+
+
+class TestStaticAssets(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+
+    def test_assets_fall_back_to_the_cdn(self):
+        """Until the vendored copy is downloaded, its CDN URL is used; afterwards the versioned local file."""
+        name = 'bootstrap/css/bootstrap.min.css'
+        with mock.patch.object(static_assets, 'STATIC_DIR', self.tmpdir.name), app.test_request_context():
+            self.assertEqual(static_assets.asset_url(name), static_assets.VENDOR_ASSETS[name])
+            path = os.path.join(self.tmpdir.name, 'vendor', name)
+            os.makedirs(os.path.dirname(path))
+            with open(path, 'w') as f:
+                f.write('body{}')
+            self.assertRegex(static_assets.asset_url(name), r'^/static/vendor/bootstrap/css/bootstrap\.min\.css\?v=\w{12}$')
+
+    def test_fetch_downloads_stylesheet_fonts(self):
+        """Fonts referenced by a vendored stylesheet are downloaded next to it."""
+        requested = []
+
+        def urlopen(url, timeout):
+            requested.append(url)
+            return io.BytesIO(STYLESHEET if url.endswith('.css') else b'font')
+
+        assets = {'fontawesome/css/all.min.css': 'https://cdn.example.com/fa/6.0/css/all.min.css'}
+        with mock.patch.object(static_assets, 'VENDOR_ASSETS', assets), \
+                mock.patch.object(static_assets.urllib.request, 'urlopen', urlopen):
+            self.assertEqual(static_assets.fetch_assets(self.tmpdir.name), 2)
+        self.assertEqual(requested[1], 'https://cdn.example.com/fa/6.0/webfonts/fa-solid-900.woff2')
+        self.assertTrue(os.path.isfile(os.path.join(self.tmpdir.name, 'vendor', 'fontawesome', 'webfonts',
+                                                    'fa-solid-900.woff2')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+import asyncio
+import json
+import unittest
+from unittest import mock
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+import asgi
+import chatbot
+from db_fixture import use_temp_database
+from llm_cache import MemoryResponseCache
+from main import app
+
+
+def parse_events(body):
+    events = []
+    for raw in body.strip().split('\n\n'):
+        lines = dict(line.split(': ', 1) for line in raw.split('\n'))
+        events.append((lines['event'], json.loads(lines['data'])))
+    return events
+
+
+class TestStreaming(unittest.TestCase):
+    def setUp(self):
+        use_temp_database(self)
+        for patcher in [mock.patch.object(chatbot, 'save_student_details'),
+                        mock.patch.object(chatbot, 'transcript_store', None),
+                        mock.patch.object(chatbot, 'llm_cache', MemoryResponseCache())]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def use_responses(self, responses):
+        patcher = mock.patch.object(chatbot, 'llm', FakeListChatModel(responses=responses))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_flask_stream_sends_tokens_then_done(self):
+        """The WSGI route streams the reply in several token events and finishes with done."""
+        self.use_responses([json.dumps({'first_name': 'Ali'}), 'What is your last name?'])
+        response = app.test_client().post('/chatbot/stream', json={'message': 'I am Ali', 'session_id': 'flask'})
+        self.assertEqual(response.mimetype, 'text/event-stream')
+        events = parse_events(response.get_data(as_text=True))
+        tokens = [data['text'] for name, data in events if name == 'token']
+        self.assertGreater(len(tokens), 1)
+        self.assertEqual(events[-1], ('done', {'response': 'What is your last name?', 'session_id': 'flask'}))
+
+    def test_completion_keeps_redirect_contract(self):
+        """The done event of a completed registration ends with [redirect]."""
+        self.use_responses([json.dumps({
+            'language': 'English', 'first_name': 'Ali', 'last_name': 'Saleh',
+            'city': 'Riyadh', 'email': 'ali@example.com', 'course': '1'})])
+        response = app.test_client().post('/chatbot/stream', json={'message': 'all details', 'session_id': 'done'})
+        name, data = parse_events(response.get_data(as_text=True))[-1]
+        self.assertEqual(name, 'done')
+        self.assertTrue(data['response'].endswith('[redirect]'))
+
+    def test_asgi_stream(self):
+        """The ASGI app streams the reply with async model calls and sets the session cookie."""
+        self.use_responses([json.dumps({'city': 'Riyadh'}), 'Which course would you like?'])
+        request = {'type': 'http.request', 'body': json.dumps({'message': 'Riyadh'}).encode(), 'more_body': False}
+        sent = []
+
+        async def receive():
+            return request
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {'type': 'http', 'method': 'POST', 'path': '/chatbot/stream',
+                 'headers': [(b'cookie', b'chat_session_id=asgi')]}
+        asyncio.run(asgi.app(scope, receive, send))
+
+        self.assertEqual(sent[0]['status'], 200)
+        self.assertIn((b'set-cookie', b'chat_session_id=asgi; HttpOnly; Path=/; SameSite=Lax'), sent[0]['headers'])
+        body = b''.join(message.get('body', b'') for message in sent[1:]).decode()
+        self.assertEqual(parse_events(body)[-1][1]['response'], 'Which course would you like?')
+        self.assertEqual(chatbot.load_student_details('asgi').city, 'Riyadh')
+
+    def test_asgi_serves_flask_routes(self):
+        """Routes other than the stream are answered by the Flask app."""
+        sent = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+                 'scheme': 'http', 'path': '/engine-stats', 'raw_path': b'/engine-stats', 'query_string': b'',
+                 'root_path': '', 'headers': [(b'host', b'testserver')], 'client': ('127.0.0.1', 5000),
+                 'server': ('testserver', 80)}
+        asyncio.run(asgi.app(scope, receive, send))
+
+        self.assertEqual(sent[0]['status'], 200)
+        body = b''.join(message.get('body', b'') for message in sent[1:])
+        self.assertIn('two_call', json.loads(body))
+
+    def test_lifespan_startup_warms_up(self):
+        """The server's startup event starts loading the registered students."""
+        messages = [{'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'}]
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message['type'])
+
+        with mock.patch.object(asgi, 'warm_up') as warm_up:
+            asyncio.run(asgi.app({'type': 'lifespan'}, receive, send))
+        warm_up.assert_called_once_with()
+        self.assertEqual(sent, ['lifespan.startup.complete', 'lifespan.shutdown.complete'])
+
+
+if __name__ == '__main__':
+    unittest.main()
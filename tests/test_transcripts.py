@@ -0,0 +1,99 @@
+import json
+import unittest
+from unittest import mock
+
+import chatbot
+import db
+from db_fixture import use_temp_database
+import replay
+from fake_llm import FakeGeminiModel
+from llm_cache import MemoryResponseCache
+from session_store import InMemorySessionStore
+from transcripts import TranscriptStore, decode_turn, encode_turn, load_transcripts
+
+MESSAGES = ['Hello, I speak English', 'My first name is Ali', 'my last name is Saleh', 'I live in Riyadh',
+            'ali@example.com', 'Python please']
+
+
+class TestTranscriptStore(unittest.TestCase):
+    def test_payload_is_compact(self):
+        """A turn round-trips and is stored in well under half its JSON size."""
+        turn = ('My first name is Ali', {'first_name': 'Ali'}, 'Nice to meet you, Ali! What is your last name?')
+        payload = encode_turn(*turn)
+        self.assertEqual(decode_turn(payload), {'input': turn[0], 'delta': turn[1], 'reply': turn[2]})
+        raw = json.dumps({'input': turn[0], 'delta': turn[1], 'reply': turn[2]})
+        self.assertLess(len(payload), len(raw) / 2)
+
+    def test_turns_are_written_in_batches(self):
+        """Recorded turns are buffered and written together; a failed write is retried."""
+        save_rows = mock.Mock(side_effect=[db.sqlite3.OperationalError('database is locked'), None])
+        store = TranscriptStore(flush_interval=60, save_rows=save_rows)
+        self.addCleanup(store.close)
+        for index in range(3):
+            store.record('s1', 'two_call', f'message {index}', {}, 'reply')
+        with self.assertLogs('transcripts', 'ERROR'):
+            self.assertEqual(store.flush(), 0)
+        self.assertEqual(store.flush(), 3)
+        self.assertEqual(len(save_rows.call_args[0][0]), 3)
+        self.assertEqual(len(store), 0)
+
+
+class TestConversationTranscripts(unittest.TestCase):
+    def setUp(self):
+        use_temp_database(self)
+        self.store = TranscriptStore(flush_interval=60)
+        self.addCleanup(self.store.close)
+        self.prompts = []
+        self.fake = FakeGeminiModel()
+        responder = self.fake.responder
+        self.fake.responder = lambda prompt: self.prompts.append(prompt) or responder(prompt)
+        for patcher in [mock.patch.object(chatbot, 'transcript_store', self.store),
+                        mock.patch.object(chatbot, 'session_store', InMemorySessionStore()),
+                        mock.patch.object(chatbot, 'llm_cache', MemoryResponseCache()),
+                        mock.patch.object(chatbot, 'llm', self.fake),
+                        mock.patch.object(chatbot, 'PRE_EXTRACTOR_ENABLED', False),
+                        mock.patch.object(chatbot, 'HISTORY_TURNS', 2)]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def chat(self, session_id, messages):
+        for message in messages:
+            chatbot.chatbot_response(message, session_id, mode='two_call')
+        self.store.flush()
+
+    def test_turns_are_stored_with_their_delta(self):
+        """Every turn is stored with the details it added and the reply."""
+        self.chat('s1', MESSAGES)
+        [transcript] = load_transcripts()
+        self.assertEqual([turn.input for turn in transcript.turns], MESSAGES)
+        self.assertEqual(transcript.turns[1].delta, {'first_name': 'Ali'})
+        self.assertEqual(transcript.turns[1].reply, 'Could you tell me your last name?')
+        self.assertTrue(transcript.turns[-1].reply.endswith('[redirect]'))
+
+    def test_recent_history_is_bounded_and_prompted(self):
+        """The reply prompt shows the last HISTORY_TURNS turns of the conversation."""
+        self.chat('s2', MESSAGES[:4])
+        history = chatbot.session_store.load('s2')['history']
+        self.assertEqual([turn[0] for turn in history], MESSAGES[2:4])
+        reply_prompt = self.prompts[-1]
+        self.assertIn('Student: My first name is Ali\nYou: Could you tell me your last name?\n'
+                      'Student: my last name is Saleh', reply_prompt)
+        self.assertNotIn('Student: Hello, I speak English', reply_prompt)
+
+    def test_replay_matches_and_detects_regressions(self):
+        """Replaying stored turns reproduces them; a change in what is collected is reported."""
+        self.chat('s3', MESSAGES)
+        transcripts = load_transcripts()
+        report = replay.replay(transcripts)
+        self.assertEqual((report['turns'], report['mismatches']), (6, 0))
+
+        merge = chatbot.merge_student_details
+        without_email = lambda current, new, fields=None: merge(current, dict(new or {}, email=None), fields)
+        with mock.patch.object(chatbot, 'merge_student_details', without_email):
+            report = replay.replay(transcripts)
+        self.assertEqual(report['mismatched_turns'][0]['turn'], 5)
+        self.assertEqual(report['mismatched_turns'][0]['field'], 'delta')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,145 @@
+import os
+import sqlite3
+import threading
+import time
+import unittest
+from unittest import mock
+
+import chatbot
+import db
+from db_fixture import use_temp_database
+from main import app
+from models import studentDetails
+from write_behind import WriteBehindQueue, WriteQueueFull
+
+
+def make_student(index=0, course='1'):
+    return studentDetails(language='English', first_name=f'Student{index}', last_name='Saleh',
+                          city='Riyadh', email=f'student{index}@example.com', course=course)
+
+
+class TestWriteBehindQueue(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = use_temp_database(self)
+        self.queue_path = os.path.join(self.tmpdir.name, 'write_queue.db')
+
+    def make_queue(self, **kwargs):
+        kwargs.setdefault('flush_interval', 60)
+        write_queue = WriteBehindQueue(self.queue_path, **kwargs)
+        self.addCleanup(write_queue.close)
+        return write_queue
+
+    def test_flush_writes_batches(self):
+        """Queued registrations are readable until a flush writes them to student_details."""
+        write_queue = self.make_queue(batch_size=2)
+        # Keep the background writer asleep so the flushes below are the only ones
+        with mock.patch.object(write_queue, '_wakeup'):
+            for index in range(3):
+                write_queue.enqueue(make_student(index))
+        self.assertEqual(write_queue.latest_pending().first_name, 'Student2')
+        self.assertEqual(write_queue.flush(), 2)
+        self.assertEqual(len(write_queue), 1)
+        write_queue.drain()
+        self.assertIsNone(write_queue.latest_pending())
+        self.assertEqual([row[2] for row in db.get_all_students()], ['Student0', 'Student1', 'Student2'])
+
+    def test_queued_registrations_survive_a_restart(self):
+        """Registrations that could not be saved are recovered from the queue file."""
+        failing = mock.Mock(side_effect=sqlite3.OperationalError('database is locked'))
+        write_queue = WriteBehindQueue(self.queue_path, flush_interval=60, save_rows=failing)
+        write_queue.enqueue(make_student(7))
+        with self.assertLogs('write_behind', 'ERROR'):
+            write_queue.close()
+        self.assertEqual(db.get_all_students(), [])
+
+        recovered = self.make_queue()
+        self.assertEqual(recovered.latest_pending().first_name, 'Student7')
+        recovered.drain()
+        self.assertEqual(db.get_latest_student()[2], 'Student7')
+
+    def test_workers_flush_only_their_own_registrations(self):
+        """A second worker on the same queue file leaves a live worker's registrations alone."""
+        first = self.make_queue(save_rows=mock.Mock())
+        with mock.patch.object(first, '_wakeup'):
+            first.enqueue(make_student(0))
+        second = self.make_queue()
+        self.assertEqual(len(second), 0)
+        second.drain()
+        self.assertEqual(db.get_all_students(), [])
+        self.assertEqual(len(first), 1)
+
+    def test_stale_registrations_are_taken_over_once(self):
+        """Registrations of a worker that stopped heartbeating are claimed by a single other worker."""
+        stalled = self.make_queue(save_rows=mock.Mock())
+        with mock.patch.object(stalled, '_wakeup'):
+            stalled.enqueue(make_student(5))
+        with mock.patch('time.time', return_value=time.time() + 120):
+            takers = [self.make_queue(), self.make_queue()]
+        self.assertEqual(sorted(len(taker) for taker in takers), [0, 1])
+        for taker in takers:
+            taker.drain()
+        self.assertEqual([row[2] for row in db.get_all_students()], ['Student5'])
+        # The stalled worker finds out at its next flush and does not save them again
+        with self.assertLogs('write_behind', 'WARNING'):
+            self.assertEqual(stalled.flush(), 0)
+        stalled.save_rows.assert_not_called()
+
+    def test_invalid_course_does_not_block_the_queue(self):
+        """A registration with a non-numeric course is dropped; the rest are saved."""
+        write_queue = self.make_queue()
+        write_queue.enqueue(make_student(0, course='Python'))
+        write_queue.enqueue(make_student(1))
+        with self.assertLogs('write_behind', 'ERROR'):
+            write_queue.drain()
+        self.assertEqual([row[2] for row in db.get_all_students()], ['Student1'])
+
+    def test_backpressure(self):
+        """enqueue waits while the queue is full and gives up after the timeout."""
+        release = threading.Event()
+        write_queue = self.make_queue(max_pending=1, save_rows=lambda rows: release.wait(5))
+        write_queue.enqueue(make_student(0))
+        with self.assertRaises(WriteQueueFull):
+            write_queue.enqueue(make_student(1), timeout=0.05)
+        release.set()
+        write_queue.enqueue(make_student(2), timeout=5)
+        self.assertEqual(write_queue.latest_pending().first_name, 'Student2')
+
+
+class TestWriteBehindChat(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = use_temp_database(self)
+        self.write_queue = WriteBehindQueue(os.path.join(self.tmpdir.name, 'write_queue.db'), flush_interval=60)
+        self.addCleanup(self.write_queue.close)
+        for patcher in [mock.patch.object(chatbot, 'write_queue', self.write_queue),
+                        mock.patch.object(chatbot, 'save_student_details')]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_completed_registration_is_queued(self):
+        """Completion appends to the queue instead of saving inline."""
+        chatbot.persist_registration(make_student(3))
+        chatbot.save_student_details.assert_not_called()
+        self.assertEqual(len(self.write_queue), 1)
+
+    def test_full_queue_falls_back_to_a_synchronous_save(self):
+        """When the queue stays full the registration is saved inline."""
+        with mock.patch.object(self.write_queue, 'enqueue', side_effect=WriteQueueFull('full')):
+            with self.assertLogs('chatbot', 'WARNING'):
+                chatbot.persist_registration(make_student(3))
+        chatbot.save_student_details.assert_called_once()
+
+    def test_student_details_reads_queued_registration(self):
+        """/student-details shows a registration before the writer has saved it, even once cached."""
+        client = app.test_client()
+        etag = client.get('/student-details').headers['ETag']
+        chatbot.persist_registration(make_student(4, course='2'))
+        response = client.get('/student-details', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        html = response.get_data(as_text=True)
+        self.assertIn('Student4', html)
+        self.assertIn('Pending', html)
+        self.assertIn('Math', html)
+
+
+if __name__ == '__main__':
+    unittest.main()
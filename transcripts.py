@@ -0,0 +1,177 @@
+# Append-only transcripts of chat turns: the student's message, the details the turn added
+# and the bot's reply, stored in the `transcripts` table (see db.create_transcript_table).
+#
+# Storage is kept small and cheap:
+#   - each turn is JSON compressed with raw deflate and a preset dictionary of the words that
+#     recur in every turn (field names, course and language values, common reply phrases), so
+#     even a short turn compresses well without per-row zlib headers
+#   - turns are buffered in memory and appended in batches by a background thread, so a chat
+#     turn never waits for the database. Turns still buffered when the process is killed are lost.
+#
+# `python replay.py` re-runs stored transcripts against a stand-in model.
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+import zlib
+from typing import List, NamedTuple, Optional
+
+import db
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Payload format: one version byte, then the turn's JSON as raw deflate using PRESET_DICTIONARY.
+# Never change the dictionary of a format that has shipped; add a new version instead.
+PAYLOAD_VERSION = 1
+PRESET_DICTIONARY = (
+    b'"delta": {}, "reply": "", "input": "", '
+    b'"language": "Arabic", "language": "English", "first_name": "", "last_name": "", '
+    b'"city": "", "email": "@gmail.com", "@example.com", "course": "1", "course": "2", "course": "3", '
+    b'Python Math Machine Learning [redirect] '
+    b'Thank you! Could you please tell me your What is your first name? last name? email address? '
+    b'Which city do you live in? Which course would you like to register for? '
+    b'Hello! Hi, my name is I live in I want to register for the course. '
+    b"Thank you, I've collected your data that we need for registration. See you soon! "
+    b"Your registration is complete. Have a great day! See you next time! "
+)
+
+DEFAULT_BATCH_SIZE = 200
+DEFAULT_FLUSH_INTERVAL = 1.0
+# Turns kept in memory while the database is failing, beyond which the oldest are dropped
+DEFAULT_MAX_BUFFERED = 10000
+
+
+class Turn(NamedTuple):
+    created_at: float
+    mode: Optional[str]
+    input: str
+    # Fields the turn set or changed, e.g. {'first_name': 'Ali'}
+    delta: dict
+    reply: str
+    # Text shown before the reply, e.g. greeting a returning student
+    notice: Optional[str] = None
+
+
+class Transcript(NamedTuple):
+    session_id: str
+    turns: List[Turn]
+
+
+# Function to encode a turn's message, details delta, reply and notice (if any) as a compact payload
+def encode_turn(student_input: str, delta: dict, reply: str, notice: Optional[str] = None) -> bytes:
+    turn = {'input': student_input, 'delta': delta, 'reply': reply}
+    if notice:
+        turn['notice'] = notice
+    text = json.dumps(turn, ensure_ascii=False, separators=(',', ':'))
+    compressor = zlib.compressobj(9, zlib.DEFLATED, -15, zdict=PRESET_DICTIONARY)
+    return bytes([PAYLOAD_VERSION]) + compressor.compress(text.encode('utf-8')) + compressor.flush()
+
+# Function to decode a payload written by encode_turn into a dict with input, delta, reply and maybe notice
+def decode_turn(payload: bytes) -> dict:
+    if payload[0] != PAYLOAD_VERSION:
+        raise ValueError(f"Unknown transcript payload version: {payload[0]}")
+    decompressor = zlib.decompressobj(-15, zdict=PRESET_DICTIONARY)
+    return json.loads(decompressor.decompress(payload[1:]) + decompressor.flush())
+
+
+# Buffers turns and appends them to the transcripts table in batches.
+# The writer thread starts with the first recorded turn and flushes every `flush_interval`
+# seconds, or as soon as `batch_size` turns are waiting.
+class TranscriptStore:
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE, flush_interval=DEFAULT_FLUSH_INTERVAL,
+                 max_buffered=DEFAULT_MAX_BUFFERED, save_rows=None):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffered = max_buffered
+        self._save_rows = save_rows or db.save_transcript_rows
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._closed = threading.Event()
+        self._thread = None
+
+    def __len__(self):
+        with self._lock:
+            return len(self._buffer)
+
+    # Queue one turn for writing
+    def record(self, session_id: str, mode: str, student_input: str, delta: dict, reply: str,
+               notice: Optional[str] = None):
+        row = (session_id, time.time(), mode, encode_turn(student_input, delta, reply, notice))
+        with self._lock:
+            self._buffer.append(row)
+            if len(self._buffer) > self.max_buffered:
+                del self._buffer[0]
+                metrics.increment('transcript_turns_dropped_total')
+            pending = len(self._buffer)
+            if self._thread is None and not self._closed.is_set():
+                self._thread = threading.Thread(target=self._run, name='transcript-writer', daemon=True)
+                self._thread.start()
+        metrics.increment('transcript_turns_total')
+        if pending >= self.batch_size:
+            self._wakeup.set()
+
+    # Write the buffered turns in one transaction; returns the number written.
+    # On a database error the turns go back to the front of the buffer for the next flush.
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                rows, self._buffer = self._buffer, []
+            if not rows:
+                return 0
+            try:
+                with metrics.timer('transcript_flush_seconds'):
+                    self._save_rows(rows)
+            except Exception as e:
+                logger.error("Could not write %d transcript turns: %s", len(rows), e)
+                with self._lock:
+                    self._buffer[:0] = rows
+                    del self._buffer[:max(len(self._buffer) - self.max_buffered, 0)]
+                return 0
+            return len(rows)
+
+    def _run(self):
+        while not self._closed.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    # Stop the writer thread and write what is left
+    def close(self):
+        self._closed.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+
+
+# Function to read stored transcripts, one per session in the order the sessions started.
+# Pass `session_id` for one conversation and `limit` to stop after that many sessions.
+def load_transcripts(session_id: Optional[str] = None, limit: Optional[int] = None) -> List[Transcript]:
+    transcripts = []
+    for _, row_session_id, created_at, mode, payload in db.iter_transcript_rows(session_id):
+        if not transcripts or transcripts[-1].session_id != row_session_id:
+            if limit is not None and len(transcripts) == limit:
+                break
+            transcripts.append(Transcript(row_session_id, []))
+        turn = decode_turn(payload)
+        transcripts[-1].turns.append(Turn(created_at, mode, turn['input'], turn['delta'], turn['reply'], turn.get('notice')))
+    return transcripts
+
+
+# Function to create the transcript store from the environment (TRANSCRIPTS=0 disables it)
+def create_transcript_store(enabled=None):
+    if enabled is None:
+        enabled = os.getenv('TRANSCRIPTS', '1') != '0'
+    if not enabled:
+        return None
+    store = TranscriptStore(
+        batch_size=int(os.getenv('TRANSCRIPT_BATCH_SIZE', DEFAULT_BATCH_SIZE)),
+        flush_interval=float(os.getenv('TRANSCRIPT_FLUSH_INTERVAL', DEFAULT_FLUSH_INTERVAL)),
+    )
+    atexit.register(store.close)
+    return store
@@ -0,0 +1,78 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+# A bounded, thread-safe mapping that evicts the least recently used entry when full
+# and drops entries that have not been touched for longer than `ttl` seconds.
+# Every operation is O(1): the OrderedDict keeps entries in recency order, so the
+# oldest entry is always at the front.
+class TTLCache:
+    def __init__(self, max_entries=1000, ttl=None, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.expirations = 0
+
+    def _is_expired(self, stored_at, now):
+        return self.ttl is not None and now - stored_at > self.ttl
+
+    # Return the value for the key (refreshing its recency) or the default if missing/expired
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            stored_at, value = entry
+            now = self._clock()
+            if self._is_expired(stored_at, now):
+                del self._entries[key]
+                self.expirations += 1
+                return default
+            self._entries[key] = (now, value)
+            self._entries.move_to_end(key)
+            return value
+
+    # Store a value, evicting expired entries from the front and then the LRU entry if full
+    def set(self, key, value):
+        with self._lock:
+            now = self._clock()
+            self._entries[key] = (now, value)
+            self._entries.move_to_end(key)
+            self._purge_expired(now)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            return default if entry is None else entry[1]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    # Drop expired entries; stops at the first fresh one because entries are ordered by last use
+    def _purge_expired(self, now):
+        if self.ttl is None:
+            return
+        while self._entries:
+            stored_at, _ = next(iter(self._entries.values()))
+            if not self._is_expired(stored_at, now):
+                break
+            self._entries.popitem(last=False)
+            self.expirations += 1
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+
+_MISSING = object()
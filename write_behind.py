@@ -0,0 +1,258 @@
+# Write-behind persistence for completed registrations (WRITE_BEHIND=1).
+# A completed studentDetails is appended to a small durable queue in its own SQLite file, so the
+# chat reply never waits for the student database's write lock. A background thread moves queued
+# registrations into student_details in batched transactions.
+#
+# Delivery is at-least-once: registrations still queued when the process stops are flushed on
+# the next start, and a crash between a batch commit and the queue trim replays that batch.
+#
+# Every worker process of the app shares the queue file. Each queued row records the queue
+# (process) that owns it, and a queue only flushes its own rows. Live queues heartbeat in
+# queue_owners; rows released by a queue that closed without saving them, or owned by one that
+# stopped heartbeating (a crashed process), are claimed by another queue in a single UPDATE,
+# so exactly one process takes each of them over.
+import atexit
+import itertools
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+import db
+from metrics import metrics
+from models import studentDetails
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUEUE_PATH = 'write_queue.db'
+DEFAULT_MAX_PENDING = 1000
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_FLUSH_INTERVAL = 0.5
+DEFAULT_PUT_TIMEOUT = 5.0
+# Seconds without a heartbeat after which a queue's registrations are taken over by another process
+DEFAULT_OWNER_TIMEOUT = 60.0
+
+HEARTBEAT_SQL = 'INSERT OR REPLACE INTO queue_owners (owner, heartbeat) VALUES (?, ?)'
+
+# Take the rows nobody owns: released ones, and those of queues gone quiet or gone
+CLAIM_SQL = '''
+    UPDATE pending_registrations SET owner = ?
+    WHERE owner IS NULL
+       OR owner NOT IN (SELECT owner FROM queue_owners WHERE heartbeat >= ?)
+    '''
+
+OWNED_SQL = 'SELECT id, details FROM pending_registrations WHERE owner = ? ORDER BY id'
+
+
+# Raised by enqueue() when the queue stays full for longer than the put timeout
+class WriteQueueFull(Exception):
+    pass
+
+
+# Durable, bounded queue of completed registrations with a background batch writer.
+# Queued registrations are mirrored in memory so the web app can read them back before they are
+# flushed (read-your-writes). enqueue() blocks while `max_pending` registrations are waiting.
+class WriteBehindQueue:
+    def __init__(self, queue_path=DEFAULT_QUEUE_PATH, max_pending=DEFAULT_MAX_PENDING,
+                 batch_size=DEFAULT_BATCH_SIZE, flush_interval=DEFAULT_FLUSH_INTERVAL,
+                 put_timeout=DEFAULT_PUT_TIMEOUT, synchronous='NORMAL', save_rows=None,
+                 owner_timeout=DEFAULT_OWNER_TIMEOUT):
+        if synchronous.upper() not in ('NORMAL', 'FULL'):
+            raise ValueError(f"Unknown synchronous setting: {synchronous!r}")
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.save_rows = save_rows or db.save_student_rows
+        self.owner_timeout = owner_timeout
+        self.owner = f'{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}'
+
+        # Same durability as the student database (WAL, synchronous=NORMAL): an acknowledged
+        # registration survives a crash of the process; set WRITE_QUEUE_SYNC=FULL to also survive power loss
+        self._conn = sqlite3.connect(queue_path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(f'PRAGMA synchronous={synchronous}')
+        with self._conn:
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS pending_registrations (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    details TEXT NOT NULL,
+                    enqueued_at REAL NOT NULL,
+                    owner TEXT)''')
+            columns = {row[1] for row in self._conn.execute('PRAGMA table_info(pending_registrations)')}
+            if 'owner' not in columns:  # A queue file written before rows had owners
+                self._conn.execute('ALTER TABLE pending_registrations ADD COLUMN owner TEXT')
+            self._conn.execute('CREATE TABLE IF NOT EXISTS queue_owners (owner TEXT PRIMARY KEY, heartbeat REAL NOT NULL)')
+
+        # _db_lock guards the queue connection and is taken before _lock, which guards the in-memory
+        # mirror and the slots reserved by appends in progress. _flush_lock keeps one flush at a time.
+        self._db_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._not_full = threading.Condition(self._lock)
+        self._reserved = 0
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._pending = OrderedDict()
+        self._heartbeat()
+
+        self._worker = threading.Thread(target=self._run, name='write-behind', daemon=True)
+        self._worker.start()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._pending)
+
+    # Append a completed registration; returns once it is durably queued.
+    # Waits up to `timeout` (default: put_timeout) for room, then raises WriteQueueFull.
+    def enqueue(self, student_details, timeout=None):
+        deadline = time.monotonic() + (self.put_timeout if timeout is None else timeout)
+        with self._not_full:
+            if len(self._pending) + self._reserved >= self.max_pending:
+                metrics.increment('write_queue_backpressure_total')
+                self._wakeup.set()
+            while len(self._pending) + self._reserved >= self.max_pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise WriteQueueFull(f"{len(self._pending)} registrations are waiting to be saved")
+                self._not_full.wait(remaining)
+            self._reserved += 1
+
+        # Readers of the mirror only wait for the dict update, not for the append itself
+        details = student_details.model_dump_json()
+        try:
+            with self._db_lock:
+                with self._conn:
+                    cursor = self._conn.execute(
+                        'INSERT INTO pending_registrations (details, enqueued_at, owner) VALUES (?, ?, ?)',
+                        (details, time.time(), self.owner))
+                with self._lock:
+                    self._pending[cursor.lastrowid] = student_details
+                    depth = len(self._pending)
+        finally:
+            with self._not_full:
+                self._reserved -= 1
+        metrics.increment('write_queue_enqueued_total')
+        if depth >= self.batch_size:
+            self._wakeup.set()
+        return cursor.lastrowid
+
+    # Record that this queue is alive and claim the registrations nobody owns (see CLAIM_SQL).
+    # The in-memory mirror is brought in line with the rows this queue owns: claimed ones are
+    # added, and any taken over by another process after this one stalled are dropped.
+    def _heartbeat(self):
+        now = time.time()
+        with self._db_lock:
+            with self._conn:
+                self._conn.execute(HEARTBEAT_SQL, (self.owner, now))
+                self._conn.execute(CLAIM_SQL, (self.owner, now - self.owner_timeout))
+                self._conn.execute('DELETE FROM queue_owners WHERE heartbeat < ?', (now - self.owner_timeout,))
+                owned = self._conn.execute(OWNED_SQL, (self.owner,)).fetchall()
+            with self._not_full:
+                owned_ids = {queue_id for queue_id, _ in owned}
+                lost = [queue_id for queue_id in self._pending if queue_id not in owned_ids]
+                claimed = [(queue_id, details) for queue_id, details in owned if queue_id not in self._pending]
+                if not lost and not claimed:
+                    return
+                for queue_id in lost:
+                    del self._pending[queue_id]
+                for queue_id, details in claimed:
+                    self._pending[queue_id] = studentDetails(**json.loads(details))
+                self._pending = OrderedDict(sorted(self._pending.items()))
+                self._not_full.notify_all()
+        if claimed:
+            logger.info("Took over %d queued registrations", len(claimed))
+        if lost:
+            logger.warning("%d queued registrations were taken over by another process", len(lost))
+
+    # The most recently queued registration that is not saved yet, or None
+    def latest_pending(self):
+        with self._lock:
+            return next(reversed(self._pending.values()), None)
+
+    # Move up to one batch of queued registrations into student_details; returns how many were taken.
+    # If the database write fails the batch stays queued and is retried on the next flush.
+    def flush(self):
+        with self._flush_lock:
+            self._heartbeat()
+            with self._lock:
+                batch = list(itertools.islice(self._pending.items(), self.batch_size))
+            if not batch:
+                return 0
+            rows = []
+            for queue_id, student_details in batch:
+                try:
+                    rows.append(db.student_row(student_details))
+                except ValueError:
+                    # A malformed registration must not block the ones queued behind it
+                    logger.error("Dropping queued registration %d with invalid course %r",
+                                 queue_id, student_details.course)
+                    metrics.increment('write_queue_dropped_total')
+            with metrics.timer('write_queue_flush_seconds'):
+                if rows:
+                    self.save_rows(rows)
+            with self._db_lock:
+                with self._conn:
+                    self._conn.executemany('DELETE FROM pending_registrations WHERE id = ? AND owner = ?',
+                                           [(queue_id, self.owner) for queue_id, _ in batch])
+                with self._not_full:
+                    for queue_id, _ in batch:
+                        del self._pending[queue_id]
+                    self._not_full.notify_all()
+            metrics.increment('write_queue_flushed_total', len(rows))
+            return len(batch)
+
+    # Flush until the queue is empty
+    def drain(self):
+        while self.flush():
+            pass
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.drain()
+            except Exception:
+                logger.exception("Flushing queued registrations failed; retrying in %.1fs", self.flush_interval)
+
+    # Stop the background writer and save everything still queued
+    def close(self):
+        if self._stopped.is_set():
+            return
+        self._stopped.set()
+        self._wakeup.set()
+        self._worker.join()
+        try:
+            self.drain()
+        except Exception:
+            logger.exception("Could not save %d queued registrations; they stay queued for the next start", len(self))
+        # Release what is left so that another process can take it over at once
+        with self._db_lock:
+            with self._conn:
+                self._conn.execute('UPDATE pending_registrations SET owner = NULL WHERE owner = ?', (self.owner,))
+                self._conn.execute('DELETE FROM queue_owners WHERE owner = ?', (self.owner,))
+            self._conn.close()
+
+
+def create_write_queue(enabled=None):
+    if enabled is None:
+        enabled = os.getenv('WRITE_BEHIND', '0') not in ('0', '')
+    if not enabled:
+        return None
+    write_queue = WriteBehindQueue(
+        queue_path=os.getenv('WRITE_QUEUE_PATH', DEFAULT_QUEUE_PATH),
+        max_pending=int(os.getenv('WRITE_QUEUE_MAX_PENDING', DEFAULT_MAX_PENDING)),
+        batch_size=int(os.getenv('WRITE_QUEUE_BATCH_SIZE', DEFAULT_BATCH_SIZE)),
+        flush_interval=float(os.getenv('WRITE_QUEUE_FLUSH_INTERVAL', DEFAULT_FLUSH_INTERVAL)),
+        put_timeout=float(os.getenv('WRITE_QUEUE_PUT_TIMEOUT', DEFAULT_PUT_TIMEOUT)),
+        synchronous=os.getenv('WRITE_QUEUE_SYNC', 'NORMAL'),
+        owner_timeout=float(os.getenv('WRITE_QUEUE_OWNER_TIMEOUT', DEFAULT_OWNER_TIMEOUT)),
+    )
+    atexit.register(write_queue.close)
+    return write_queue